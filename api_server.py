@@ -0,0 +1,320 @@
+"""Read-only HTTP API of the movies database.
+Run from the repository root: python3 api_server.py data/data.csv --port 8000"""
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+from urllib.parse import parse_qs, unquote, urlsplit
+from movie_app import MovieApp
+from movie_commands import MovieCommands
+
+
+class ApiError(Exception):
+    """Raised by endpoints to answer with an HTTP error status"""
+
+    def __init__(self, status, message):
+        """Instance initialization
+        :param status: HTTP status code
+        :param message: error message returned in JSON
+        """
+        super().__init__(message)
+        self.status = status
+
+
+class MovieApiServer:
+    """asyncio HTTP/1.1 server answering library queries as JSON.
+    The storage is opened and loaded once. Every check_interval seconds the storage signature
+    is checked and, when the database file was changed by another process, the storage is
+    reopened and loaded again in a worker thread and cached responses are dropped. Responses carry an ETag and conditional
+    requests with a matching If-None-Match are answered with 304 Not Modified.
+    Endpoints: /movies, /movies/<title>, /search?q=, /filter, /sorted, /stats, /random"""
+
+    reasons = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+               405: 'Method Not Allowed', 500: 'Internal Server Error'}
+    max_header_size = 64 * 1024
+
+    def __init__(self, open_storage, check_interval=0.5, cache_size=1024):
+        """Instance initialization
+        :param open_storage: callable returning a new IStorage instance of the database,
+        called on start and whenever the database file was changed
+        :param check_interval: seconds between checks of the database file for changes
+        :param cache_size: maximum number of cached responses
+        """
+        self._open_storage = open_storage
+        self._storage = None
+        self._app = None
+        self.check_interval = check_interval
+        self.cache_size = cache_size
+        self.requests = 0
+        self.cache_hits = 0
+        self._version = None
+        self._checked = 0
+        self._titles = None
+        self._cache = {}
+        self._snapshot_lock = None
+        self._server = None
+        self._routes = {'/movies': self._movies,
+                        '/search': self._search,
+                        '/filter': self._filter,
+                        '/sorted': self._sorted,
+                        '/stats': self._stats,
+                        '/random': self._random}
+
+    async def start(self, host='127.0.0.1', port=8000):
+        """Loads the snapshot and starts listening
+        :param host: listened address
+        :param port: listened port, 0 for any free port
+        :return: (host, port) tuple of the listening socket
+        """
+        self._snapshot_lock = asyncio.Lock()
+        await self._check_snapshot(force=True)
+        self._server = await asyncio.start_server(self._handle_connection, host, port,
+                                                  limit=self.max_header_size)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        """Serves requests until cancelled"""
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        """Stops listening, closes the server and the storage"""
+        self._server.close()
+        await self._server.wait_closed()
+        if self._storage is not None:
+            self._storage.close()
+            self._storage = None
+
+    async def _check_snapshot(self, force=False):
+        """Reopens the storage in a worker thread if the database file was changed
+        :param force: check the file even if it was checked less than check_interval ago
+        :return: None
+        """
+        now = time.monotonic()
+        if not force and now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        if not force and self._storage.signature() == self._version:
+            return
+        storage, version, titles = await asyncio.to_thread(self._load_snapshot)
+        if self._storage is not None:
+            self._storage.close()
+        self._storage = storage
+        self._app = MovieApp(storage)
+        self._version = version
+        self._titles = titles
+        self._cache.clear()
+
+    def _load_snapshot(self):
+        """Opens the storage and loads its movies. The signature is read first, so a change
+        made during the load is noticed by the next check
+        :return: tuple (storage, its signature, list of titles)
+        """
+        storage = self._open_storage()
+        version = storage.signature()
+        return storage, version, list(storage.list_movies().keys())
+
+    async def _handle_connection(self, reader, writer):
+        """Reads HTTP requests of one keep-alive connection and writes responses"""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                keep_alive = await self._handle_request(head, writer)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def _handle_request(self, head, writer):
+        """Answers one request
+        :param head: request line and headers
+        :param writer: connection stream writer
+        :return: True if the connection is kept alive
+        """
+        self.requests += 1
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, protocol = lines[0].split(' ', 2)
+        except ValueError:
+            writer.write(self._response(400, self._error_body('Malformed request line'), keep_alive=False))
+            return False
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection == 'keep-alive' if protocol == 'HTTP/1.0' else connection != 'close'
+        if method not in ('GET', 'HEAD'):
+            writer.write(self._response(405, self._error_body('Only GET and HEAD are supported'), keep_alive))
+            return keep_alive
+        async with self._snapshot_lock:
+            await self._check_snapshot()
+            status, body, etag = self._answer(target)
+        if etag is not None and etag in headers.get('if-none-match', ''):
+            writer.write(self._response(304, b'', keep_alive, etag, send_body=False))
+        else:
+            writer.write(self._response(status, body, keep_alive, etag, send_body=method == 'GET'))
+        return keep_alive
+
+    def _answer(self, target):
+        """Returns cached or freshly computed response of the request target
+        :param target: request path with query string
+        :return: tuple (status, JSON body bytes, ETag or None for responses that can't be cached)
+        """
+        cached = self._cache.get(target)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached
+        url = urlsplit(target)
+        path = url.path.rstrip('/') or '/'
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            if path.startswith('/movies/'):
+                result = self._movie(unquote(path[len('/movies/'):]))
+            elif path in self._routes:
+                result = self._routes[path](query)
+            else:
+                raise ApiError(404, f'Unknown endpoint {path}')
+        except ApiError as error:
+            return error.status, self._error_body(str(error)), None
+        except Exception as error:
+            return 500, self._error_body(f'{type(error).__name__}: {error}'), None
+        body = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        if path == '/random':
+            return 200, body, None
+        response = (200, body, f'"{hashlib.sha1(body).hexdigest()[:20]}"')
+        if len(self._cache) >= self.cache_size:
+            del self._cache[next(iter(self._cache))]
+        self._cache[target] = response
+        return response
+
+    def _response(self, status, body, keep_alive, etag=None, send_body=True):
+        """Returns bytes of an HTTP response"""
+        headers = [f'HTTP/1.1 {status} {self.reasons[status]}',
+                   'Content-Type: application/json; charset=utf-8',
+                   f'Content-Length: {len(body)}',
+                   f'Connection: {"keep-alive" if keep_alive else "close"}']
+        if etag is not None:
+            headers.append(f'ETag: {etag}')
+            headers.append('Cache-Control: no-cache')
+        else:
+            headers.append('Cache-Control: no-store')
+        head = ('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1')
+        return head + body if send_body else head
+
+    @staticmethod
+    def _error_body(message):
+        """Returns JSON body of an error response"""
+        return json.dumps({"error": message}, ensure_ascii=False).encode('utf-8')
+
+    @staticmethod
+    def _number(query, name, number_type, default):
+        """Returns a numeric query parameter, raises ApiError if it is not a number"""
+        if name not in query:
+            return default
+        try:
+            return number_type(query[name])
+        except ValueError as error:
+            raise ApiError(400, f'Parameter {name} must be a number') from error
+
+    @staticmethod
+    def _page(movies, query):
+        """Returns the page of movies selected by offset and limit parameters"""
+        offset = MovieApiServer._number(query, 'offset', int, 0)
+        limit = MovieApiServer._number(query, 'limit', int, None)
+        movies = list(movies)
+        page = movies[offset:] if limit is None else movies[offset:offset + limit]
+        return {"count": len(movies), "movies": MovieCommands.movies_json(page)}
+
+    def _movies(self, query):
+        """GET /movies?offset=&limit= lists movies"""
+        return self._page(self._storage.list_movies().items(), query)
+
+    def _movie(self, title):
+        """GET /movies/<title> returns one movie"""
+        info = self._storage.get_movie(title)
+        if info is None:
+            raise ApiError(404, f'There is no movie called "{title}" in a database')
+        return MovieCommands.movie_json(title, info)
+
+    def _search(self, query):
+        """GET /search?q= finds movies by a part of title, similar titles are returned when nothing is found"""
+        text = query.get('q', '')
+        if not text:
+            raise ApiError(400, 'Parameter q is required')
+        movies = self._app.search_movies(text)
+        similar = [] if movies else self._app.similar_movies(text)
+        return {"movies": MovieCommands.movies_json(movies), "similar": MovieCommands.movies_json(similar)}
+
+    def _filter(self, query):
+        """GET /filter?min_rating=&max_rating=&start_year=&end_year= filters movies"""
+        movies = self._app.filter_movies(self._number(query, 'min_rating', float, MovieApp.min_rating),
+                                         self._number(query, 'max_rating', float, MovieApp.max_rating),
+                                         self._number(query, 'start_year', int, 0),
+                                         self._number(query, 'end_year', int, 9999))
+        return self._page(movies, query)
+
+    def _sorted(self, query):
+        """GET /sorted?by=rating|year&order=asc|desc&offset=&limit= sorts movies"""
+        field = query.get('by', 'rating')
+        if field not in ('rating', 'year'):
+            raise ApiError(400, 'Parameter by must be rating or year')
+        return self._page(self._app.sorted_movies(field, query.get('order', 'desc') == 'desc'), query)
+
+    def _stats(self, query):
+        """GET /stats?by=year|flag returns rating statistics, with a breakdown by the field if given"""
+        stats = MovieCommands.stats_json(self._app.movie_stats())
+        field = query.get('by')
+        if field is not None:
+            if field not in MovieApp.breakdown_fields:
+                raise ApiError(400, 'Parameter by must be year or flag')
+            stats[f'by_{field}'] = MovieCommands.breakdown_json(field, self._app.movie_stats_breakdown(field))
+        return stats
+
+    def _random(self, query):
+        """GET /random returns a random movie"""
+        movie = self._app.random_movie(self._titles)
+        if movie is None:
+            raise ApiError(404, 'Movies database is empty!')
+        title, info = movie
+        if info is None:
+            # deleted since the snapshot titles were read
+            self._checked = 0
+            raise ApiError(404, f'There is no movie called "{title}" in a database')
+        return MovieCommands.movie_json(title, info)
+
+
+async def serve(open_storage, host, port):
+    """Runs the server until interrupted"""
+    server = MovieApiServer(open_storage)
+    host, port = await server.start(host, port)
+    print(f'Serving movies API on http://{host}:{port}/', flush=True)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.stop()
+
+
+def main():
+    """Reads command line arguments, creates the storage and runs the server"""
+    from main import create_storage
+    parser = argparse.ArgumentParser(description='Read-only HTTP API of the movies database')
+    parser.add_argument('database', nargs='?', default='', help='database file, data/data.csv by default')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--journal', action='store_true', help='database is used in journal mode')
+    arguments = parser.parse_args()
+    try:
+        asyncio.run(serve(lambda: create_storage(arguments.database, arguments.journal),
+                          arguments.host, arguments.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
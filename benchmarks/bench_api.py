@@ -0,0 +1,62 @@
+"""Measures requests per second of the HTTP API server (api_server.py) running in one process.
+Run from the repository root: python -m benchmarks.bench_api [number of movies]"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.generate_library import generate_movies, write_library
+
+ENDPOINTS = ['/stats', '/search?q=golden', '/filter?min_rating=8&start_year=1990&end_year=2000&limit=20',
+             '/sorted?by=rating&limit=20', '/movies?limit=20', '/random']
+
+
+async def client(host, port, target, count):
+    """Sends count keep-alive requests of the target one by one"""
+    reader, writer = await asyncio.open_connection(host, port)
+    request = f'GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n'.encode('latin-1')
+    for _ in range(count):
+        writer.write(request)
+        head = await reader.readuntil(b'\r\n\r\n')
+        length = int(head.split(b'Content-Length: ')[1].split(b'\r\n')[0])
+        await reader.readexactly(length)
+    writer.close()
+
+
+async def measure(host, port, target, connections=10, requests=200):
+    """Returns requests per second of concurrent clients"""
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, target, requests) for _ in range(connections)))
+    return connections * requests / (time.perf_counter() - start)
+
+
+def free_port():
+    """Returns a free local TCP port"""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def main():
+    """Runs the benchmark and prints the results"""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    port = free_port()
+    with tempfile.TemporaryDirectory() as workdir:
+        database = os.path.join(workdir, 'movies.csv')
+        write_library(database, generate_movies(count))
+        server = subprocess.Popen([sys.executable, 'api_server.py', database, '--port', str(port)],
+                                  stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            server.stdout.readline()
+            print(f'{count} movies')
+            for target in ENDPOINTS:
+                print(f'{target}: {asyncio.run(measure("127.0.0.1", port, target)):.0f} requests/s')
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""Compares memory used by the movies dictionary of dictionaries and by MovieTable.
+Run from the repository root: python -m benchmarks.bench_memory [number of movies]"""
+import sys
+import tracemalloc
+from benchmarks.generate_library import generate_movies
+from storage.movie_table import MovieTable
+
+
+def measure(build, count):
+    """Returns megabytes allocated by the built structure"""
+    tracemalloc.start()
+    structure = build(generate_movies(count))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del structure
+    return size / 1024 / 1024
+
+
+def build_table(movies):
+    """Fills MovieTable with movies"""
+    table = MovieTable()
+    for title, info in movies:
+        table[title] = info
+    return table
+
+
+def main():
+    """Runs the benchmark and prints the results"""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    dict_size = measure(dict, count)
+    table_size = measure(build_table, count)
+    print(f'{count} movies')
+    print(f'dict of dicts: {dict_size:.1f} MB')
+    print(f'MovieTable:    {table_size:.1f} MB ({table_size / dict_size:.0%})')
+
+
+if __name__ == '__main__':
+    main()
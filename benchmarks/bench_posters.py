@@ -0,0 +1,144 @@
+"""Measures poster cache downloads against a local stub image server: a cold prefetch
+with one and with many workers, a warm prefetch, deduplication of equal posters and
+resuming of interrupted downloads.
+Run from the repository root: python -m benchmarks.bench_posters [number of posters]"""
+import os
+import random
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from poster_cache import PosterCache
+
+
+def png_image(width, height, seed):
+    """Returns bytes of a grayscale noise PNG image"""
+    generator = random.Random(seed)
+    rows = b''.join(b'\0' + generator.randbytes(width) for _ in range(height))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(rows, 1)) + chunk(b'IEND', b''))
+
+
+class StubImageServer:
+    """Local image server for the poster cache. '/poster-<number>.png' is one of
+    distinct images, so different urls share content. Supports Range requests,
+    can delay responses and cut the first response of given paths in the middle"""
+
+    def __init__(self, distinct=50, latency=0.02, truncate=(), host='127.0.0.1', port=0):
+        """Instance initialization
+        :param distinct: number of distinct images
+        :param latency: delay of every response in seconds
+        :param truncate: paths whose first response is cut after half of the image
+        :param host: interface to listen on
+        :param port: port to listen on, 0 picks a free port
+        """
+        self.images = [png_image(200, 300, seed) for seed in range(distinct)]
+        self.latency = latency
+        self.truncate = set(truncate)
+        self.requests_count = 0
+        self.range_requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self):
+        """Base url of the running stub"""
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self):
+        """Creates request handler class bound to this stub"""
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                time.sleep(stub.latency)
+                name = self.path.lstrip('/')
+                if not (name.startswith('poster-') and name.endswith('.png')):
+                    self.send_error(404)
+                    return
+                image = stub.images[int(name[len('poster-'):-len('.png')]) % len(stub.images)]
+                start = 0
+                header = self.headers.get('Range', '')
+                with stub._lock:
+                    stub.requests_count += 1
+                    cut = self.path in stub.truncate
+                    stub.truncate.discard(self.path)
+                    if header:
+                        stub.range_requests += 1
+                if header.startswith('bytes='):
+                    start = int(header[len('bytes='):].split('-')[0])
+                    if start >= len(image):
+                        self.send_error(416)
+                        return
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{len(image) - 1}/{len(image)}')
+                else:
+                    self.send_response(200)
+                body = image[start:]
+                self.send_header('Content-Type', 'image/png')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if cut:
+                    self.wfile.write(body[:len(body) // 2])
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def prefetch(cache_dir, urls, workers):
+    """Returns seconds of one prefetch run and the cache"""
+    cache = PosterCache(cache_dir, max_workers=workers, backoff=0.01)
+    start = time.perf_counter()
+    try:
+        files = cache.prefetch(urls)
+    finally:
+        cache.close()
+    return time.perf_counter() - start, cache, files
+
+
+def main():
+    """Runs the benchmark and prints the results"""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    truncated = [f'/poster-{number}.png' for number in range(0, count, 10)]
+    with tempfile.TemporaryDirectory() as workdir:
+        # a quarter of distinct images, so every run deduplicates equal posters
+        with StubImageServer(distinct=max(1, count // 4), truncate=truncated) as server:
+            urls = [f'{server.url}poster-{number}.png' for number in range(count)]
+            for workers in (1, 8, 32):
+                cache_dir = os.path.join(workdir, f'cold-{workers}')
+                server.truncate = set(truncated)
+                seconds, cache, files = prefetch(cache_dir, urls, workers)
+                stored = len([name for name in os.listdir(cache_dir) if name.endswith('.png')])
+                print(f'cold, {workers} worker(s): {seconds:.2f} s, {cache.summary()}, '
+                      f'{len(files)} posters in {stored} files')
+            print(f'{server.range_requests} interrupted downloads resumed with Range requests')
+            seconds, cache, files = prefetch(cache_dir, urls, 32)
+            print(f'warm: {seconds:.3f} s, {cache.summary()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Times the first page and all results of movie queries against each storage backend,
+compared with the full load-and-scan MovieApp did before queries were lazy.
+Run from the repository root: python -m benchmarks.bench_query [number of movies]"""
+import os
+import sys
+import tempfile
+import time
+from benchmarks.generate_library import generate_movies, write_library
+from main import create_storage
+from movie_query import MovieQuery
+from storage.storage_csv import StorageCsv
+
+BACKENDS = {
+    'csv': ('.csv', StorageCsv),
+    'cached-csv': ('.csv', create_storage),
+    'sqlite': ('.db', create_storage),
+    'jsonl': ('.jsonl', create_storage),
+    'sharded': ('.shards', create_storage),
+}
+
+PAGE_SIZE = 100
+
+
+def queries(storage):
+    """Returns benchmarked queries: name -> (MovieQuery, equivalent full scan)"""
+    return {
+        'filter': (MovieQuery(storage).rating(7, 8).year(1990, 2000),
+                   lambda movies: [(title, info) for title, info in movies.items()
+                                   if 7 <= info['rating'] <= 8 and 1990 <= info['year'] <= 2000]),
+        'top 10': (MovieQuery(storage).order_by('rating', reverse=True).limit(10),
+                   lambda movies: sorted(movies.items(), key=lambda movie: movie[1]['rating'], reverse=True)[:10]),
+        'random': (MovieQuery(storage).sample(1),
+                   lambda movies: list(movies.items())[:1]),
+    }
+
+
+def elapsed(function):
+    """Returns seconds of one call of the function"""
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main():
+    """Runs the benchmark and prints the results"""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    movies = list(generate_movies(count))
+    with tempfile.TemporaryDirectory() as workdir:
+        for backend, (extension, open_storage) in BACKENDS.items():
+            datafile = os.path.join(workdir, f'{backend}{extension}')
+            write_library(datafile, movies)
+            storage = open_storage(datafile)
+            # the first read of a cached storage loads it, queries are timed on a warm storage
+            storage.list_movies()
+            for name, (query, scan) in queries(storage).items():
+                first_page = elapsed(lambda: next(query.pages(PAGE_SIZE), None))
+                all_results = elapsed(lambda: list(query))
+                full_scan = elapsed(lambda: scan(storage.list_movies()))
+                print(f'{backend:<11} {name:<7} first page {first_page * 1000:8.1f} ms, '
+                      f'all {all_results * 1000:8.1f} ms ({query.plan}), '
+                      f'load and scan {full_scan * 1000:8.1f} ms')
+            storage.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Measures the movie info refresh when only a part of the library is stale: the time
+should follow the number of stale movies, not the library size.
+Run from the repository root: python -m benchmarks.bench_refresh [number of movies]"""
+import os
+import sys
+import tempfile
+import time
+from benchmarks.generate_library import generate_movies, omdb_response, write_library
+from benchmarks.run_benchmarks import BACKENDS
+from movie_app import MovieApp
+from omdb.stub_server import StubOmdbServer
+
+STALE_SHARES = (0.0, 0.01, 0.1, 1.0)
+
+
+def stale_library(count, stale_share, now):
+    """Returns movies refreshed a day ago, except the stale share refreshed a year ago"""
+    stale_every = round(1 / stale_share) if stale_share else None
+    for number, (title, info) in enumerate(generate_movies(count)):
+        stale = stale_every is not None and number % stale_every == 0
+        info["last_refreshed"] = now - (365 if stale else 1) * 24 * 3600
+        yield title, info
+
+
+def main():
+    """Runs the benchmark and prints the results"""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    now = int(time.time())
+    MovieApp.api_key = 'benchmark'
+    MovieApp.refresh_workers = 16
+    MovieApp.refresh_rate_limit = 1000000
+    stub_movies = {title: omdb_response(title, info) for title, info in generate_movies(count)}
+    with tempfile.TemporaryDirectory() as workdir, StubOmdbServer(stub_movies) as stub:
+        MovieApp.omdb_url = stub.url
+        MovieApp.omdb_cache_file = os.path.join(workdir, 'cache.db')
+        for backend in ('csv', 'journal-csv', 'sqlite', 'jsonl'):
+            extension, create_storage = BACKENDS[backend]
+            for stale_share in STALE_SHARES:
+                datafile = os.path.join(workdir, f'{backend}-{stale_share}{extension}')
+                write_library(datafile, stale_library(count, stale_share, now))
+                storage = create_storage(datafile)
+                app = MovieApp(storage)
+                start = time.perf_counter()
+                result = app.update_movies_info()
+                elapsed = time.perf_counter() - start
+                storage.close()
+                print(f'{backend}, {count} movies, {stale_share:.0%} stale: {elapsed:.3f} s, {result.summary()}')
+        MovieApp.omdb_client().close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Compares rendering of movie cards by the compiled template with the previous
+html_tag_wrap based serializer and times a whole site build with worker processes.
+Run from the repository root: python -m benchmarks.bench_render [number of movies]"""
+import os
+import sys
+import tempfile
+import time
+from benchmarks.generate_library import generate_movies
+from movie_app import MovieApp
+from site_generator import SiteGenerator
+
+
+def legacy_serialize_movie(title, year, rating, poster, notes, imdb_id, flag):
+    """MovieApp.serialize_movie before the compiled template, kept as the baseline"""
+    country_flag = MovieApp.html_tag_wrap(flag, "div", "flag")
+    img = MovieApp.html_tag_wrap(poster, "img", "movie-poster")
+    if notes:
+        img = img.replace('<img',  f'<img title="{notes}" ')
+    img = (img.replace('<img', f'<a href="https://imdb.com/title/{imdb_id}" target="_blank"><img')
+           + '</a>')
+    movie_title = MovieApp.html_tag_wrap(title, "div", "movie-title")
+    release_year = MovieApp.html_tag_wrap(year, "div", "movie-year")
+    rating = float(rating)
+    rating_star = (f'<i style="left: {rating*10}%" class="fa-solid fa-star"></i>'
+                   f'<span style="left: {rating*10}%" class="ratings">{rating}</span>')
+    movie_rating = (MovieApp.html_tag_wrap(rating_star, "div", "movie-rating-bar")
+                    .replace('<div', '<div style="background: linear-gradient(#F2A766 0 0) 0/'
+                                     f'{rating*10}% no-repeat #F2D8C9;"'))
+    movie_html = MovieApp.html_tag_wrap(country_flag + img + movie_title + release_year
+                                        + movie_rating, "div", "movie")
+    return MovieApp.html_tag_wrap(movie_html, "li")
+
+
+def legacy_render_movie(title, info):
+    """MovieApp.render_movie with the legacy serializer"""
+    return legacy_serialize_movie(title, info['year'], info['rating'], info['poster'], info.get('notes', ''),
+                                  info.get('imdb_id', ''), info.get('flag', ''))
+
+
+def time_cards(render_movie, movies, repeat=3):
+    """Returns the best time of rendering all cards in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for title, info in movies.items():
+            render_movie(title, info)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def time_site(render_movie, movies, workdir, workers):
+    """Returns time of building the whole site from scratch in seconds"""
+    output_dir = os.path.join(workdir, f'site-{render_movie.__name__}-{workers}')
+    os.makedirs(output_dir)
+    generator = SiteGenerator(render_movie, template_file=MovieApp.website_template, output_dir=output_dir,
+                              workers=workers)
+    start = time.perf_counter()
+    generator.generate(movies)
+    return time.perf_counter() - start
+
+
+def main():
+    """Runs the benchmark and prints the results"""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    movies = dict(generate_movies(count))
+    for title in list(movies)[::10]:
+        movies[title]['notes'] = 'Seen it twice, "must" <watch>'
+    legacy = time_cards(legacy_render_movie, movies)
+    compiled = time_cards(MovieApp.render_movie, movies)
+    print(f'{count} cards, legacy serializer: {legacy:.3f} s ({legacy / count * 1e6:.2f} us per card)')
+    print(f'{count} cards, compiled template: {compiled:.3f} s ({compiled / count * 1e6:.2f} us per card), '
+          f'{legacy / compiled:.1f}x faster')
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f'site build, legacy serializer: {time_site(legacy_render_movie, movies, workdir, 1):.3f} s')
+        cores = os.cpu_count() or 1
+        for workers in sorted({1, 2, cores}):
+            print(f'site build, compiled template, {workers} process(es): '
+                  f'{time_site(MovieApp.render_movie, movies, workdir, workers):.3f} s')
+
+
+if __name__ == '__main__':
+    main()
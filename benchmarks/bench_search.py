@@ -0,0 +1,54 @@
+"""Compares title search with TitleIndex against the linear scan of MovieApp._search_movie.
+Run from the repository root: python -m benchmarks.bench_search [number of titles]"""
+import random
+import sys
+import time
+from storage.title_index import TitleIndex
+
+SYLLABLES = ['ka', 'ro', 'mi', 'sun', 'tar', 'el', 'ven', 'do', 'ri', 'sha', 'lo', 'ne', 'gar',
+             'bel', 'tu', 'mor', 'is', 'an', 'qui', 'zo', 'pe', 'ha', 'lin', 'cro', 'fe', 'wa']
+
+
+def generate_titles(count, seed=1):
+    """Generates unique pseudo random movie titles made of pseudo words"""
+    generator = random.Random(seed)
+    vocabulary = [''.join(generator.choices(SYLLABLES, k=generator.randint(1, 3))) for _ in range(5000)]
+    return [f'{" ".join(generator.choices(vocabulary, k=generator.randint(1, 4))).title()} {number}'
+            for number in range(count)]
+
+
+def linear_search(titles, text):
+    """Linear scan used by MovieApp._search_movie"""
+    return [title for title in titles if text.lower() in title.lower()]
+
+
+def measure(function, queries, repeat=3):
+    """Returns the best average time of one query in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for query in queries:
+            function(query)
+        elapsed = (time.perf_counter() - start) / len(queries) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    """Runs the benchmark and prints the results"""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    titles = generate_titles(count)
+    movies = dict.fromkeys(titles, {})
+    start = time.perf_counter()
+    index = TitleIndex()
+    index.rebuild(movies)
+    build_time = time.perf_counter() - start
+    queries = [titles[count // 2][:12], titles[-1][-8:], 'xyzzy', titles[7].split()[0], '123']
+    print(f'{count} titles, index built in {build_time:.2f} s')
+    print(f'linear scan:  {measure(lambda text: linear_search(titles, text), queries):.3f} ms/query')
+    print(f'trigram index: {measure(index.search, queries):.3f} ms/query')
+    print(f'fuzzy search:  {measure(index.fuzzy_search, [titles[3][:-2] + "x", titles[11][1:]], 1):.3f} ms/query')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Compares a single CSV file with sharded libraries (by hash of the title and by year):
+time of title searches and rating/year filters scanned by one and by several processes,
+and time of single movie changes, which rewrite only one shard.
+Run from the repository root: python -m benchmarks.bench_shards [number of movies]"""
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from benchmarks.generate_library import generate_movies, write_library
+from storage.storage_csv import StorageCsv
+from storage.storage_sharded import StorageSharded
+
+
+def best_time(function, repeat=3):
+    """Returns the best time of calling the function in seconds"""
+    best = None
+    for run in range(repeat):
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            function(run)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def scans(storage):
+    """Returns scan operations: name -> callable (run number)"""
+    return {
+        'search': lambda run: storage.search_titles('golden'),
+        'filter': lambda run: storage.filter_movies(7, 8, 1990, 2000),
+    }
+
+
+def changes(storage, titles, offset):
+    """Returns single movie changes: name -> callable (run number),
+    every run of every storage changes other movies of the library"""
+    return {
+        'add': lambda run: storage.add_movie(f'Benchmark Movie {offset + run}', 1999, 7.5, 'N/A'),
+        'update': lambda run: storage.update_movie(titles[offset + run], f'notes {run}'),
+        'delete': lambda run: storage.delete_movie(titles[-offset - run - 1]),
+    }
+
+
+def report(name, storage, titles, offset):
+    """Times scans and changes of a storage and prints one line of results"""
+    timings = {operation: best_time(function) for operation, function in scans(storage).items()}
+    timings.update((operation, best_time(function))
+                   for operation, function in changes(storage, titles, offset).items())
+    print(f'{name:<28}' + ', '.join(f'{operation} {seconds * 1000:8.1f} ms'
+                                    for operation, seconds in timings.items()))
+
+
+def main():
+    """Runs the benchmark and prints the results"""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    movies = list(generate_movies(count))
+    titles = [title for title, info in movies]
+    cores = os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as workdir:
+        single_file = os.path.join(workdir, 'library.csv')
+        write_library(single_file, movies)
+        storage = StorageCsv(single_file)
+        # the single file is scanned the way MovieApp does without query methods
+        storage.search_titles = lambda text: StorageSharded.scan(storage, 'search', (text,))
+        storage.filter_movies = lambda *arguments: StorageSharded.scan(storage, 'filter', arguments)
+        report('single csv', storage, titles, 0)
+        for scheme in StorageSharded.schemes:
+            manifest = os.path.join(workdir, f'library-{scheme}.shards')
+            StorageSharded(manifest, scheme, workers=1).update_database(dict(movies))
+            for number, workers in enumerate(sorted({1, 2, cores})):
+                storage = StorageSharded(manifest, workers=workers)
+                report(f'{scheme} shards, {workers} process(es)', storage, titles, number * 3)
+                storage.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Measures startup time of short main.py commands and checks that importing the app
+doesn't load the network, flag and .env modules.
+Run from the repository root: python -m benchmarks.bench_startup [number of movies]"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.generate_library import generate_movies, write_library
+
+HEAVY_MODULES = ('requests', 'pycountry', 'dotenv')
+
+
+def measure(arguments, repeat=10):
+    """Returns the best wall time of a python process run in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *arguments], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def loaded_heavy_modules():
+    """Returns heavy modules loaded by importing main.py"""
+    check = f'import sys, main; print(" ".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))'
+    return subprocess.run([sys.executable, '-c', check], check=True, capture_output=True, text=True).stdout.split()
+
+
+def main():
+    """Runs the benchmark and prints the results"""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    with tempfile.TemporaryDirectory() as workdir:
+        database = os.path.join(workdir, 'movies.db')
+        write_library(database, generate_movies(count))
+        interpreter = measure(['-c', 'pass'])
+        print(f'python interpreter: {interpreter:.1f} ms')
+        for command in (['list', '--limit', '10'], ['stats'], ['search', 'star']):
+            elapsed = measure(['main.py', *command, '-d', database])
+            print(f'main.py {" ".join(command)}: {elapsed:.1f} ms ({elapsed - interpreter:.1f} ms over the interpreter)')
+    heavy = loaded_heavy_modules()
+    print(f'modules loaded at startup: {", ".join(heavy) if heavy else "none of " + ", ".join(HEAVY_MODULES)}')
+
+
+if __name__ == '__main__':
+    main()
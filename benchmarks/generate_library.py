@@ -0,0 +1,88 @@
+"""Generates synthetic movie libraries in the database formats of the app.
+Run from the repository root: python -m benchmarks.generate_library 100000 /tmp/library.csv"""
+import argparse
+import os
+import random
+from storage.storage_csv import StorageCsv
+from storage.storage_json import StorageJson
+from storage.storage_jsonl import StorageJsonl
+from storage.storage_sharded import StorageSharded
+from storage.storage_sqlite import StorageSqlite
+
+FLAGS = ['🇺🇸', '🇬🇧', '🇩🇪', '🇫🇷', '🇯🇵', '🇰🇷', '🇮🇹', '🇪🇸']
+COUNTRIES = ['USA', 'UK', 'Germany', 'France', 'Japan', 'South Korea', 'Italy', 'Spain']
+POSTER_PREFIX = 'https://m.media-amazon.com/images/M/'
+WORDS = ['Star', 'Night', 'Love', 'Dark', 'River', 'Ghost', 'King', 'Summer', 'City', 'Blood',
+         'Dream', 'Secret', 'Last', 'Wild', 'Garden', 'Storm', 'Silent', 'Golden', 'War', 'Road']
+
+
+def movie_title(number, generator):
+    """Returns a unique movie title"""
+    return f'{" ".join(generator.choices(WORDS, k=generator.randint(1, 3)))} {number}'
+
+
+def generate_movies(count, seed=1):
+    """Generates movies in the format returned by StorageCsv.list_movies
+    :param count: number of movies
+    :param seed: random seed, the same seed gives the same library
+    :return: generator of (title, info) tuples
+    """
+    generator = random.Random(seed)
+    for number in range(count):
+        country = generator.randrange(len(FLAGS))
+        yield movie_title(number, generator), {"year": generator.randint(1920, 2024),
+                                               "rating": round(generator.uniform(1, 10), 1),
+                                               "poster": f'{POSTER_PREFIX}MV5B{number:012d}@._V1_SX300.jpg',
+                                               "notes": "",
+                                               "imdb_id": f'tt{number:07d}',
+                                               "flag": FLAGS[country]}
+
+
+def omdb_response(title, info):
+    """Returns OMDb API response of a generated movie, used by the stub API server"""
+    return {"Title": title,
+            "Year": str(info["year"]),
+            "imdbRating": str(info["rating"]),
+            "Poster": info["poster"],
+            "imdbID": info["imdb_id"],
+            "Country": COUNTRIES[FLAGS.index(info["flag"])],
+            "Response": "True"}
+
+
+def write_library(filepath, movies):
+    """Writes movies to a database file, the format is taken from the file extension
+    :param filepath: .csv, .json, .jsonl, .db, .sqlite or .shards file path
+    :param movies: iterable of (title, info) tuples
+    :return: None
+    """
+    extension = os.path.splitext(filepath)[1]
+    if extension == '.csv':
+        with open(filepath, 'w', encoding='utf-8', newline='') as handle:
+            StorageCsv.write_rows(handle, movies, write_header=True)
+    elif extension == '.json':
+        with open(filepath, 'w', encoding='utf-8') as handle:
+            StorageJson.write_movies(handle, movies)
+    elif extension in ('.jsonl', '.db', '.sqlite'):
+        storage = StorageJsonl(filepath) if extension == '.jsonl' else StorageSqlite(filepath)
+        storage.update_database(dict(movies))
+        storage.close()
+    elif extension == '.shards':
+        storage = StorageSharded(filepath)
+        storage.update_database(dict(movies))
+        storage.close()
+    else:
+        raise ValueError(f'Unknown database format of "{filepath}"')
+
+
+def main():
+    """Reads command line arguments and writes the library"""
+    parser = argparse.ArgumentParser(description='Generates a synthetic movie library')
+    parser.add_argument('count', type=int, help='number of movies')
+    parser.add_argument('filepath', help='output database file (.csv, .json, .jsonl, .db, .shards)')
+    parser.add_argument('--seed', type=int, default=1, help='random seed')
+    arguments = parser.parse_args()
+    write_library(arguments.filepath, generate_movies(arguments.count, arguments.seed))
+
+
+if __name__ == '__main__':
+    main()
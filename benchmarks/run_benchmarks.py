@@ -0,0 +1,195 @@
+"""Times MovieApp commands against every storage backend on synthetic libraries.
+Results are saved as JSON and can be compared with a saved baseline to catch regressions.
+
+Run from the repository root:
+    python -m benchmarks.run_benchmarks --sizes 1000,10000 --output results.json
+    python -m benchmarks.run_benchmarks --sizes 1000,10000 --compare results.json
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from unittest import mock
+from benchmarks.generate_library import generate_movies, omdb_response, write_library
+from main import create_indexes
+from movie_app import MovieApp
+from omdb.stub_server import StubOmdbServer
+from storage.storage_cached import StorageCached
+from storage.storage_csv import StorageCsv
+from storage.storage_journal import StorageJournal
+from storage.storage_json import StorageJson
+from storage.storage_jsonl import StorageJsonl
+from storage.storage_sharded import StorageSharded
+from storage.storage_sqlite import StorageSqlite
+
+BACKENDS = {
+    'csv': ('.csv', StorageCsv),
+    'json': ('.json', StorageJson),
+    'cached-csv': ('.csv', lambda path: StorageCached(StorageCsv(path), create_indexes(StorageCsv(path)))),
+    'journal-csv': ('.csv', lambda path: StorageJournal(StorageCsv(path), indexes=create_indexes(StorageCsv(path)))),
+    'sqlite': ('.db', StorageSqlite),
+    'jsonl': ('.jsonl', StorageJsonl),
+    'sharded': ('.shards', StorageSharded),
+}
+
+
+def operations(titles, new_titles):
+    """Returns benchmarked operations: name -> callable (app, run number) returning
+    the list of user inputs the command reads"""
+    return {
+        'list': lambda run: (MovieApp._command_list_movies, []),
+        'add': lambda run: (MovieApp._add_movie, [new_titles[run]]),
+        'delete': lambda run: (MovieApp._delete_movie, [titles[run]]),
+        'update': lambda run: (MovieApp._update_movie, [titles[-run - 1], f'notes {run}']),
+        'stats': lambda run: (MovieApp._command_movie_stats, []),
+        'search': lambda run: (MovieApp._search_movie, ['golden']),
+        'filter': lambda run: (MovieApp._filter_movies, ['7', '8', '1990', '2000']),
+        'sorted_by_rating': lambda run: (MovieApp._print_sorted_by_rating, []),
+        'sorted_by_year': lambda run: (MovieApp._print_sorted_by_year, ['y']),
+        'website': lambda run: (MovieApp._generate_website, []),
+        'refresh': lambda run: (MovieApp._update_movies_info, []),
+    }
+
+
+def time_command(app, command, inputs):
+    """Runs one MovieApp command with given user inputs and hidden output
+    :return: elapsed seconds
+    """
+    with mock.patch('builtins.input', side_effect=inputs), contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        command(app)
+        return time.perf_counter() - start
+
+
+def benchmark_backend(backend, size, repeat, refresh_limit, workdir):
+    """Times all operations of one backend on a library of given size
+    :return: dict of operation name -> best time in seconds (None if skipped or failed)
+    """
+    extension, create_storage = BACKENDS[backend]
+    movies = list(generate_movies(size + repeat))
+    library, extra = movies[:size], movies[size:]
+    datafile = os.path.join(workdir, f'{backend}-{size}{extension}')
+    write_library(datafile, library)
+    titles = [title for title, info in library]
+    stub_movies = {title: omdb_response(title, info) for title, info in extra}
+    if size <= refresh_limit:
+        stub_movies.update((title, omdb_response(title, info)) for title, info in library)
+    results = {}
+    with StubOmdbServer(stub_movies) as stub:
+        MovieApp.omdb_url = stub.url
+        MovieApp._omdb_client = None
+        MovieApp.omdb_cache_file = os.path.join(workdir, f'{backend}-{size}-cache.db')
+        storage = create_storage(datafile)
+        app = MovieApp(storage)
+        for name, command_for_run in operations(titles, [title for title, info in extra]).items():
+            if name == 'refresh' and size > refresh_limit:
+                results[name] = None
+                continue
+            timings = []
+            try:
+                for run in range(repeat):
+                    if name == 'website':
+                        # a fresh output directory, so no page is skipped as unchanged
+                        MovieApp.website_dir = tempfile.mkdtemp(dir=workdir)
+                    command, inputs = command_for_run(run)
+                    timings.append(time_command(app, command, inputs))
+            except Exception as error:
+                print(f'{backend}, {size} movies: {name} failed: {error!r}', file=sys.stderr)
+                results[name] = None
+                continue
+            results[name] = min(timings)
+        storage.close()
+        MovieApp.omdb_client().close()
+        MovieApp._omdb_client = None
+    return results
+
+
+def run(sizes, backends, repeat, refresh_limit):
+    """Runs benchmarks of all backends and sizes
+    :return: dict ready to be saved as JSON
+    """
+    report = {"meta": {"date": datetime.datetime.now().isoformat(timespec='seconds'),
+                       "python": platform.python_version(),
+                       "platform": platform.platform(),
+                       "repeat": repeat},
+              "results": {}}
+    MovieApp.api_key = 'benchmark'
+    MovieApp.refresh_workers = 16
+    MovieApp.refresh_rate_limit = 1000000
+    # every run refreshes all movies, bench_refresh measures refreshes of stale movies only
+    MovieApp.refresh_max_age = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        # poster downloads are measured by bench_posters against a local stub
+        MovieApp.website_posters = False
+        for backend in backends:
+            for size in sizes:
+                print(f'{backend}, {size} movies...', file=sys.stderr, flush=True)
+                report["results"].setdefault(backend, {})[str(size)] = \
+                    benchmark_backend(backend, size, repeat, refresh_limit, workdir)
+    return report
+
+
+def compare(report, baseline, threshold):
+    """Prints timings next to the baseline ones
+    :return: list of regressions (backend, size, operation, ratio)
+    """
+    regressions = []
+    for backend, sizes in report["results"].items():
+        for size, timings in sizes.items():
+            for name, seconds in timings.items():
+                base = baseline["results"].get(backend, {}).get(size, {}).get(name)
+                if seconds is None or not base:
+                    continue
+                ratio = seconds / base
+                marker = ''
+                if ratio > 1 + threshold:
+                    regressions.append((backend, size, name, ratio))
+                    marker = '  <-- regression'
+                print(f'{backend:12} {size:>8} {name:18} {base:10.4f} s -> {seconds:10.4f} s '
+                      f'({ratio:.2f}x){marker}')
+    return regressions
+
+
+def main():
+    """Reads command line arguments, runs benchmarks, saves and compares results"""
+    parser = argparse.ArgumentParser(description='Benchmarks MovieApp commands against storage backends')
+    parser.add_argument('--sizes', default='1000,10000',
+                        help='comma separated library sizes, e.g. 1000,10000,100000,1000000')
+    parser.add_argument('--backends', default=','.join(BACKENDS),
+                        help=f'comma separated backends out of {", ".join(BACKENDS)}')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of every operation, the best is kept')
+    parser.add_argument('--refresh-limit', type=int, default=2000,
+                        help='biggest library to benchmark refresh against the stub API')
+    parser.add_argument('--output', help='save results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to compare results with')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='slowdown ratio over the baseline reported as a regression')
+    arguments = parser.parse_args()
+    backends = arguments.backends.split(',')
+    for backend in backends:
+        if backend not in BACKENDS:
+            parser.error(f'unknown backend {backend}')
+    report = run([int(size) for size in arguments.sizes.split(',')], backends,
+                 arguments.repeat, arguments.refresh_limit)
+    if arguments.output:
+        with open(arguments.output, 'w', encoding='utf-8') as handle:
+            handle.write(json.dumps(report, indent=2))
+    else:
+        print(json.dumps(report, indent=2))
+    if arguments.compare:
+        with open(arguments.compare, 'r', encoding='utf-8') as handle:
+            baseline = json.loads(handle.read())
+        regressions = compare(report, baseline, arguments.threshold)
+        if regressions:
+            print(f'{len(regressions)} regression(s) found')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
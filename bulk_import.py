@@ -0,0 +1,85 @@
+import re
+
+
+class ImportResult:
+    """Outcome of a bulk import"""
+
+    def __init__(self):
+        """Instance initialization"""
+        self.added = []
+        self.duplicates = []
+        self.not_found = []
+        self.failed = []
+        # movies answered by the response cache and fetched from the API, set by MovieApp.import_movies
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def summary(self):
+        """Returns one line summary of the import
+        :return: string
+        """
+        return (f'{len(self.added)} added, {len(self.duplicates)} duplicates, '
+                f'{len(self.not_found)} not found, {len(self.failed)} failed')
+
+
+class BulkImporter:
+    """Imports many movies given by titles or IMDb ids.
+    Movies are fetched from the API concurrently and saved to the storage with a single write"""
+
+    imdb_id_pattern = re.compile(r'^tt\d+$')
+
+    def __init__(self, storage, engine, movie_info):
+        """Instance initialization
+        :param storage: IStorage instance
+        :param engine: omdb.refresh.RefreshEngine instance
+        :param movie_info: callable converting API response to a movie info dictionary
+        """
+        self._storage = storage
+        self._engine = engine
+        self._movie_info = movie_info
+
+    @staticmethod
+    def read_keys(handle):
+        """Reads movie titles or IMDb ids, one per line, skipping empty lines
+        :param handle: text file object
+        :return: list of strings
+        """
+        return [line.strip() for line in handle if line.strip()]
+
+    def run(self, keys, progress=None):
+        """Imports movies. Movies already in the database, unknown movies and
+        movies that failed to load are reported instead of stopping the import
+        :param keys: list of movie titles or IMDb ids
+        :param progress: optional callable (key, status) called after each fetched movie
+        :return: ImportResult
+        """
+        result = ImportResult()
+        movies = self._storage.list_movies()
+        known_ids = {info.get('imdb_id') for info in movies.values() if info.get('imdb_id')}
+        titles, imdb_ids = [], []
+        seen = set()
+        for key in keys:
+            is_imdb_id = bool(BulkImporter.imdb_id_pattern.match(key))
+            if key in seen or key in movies or (is_imdb_id and key in known_ids):
+                result.duplicates.append(key)
+                continue
+            seen.add(key)
+            (imdb_ids if is_imdb_id else titles).append(key)
+        new_movies = {}
+        for batch, by_id in ((titles, False), (imdb_ids, True)):
+            if not batch:
+                continue
+            fetched = self._engine.fetch(batch, by_id=by_id, progress=progress)
+            result.not_found.extend(fetched.not_found)
+            result.failed.extend(fetched.failed)
+            for key, response in fetched.found.items():
+                title = key if not by_id else response['Title']
+                if title in movies or title in new_movies or response['imdbID'] in known_ids:
+                    result.duplicates.append(key)
+                    continue
+                known_ids.add(response['imdbID'])
+                new_movies[title] = self._movie_info(response)
+                result.added.append(title)
+        if new_movies:
+            self._storage.add_movies(new_movies)
+        return result
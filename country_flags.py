@@ -0,0 +1,84 @@
+"""Country name to flag emoji lookup.
+The country names table (country_codes.py) is generated from pycountry once,
+so pycountry is not imported at runtime. Regenerate the table after a pycountry
+update with: python3 country_flags.py"""
+import functools
+
+# OMDb and historical spellings missing from ISO 3166 names
+ALIASES = {
+    'usa': 'US',
+    'uk': 'GB',
+    'russia': 'RU',
+    'soviet union': 'RU',
+    'south korea': 'KR',
+    'north korea': 'KP',
+    'korea': 'KR',
+    'turkey': 'TR',
+    'west germany': 'DE',
+    'east germany': 'DE',
+    'czechoslovakia': 'CZ',
+    'yugoslavia': 'RS',
+    'federal republic of yugoslavia': 'RS',
+    'serbia and montenegro': 'RS',
+    'palestine': 'PS',
+    'occupied palestinian territory': 'PS',
+    'ivory coast': 'CI',
+    'cape verde': 'CV',
+    'swaziland': 'SZ',
+    'burma': 'MM',
+    'republic of macedonia': 'MK',
+    'macedonia': 'MK',
+    'democratic republic of the congo': 'CD',
+    'the democratic republic of the congo': 'CD',
+    'republic of the congo': 'CG',
+    'micronesia': 'FM',
+    'vatican': 'VA',
+    'holy see (vatican city state)': 'VA',
+    'brunei': 'BN',
+    'east timor': 'TL',
+}
+
+
+def flag_emoji(alpha_2):
+    """Returns flag emoji of a two-letter country code, made of two regional indicator symbols
+    :param alpha_2: ISO 3166-1 alpha-2 code like 'GB'
+    :return: string
+    """
+    return ''.join(chr(0x1F1E6 + ord(letter) - ord('A')) for letter in alpha_2.upper())
+
+
+@functools.lru_cache(maxsize=1024)
+def country_flag(name):
+    """Returns flag emoji of a country name (case-insensitive, OMDb spellings like 'UK' or 'USA' included)
+    :param name: country name
+    :return: flag emoji or empty string for an unknown country
+    """
+    from country_codes import COUNTRY_CODES
+    key = name.strip().casefold()
+    alpha_2 = COUNTRY_CODES.get(key) or ALIASES.get(key)
+    return flag_emoji(alpha_2) if alpha_2 else ''
+
+
+def write_country_codes(filepath='country_codes.py'):
+    """Generates the module with names (common, official and ISO) of all pycountry countries
+    :param filepath: generated module path
+    :return: number of names
+    """
+    import pycountry
+    codes = {}
+    for country in pycountry.countries:
+        for name in (country.name, getattr(country, 'common_name', None), getattr(country, 'official_name', None)):
+            if name:
+                codes.setdefault(name.casefold(), country.alpha_2)
+    with open(filepath, 'w', encoding='utf-8') as handle:
+        handle.write('"""Country names (case folded) to ISO 3166-1 alpha-2 codes.\n'
+                     'Generated by country_flags.py from pycountry, do not edit"""\n\n')
+        handle.write('COUNTRY_CODES = {\n')
+        for name, code in sorted(codes.items()):
+            handle.write(f'    {name!r}: {code!r},\n')
+        handle.write('}\n')
+    return len(codes)
+
+
+if __name__ == '__main__':
+    print(f'{write_country_codes()} country names written to country_codes.py')
@@ -0,0 +1,56 @@
+import html
+import string
+
+
+def escape(value):
+    """Returns HTML escaped text of the value, quotes included.
+    Most values have nothing to escape and are returned as they are"""
+    if type(value) is str:
+        if '&' in value or '<' in value or '>' in value or '"' in value or "'" in value:
+            return html.escape(value, quote=True)
+        return value
+    if type(value) in (int, float):
+        return value
+    return html.escape(str(value), quote=True)
+
+
+class CompiledTemplate:
+    """HTML template with {field} placeholders compiled once into a function returning
+    one f-string, so a page fragment is built in a single pass without intermediate copies.
+    Field values are HTML escaped except for raw fields. Format specs like {rating:g} are kept.
+    The render attribute is the compiled function taking all fields as keyword arguments"""
+
+    def __init__(self, template, raw_fields=()):
+        """Instance initialization
+        :param template: template text, literal braces are doubled as in str.format
+        :param raw_fields: names of fields inserted without escaping (numbers, trusted markup)
+        """
+        self.template = template
+        self.fields = []
+        source = []
+        # every escaped or formatted value is computed once, even if the field is repeated
+        values = {}
+        for literal, field, spec, conversion in string.Formatter().parse(template):
+            source.append(literal.replace('{', '{{').replace('}', '}}'))
+            if field is None:
+                continue
+            if not field.isidentifier():
+                raise ValueError(f'Template field {field!r} is not a name')
+            if field not in self.fields:
+                self.fields.append(field)
+            expression = field if field in raw_fields else f'_escape({field})'
+            if spec:
+                expression = f'format({expression}, {spec!r})'
+            if expression == field:
+                source.append(f'{{{field}}}')
+                continue
+            variable = values.setdefault(expression, f'_value{len(values)}')
+            source.append(f'{{{variable}}}')
+        lines = [f'def render(*, {", ".join(self.fields)}):']
+        lines += [f'    {variable} = {expression}' for expression, variable in values.items()]
+        lines.append(f'    return f{"".join(source)!r}')
+        code = '\n'.join(lines) + '\n'
+        namespace = {'_escape': escape}
+        exec(compile(code, '<template>', 'exec'), namespace)
+        self.render = namespace['render']
+
@@ -1,30 +1,132 @@
 import argparse
 import os
+import sys
+from metrics import METRICS
 from storage.storage_json import StorageJson
 from storage.storage_csv import StorageCsv
+from storage.storage_sqlite import StorageSqlite
+from storage.storage_jsonl import StorageJsonl
+from storage.storage_sharded import StorageSharded
+from storage.storage_cached import StorageCached
+from storage.storage_journal import StorageJournal
+from storage.title_index import TitleIndex
+from storage.sorted_index import SortedIndex, rating_value, year_value
+from storage.stats_aggregator import StatsAggregator
 from movie_app import MovieApp
+from movie_commands import MovieCommands
 
 
-def main():
-    """Reads passed commandline argument, create instance of class StorageJson or StorageCsv,
-    MovieApp and runs MovieApp
+def create_indexes(storage):
+    """Creates indexes kept next to the database file of the storage
+    :param storage: file storage instance
+    :return: list of indexes
     """
-    parser = argparse.ArgumentParser()
-    parser.add_argument('echo', nargs='?')
-    filename_from_argument = parser.parse_args().echo
-    if not filename_from_argument:
-        filename_from_argument = ""
-    if filename_from_argument.endswith('.csv'):
-        storage = StorageCsv(filename_from_argument)
-    elif filename_from_argument.endswith('.json'):
-        storage = StorageJson(filename_from_argument)
+    return [TitleIndex(f'{storage.filepath}.titles.idx'),
+            SortedIndex('rating', rating_value),
+            SortedIndex('year', year_value),
+            StatsAggregator()]
+
+
+def create_storage(filename, journal=False, compact=False):
+    """Creates storage of the database file by its extension: StorageCsv, StorageJson, StorageSqlite,
+    StorageJsonl or StorageSharded, wraps csv and json storages into StorageCached (or StorageJournal in journal mode)
+    :param filename: database file path, the default database is used for an unknown extension
+    :param journal: append changes to a journal file instead of rewriting the database
+    :param compact: keep movies in a compact columnar table
+    :return: IStorage instance
+    """
+    if filename.endswith('.csv'):
+        storage = StorageCsv(filename, compact)
+    elif filename.endswith('.json'):
+        storage = StorageJson(filename, compact)
+    elif filename.endswith(('.db', '.sqlite')):
+        storage = StorageSqlite(filename)
+    elif filename.endswith('.jsonl'):
+        storage = StorageJsonl(filename)
+    elif filename.endswith('.shards'):
+        storage = StorageSharded(filename)
     else:
         filename = os.path.join("data", "data.csv")
-        print(f'No valid filename is provided. Proceeding with default database "{filename}"')
-        storage = StorageCsv(filename)
+        print(f'No valid filename is provided. Proceeding with default database "{filename}"', file=sys.stderr)
+        storage = StorageCsv(filename, compact)
+
+    if isinstance(storage, (StorageSqlite, StorageJsonl, StorageSharded)):
+        # SQLite answers queries itself, JSON Lines reads single movies directly,
+        # sharded storages write single shards and scan them in parallel
+        return storage
+    if journal:
+        return StorageJournal(storage, indexes=create_indexes(storage))
+    return StorageCached(storage, indexes=create_indexes(storage))
+
+
+def run_command(argv):
+    """Runs one non-interactive command (or a batch of them) and prints its JSON result
+    :param argv: command line arguments starting with the command name
+    :return: exit code
+    """
+    arguments = MovieCommands.create_parser().parse_args(argv)
+    storage = create_storage(arguments.database, arguments.journal, arguments.compact)
+    try:
+        return MovieCommands(storage).run(arguments)
+    finally:
+        storage.close()
 
+
+def main():
+    """Runs a non-interactive command if the first argument is a command name (see main.py --help),
+    otherwise reads passed database file argument, creates its storage and runs interactive MovieApp
+    """
+    if len(sys.argv) > 1 and sys.argv[1] in MovieCommands.commands:
+        sys.exit(run_command(sys.argv[1:]))
+    parser = argparse.ArgumentParser(epilog='Commands for scripts, with JSON output: '
+                                            f'{", ".join(MovieCommands.commands)} '
+                                            '(main.py <command> --help for their options)')
+    parser.add_argument('echo', nargs='?')
+    parser.add_argument('--journal', action='store_true',
+                        help='append changes to a journal file instead of rewriting the database')
+    parser.add_argument('--compact', action='store_true',
+                        help='keep movies in a compact columnar table to save memory')
+    parser.add_argument('--profile', action='store_true',
+                        help='profile the session, print metrics after every command and save them on exit')
+    parser.add_argument('--profile-output', default='profile',
+                        help='file name prefix of the saved cProfile data and metrics')
+    parser.add_argument('--metrics-format', choices=('json', 'prometheus'), default='json',
+                        help='format of the saved metrics')
+    arguments = parser.parse_args()
+    storage = create_storage(arguments.echo or "", arguments.journal, arguments.compact)
     movie_app = MovieApp(storage)
-    movie_app.run()
+    if not arguments.profile:
+        movie_app.run()
+        storage.close()
+        return
+    import cProfile
+    MovieApp.print_metrics = True
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(movie_app.run)
+    finally:
+        storage.close()
+        save_profile(profiler, arguments.profile_output, arguments.metrics_format)
+
+
+def save_profile(profiler, prefix, metrics_format):
+    """Prints the most expensive functions of the profiled session and saves
+    cProfile data to <prefix>.prof and metrics to <prefix>.metrics.json or <prefix>.metrics.prom
+    :param profiler: finished cProfile.Profile
+    :param prefix: output file name prefix
+    :param metrics_format: 'json' or 'prometheus'
+    :return: None
+    """
+    import pstats
+    profiler.dump_stats(f'{prefix}.prof')
+    pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+    if metrics_format == 'prometheus':
+        metrics_file, metrics = f'{prefix}.metrics.prom', METRICS.to_prometheus()
+    else:
+        metrics_file, metrics = f'{prefix}.metrics.json', METRICS.to_json()
+    with open(metrics_file, 'w', encoding='utf-8') as handle:
+        handle.write(metrics)
+    print(f'Profile saved to {prefix}.prof, metrics saved to {metrics_file}')
 
 
 if __name__ == "__main__":
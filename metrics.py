@@ -0,0 +1,183 @@
+import contextlib
+import functools
+import json
+import re
+import threading
+import time
+
+
+class Metrics:
+    """Collects timers and counters of the application hot paths
+    (storage reads and writes, API requests, flag lookups, website rendering)
+    and summarizes them per user command"""
+
+    prefix = 'movies'
+
+    def __init__(self):
+        """Instance initialization"""
+        self._lock = threading.Lock()
+        self.timers = {}
+        self.counters = {}
+        self.commands = {}
+
+    def reset(self):
+        """Forgets all collected metrics
+        :return: None
+        """
+        with self._lock:
+            self.timers = {}
+            self.counters = {}
+            self.commands = {}
+
+    def record(self, name, seconds):
+        """Adds one measured call to the timer
+        :param name: timer name like 'storage.csv.read'
+        :param seconds: call duration
+        :return: None
+        """
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                self.timers[name] = {"count": 1, "seconds": seconds, "max": seconds}
+                return
+            timer["count"] += 1
+            timer["seconds"] += seconds
+            if seconds > timer["max"]:
+                timer["max"] = seconds
+
+    def count(self, name, amount=1):
+        """Increments the counter
+        :param name: counter name like 'omdb.cache_hits'
+        :param amount: increment
+        :return: None
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """Context manager measuring its block with the timer
+        :param name: timer name
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        """Decorator measuring every call of the function with the timer
+        :param name: timer name
+        :return: decorator
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    @contextlib.contextmanager
+    def command(self, name):
+        """Context manager measuring one user command. Timers and counters changed
+        during the command are added to its summary in self.commands
+        :param name: command name
+        """
+        timers, counters = self._snapshot()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            new_timers, new_counters = self._snapshot()
+            with self._lock:
+                summary = self.commands.setdefault(name, {"count": 0, "seconds": 0.0,
+                                                          "timers": {}, "counters": {}})
+                summary["count"] += 1
+                summary["seconds"] += seconds
+                for timer_name, (count, timer_seconds) in new_timers.items():
+                    old_count, old_seconds = timers.get(timer_name, (0, 0.0))
+                    if count == old_count:
+                        continue
+                    timer = summary["timers"].setdefault(timer_name, {"count": 0, "seconds": 0.0})
+                    timer["count"] += count - old_count
+                    timer["seconds"] += timer_seconds - old_seconds
+                for counter_name, value in new_counters.items():
+                    if value != counters.get(counter_name, 0):
+                        summary["counters"][counter_name] = (summary["counters"].get(counter_name, 0)
+                                                             + value - counters.get(counter_name, 0))
+
+    def command_summary(self, name):
+        """Returns readable summary of all runs of the command
+        :param name: command name
+        :return: str
+        """
+        summary = self.commands.get(name)
+        if summary is None:
+            return f'{name}: not run'
+        lines = [f'{name}: {summary["count"]} run(s), {summary["seconds"] * 1000:.1f} ms']
+        for timer_name, timer in sorted(summary["timers"].items(), key=lambda item: -item[1]["seconds"]):
+            lines.append(f'  {timer_name}: {timer["count"]} call(s), {timer["seconds"] * 1000:.1f} ms')
+        for counter_name, value in sorted(summary["counters"].items()):
+            lines.append(f'  {counter_name}: {value}')
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        """Returns all metrics as a dictionary
+        :return: dict with timers, counters and commands
+        """
+        with self._lock:
+            return json.loads(json.dumps({"timers": self.timers,
+                                          "counters": self.counters,
+                                          "commands": self.commands}))
+
+    def to_json(self):
+        """Returns all metrics as JSON text
+        :return: str
+        """
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self):
+        """Returns all metrics in Prometheus text exposition format
+        :return: str
+        """
+        metrics = self.to_dict()
+        lines = []
+        for name, timer in sorted(metrics["timers"].items()):
+            metric = self._metric_name(name)
+            lines.append(f'# TYPE {metric}_seconds summary')
+            lines.append(f'{metric}_seconds_count {timer["count"]}')
+            lines.append(f'{metric}_seconds_sum {timer["seconds"]:.6f}')
+            lines.append(f'# TYPE {metric}_seconds_max gauge')
+            lines.append(f'{metric}_seconds_max {timer["max"]:.6f}')
+        for name, value in sorted(metrics["counters"].items()):
+            metric = self._metric_name(name)
+            lines.append(f'# TYPE {metric}_total counter')
+            lines.append(f'{metric}_total {value}')
+        if metrics["commands"]:
+            metric = f'{self.prefix}_command_seconds'
+            lines.append(f'# TYPE {metric} summary')
+            for name, summary in sorted(metrics["commands"].items()):
+                label = name.replace('\\', '\\\\').replace('"', '\\"')
+                lines.append(f'{metric}_count{{command="{label}"}} {summary["count"]}')
+                lines.append(f'{metric}_sum{{command="{label}"}} {summary["seconds"]:.6f}')
+        return '\n'.join(lines) + '\n'
+
+    def _metric_name(self, name):
+        """Converts metric name like 'storage.csv.read' to a Prometheus one"""
+        return f'{self.prefix}_{re.sub(r"[^a-zA-Z0-9_]", "_", name)}'
+
+    def _snapshot(self):
+        """Returns copies of timer totals and counters
+        :return: tuple of dicts
+        """
+        with self._lock:
+            return ({name: (timer["count"], timer["seconds"]) for name, timer in self.timers.items()},
+                    dict(self.counters))
+
+
+METRICS = Metrics()
@@ -1,54 +1,137 @@
-import json
+import os
 import statistics
 import datetime
 import random
-import requests
-import dotenv
-import pycountry
+import sys
+import time
+from itertools import chain, takewhile
+from metrics import METRICS
+from site_generator import SiteGenerator
+from html_template import CompiledTemplate
+from movie_query import MovieQuery, pages
+from bulk_import import BulkImporter
+from country_flags import country_flag
+from storage.sorted_index import rating_value, year_value
 
 
 class MovieApp:
     """Main MovieApp clas responsible for user interaction"""
 
-    api_key = dotenv.get_key('.env', 'API_KEY')
+    # api_key is read from the .env file by the first command that needs the API
+    api_key = None
+    env_file = '.env'
+    # None means OmdbClient.default_url
+    omdb_url = None
+    omdb_cache_file = '.omdb_cache.db'
+    omdb_cache_ttl = 7 * 24 * 3600
+    refresh_workers = 8
+    refresh_rate_limit = 10
+    # movies are refreshed again after refresh_max_age seconds, at most refresh_batch_size per run
+    refresh_max_age = 30 * 24 * 3600
+    refresh_batch_size = None
+    _omdb_client = None
+    website_template = '_static/index_template.html'
+    website_dir = '_static'
+    website_page_size = 1000
+    website_by_year = False
+    website_workers = 1
+    # posters are downloaded into website_dir/website_posters_dir, False links the remote urls
+    website_posters = True
+    website_posters_dir = 'posters'
+    poster_workers = 8
+    print_metrics = False
+    # movies lists are printed as they are read, print_page_size movies at a time
+    print_page_size = 100
+    # movie card of the website, the same markup html_tag_wrap calls used to build
+    card_template = CompiledTemplate(
+        '<li><div class="movie"><div class="flag">{flag}</div>'
+        '<a href="https://imdb.com/title/{imdb_id}" target="_blank">'
+        '<img title="{notes}" class="movie-poster" src="{poster}" alt="movie-poster"></a>'
+        '<div class="movie-title">{title}</div><div class="movie-year">{year}</div>'
+        '<div style="background: linear-gradient(#F2A766 0 0) 0/{percent:g}% no-repeat #F2D8C9;" '
+        'class="movie-rating-bar"><i style="left: {percent:g}%" class="fa-solid fa-star"></i>'
+        '<span style="left: {percent:g}%" class="ratings">{rating}</span></div></div></li>',
+        raw_fields=('percent', 'rating'))
     function_list = {}
     min_rating = 0
     max_rating = 10
+    breakdown_fields = ('year', 'flag')
 
     def __init__(self, storage):
         """Instance initialization"""
         self._storage = storage
+        self.poster_cache = None
 
     def _command_list_movies(self):
         """Prints all movies from instance storage"""
         movies = self._storage.list_movies()
-        try:
-            print(f'{len(movies)} movies in total: {self._movie_string(self._storage.list_movies().keys())}')
-        except json.decoder.JSONDecodeError:
+        if not movies:
             print('Movies database is empty!')
+            return
+        self._print_movies(movies.items(), f'{len(movies)} movies in total:')
 
-    def _movie_string(self, title):
-        """Takes a movie title and returns a string with info
+    @staticmethod
+    def _movies_string(movies):
+        """Takes a list of (title, info) tuples and returns a string with info
         about movie or a multistring with info about movies
-        :param title: movie title as a string,
-        list of movie titles or a dictionary key with movie titles
+        :param movies: list of (title, info) tuples
         :return: string or multistring
         """
-        movies = self._storage.list_movies()
-        if type(title) is type(movies.keys()):
-            title = list(title)
-        if isinstance(title, list):
-            if len(title) > 1:
-                return_string = ""
-                for movie in title:
-                    year = movies[movie]['year']
-                    rating = movies[movie]['rating']
-                    return_string += f'\n\t{movie} ({year}): {rating}'
-                return return_string
-            title = title[0]
-        year = movies[title]['year']
-        rating = movies[title]['rating']
-        return f'{title} ({year}): {rating}'
+        if len(movies) > 1:
+            return MovieApp._movies_lines(movies)
+        title, info = movies[0]
+        return f'{title} ({info["year"]}): {info["rating"]}'
+
+    @staticmethod
+    def _movies_lines(movies):
+        """Returns a multistring with one line of info per movie
+        :param movies: iterable of (title, info) tuples
+        :return: string
+        """
+        return ''.join(f'\n\t{title} ({info["year"]}): {info["rating"]}' for title, info in movies)
+
+    @staticmethod
+    def _print_movies(movies, header, one_header=None):
+        """Prints movies page by page as they are read, a single movie is printed on the header line
+        :param movies: iterable of (title, info) tuples, e.g. a MovieQuery
+        :param header: text printed before the list of movies
+        :param one_header: text printed before a single movie, header by default
+        :return: number of printed movies
+        """
+        movie_pages = pages(movies, MovieApp.print_page_size)
+        page = next(movie_pages, [])
+        if not page:
+            return 0
+        if len(page) == 1:
+            next_page = next(movie_pages, [])
+            if not next_page:
+                print(f'{header if one_header is None else one_header} {MovieApp._movies_string(page)}')
+                return 1
+            movie_pages = chain([next_page], movie_pages)
+        print(header, end='')
+        count = 0
+        for page in chain([page], movie_pages):
+            print(MovieApp._movies_lines(page), end='', flush=True)
+            count += len(page)
+        print()
+        return count
+
+    def query(self):
+        """Returns a lazy query of all movies of the storage, see MovieQuery
+        :return: MovieQuery
+        """
+        return MovieQuery(self._storage)
+
+    def _query(self, name, *args):
+        """Calls optional query method of the storage (search_titles, filter_movies,
+        sorted_movies, movie_stats) if the storage provides it
+        :param name: query method name
+        :return: query result or None if the storage can't answer the query
+        """
+        query = getattr(self._storage, name, None)
+        if query is None:
+            return None
+        return query(*args)
 
     @staticmethod
     def get_title(custom_string=""):
@@ -112,6 +195,20 @@ class MovieApp:
             title, year, rating, poster, imdb_id, flag = movie_info
             self._storage.add_movie(title, year, rating, poster, imdb_id, flag)
 
+    def add_movie_from_api(self, title):
+        """Fetches movie info from the API by its title and adds the movie to the database.
+        Raises requests.exceptions.RequestException on connection problems
+        and LookupError if the API doesn't know the movie
+        :param title: movie title
+        :return: tuple (title, info) of the added movie
+        """
+        response = MovieApp.omdb_client().get_by_title(title)
+        if response['Response'] == 'False':
+            raise LookupError(response['Error'])
+        info = MovieApp.movie_info(response)
+        self._storage.add_movie(title, info['year'], info['rating'], info['poster'], info['imdb_id'], info['flag'])
+        return title, info
+
     def _delete_movie(self):
         """Deletes a movie from a storage database
         :return: None
@@ -132,7 +229,7 @@ class MovieApp:
         while True:
             title = MovieApp.get_title('you want to update')
             try:
-                if title not in self._storage.list_movies():
+                if self._storage.get_movie(title) is None:
                     raise KeyError
             except KeyError:
                 print(f'There is no movie called "{title}" in a database')
@@ -150,82 +247,171 @@ class MovieApp:
         """Prints statistics of storage database movies
             :return: None
             """
-        data = self._storage.list_movies()
+        stats = self.movie_stats()
+        if not stats['count']:
+            print('Movies database is empty!')
+            return
+        print('Statistics about the movies in the database:')
+        print(f'Average rating: {round(stats["average"], 2)}')
+        print(f'Median rating: {round(stats["median"], 2)}')
+        print(f'The best movie(s): {self._movies_string(stats["best"])}')
+        print(f'The worst movie(s): {self._movies_string(stats["worst"])}')
+        print('Average rating per country:')
+        for flag, group in self.movie_stats_breakdown('flag').items():
+            print(f'{flag or "Unknown"}: {round(group["average"], 2)} ({group["count"]} movies)')
+
+    def movie_stats(self):
+        """Returns rating statistics of the storage database movies
+        :return: dict with count, average, median, best and worst movies
+        """
+        stats = self._query('movie_stats')
+        if stats is None:
+            stats = MovieApp.calculate_stats(self._storage.list_movies())
+        return stats
+
+    def movie_stats_breakdown(self, field):
+        """Returns number of movies and average rating per release year or per country flag
+        :param field: 'year' or 'flag'
+        :return: dict of value -> {"count": int, "average": float}, movies without the value under None
+        """
+        if field not in MovieApp.breakdown_fields:
+            raise ValueError(f'There is no breakdown by {field}')
+        breakdown = self._query('movie_stats_breakdown', field)
+        if breakdown is None:
+            breakdown = MovieApp.calculate_breakdown(self._storage.list_movies(), field)
+        return breakdown
+
+    @staticmethod
+    def calculate_breakdown(data, field):
+        """Calculates number of movies and average rating per release year or per country flag,
+        movies without a numeric rating are not counted
+        :param data: dictionary of movies
+        :param field: 'year' or 'flag'
+        :return: dict of value -> {"count": int, "average": float} ordered by value, None last
+        """
+        groups = {}
+        for info in data.values():
+            try:
+                rating = rating_value(info.get('rating'))
+            except (TypeError, ValueError):
+                continue
+            if field == 'year':
+                try:
+                    value = year_value(info.get('year'))
+                except (TypeError, ValueError):
+                    value = None
+            else:
+                value = info.get(field) or None
+            group = groups.setdefault(value, [0, 0.0])
+            group[0] += 1
+            group[1] += rating
+        return {value: {"count": count, "average": total / count}
+                for value, (count, total) in sorted(groups.items(),
+                                                    key=lambda item: (item[0] is None, item[0] or 0))}
+
+    @staticmethod
+    def calculate_stats(data):
+        """Calculates rating statistics of movies
+        :param data: dictionary of movies
+        :return: dict with count, average, median, best and worst movies
+        """
+        if not data:
+            return {"count": 0}
         ratings = []
         best_movies = []
         worst_movies = []
         for title, info in data.items():
             ratings.append(info['rating'])
-        ratings.sort()
         worst_rating = min(ratings)
         best_rating = max(ratings)
-        average = round(sum(ratings) / len(ratings), 2)
-        median = round(statistics.median(ratings), 2)
         for title, info in data.items():
             if info['rating'] == worst_rating:
-                worst_movies.append(title)
+                worst_movies.append((title, info))
             if info['rating'] == best_rating:
-                best_movies.append(title)
-        print('Statistics about the movies in the database:')
-        print(f'Average rating: {average}')
-        print(f'Median rating: {median}')
-        print(f'The best movie(s): {self._movie_string(best_movies)}')
-        print(f'The worst movie(s): {self._movie_string(worst_movies)}')
+                best_movies.append((title, info))
+        return {"count": len(ratings),
+                "average": sum(ratings) / len(ratings),
+                "median": statistics.median(ratings),
+                "best": best_movies,
+                "worst": worst_movies}
 
     def _print_random_movie(self):
         """Selects random movie from a storage database and prints it
         :return: None
         """
-        data = self._storage.list_movies()
-        titles = list(data.keys())
-        random_title = titles[random.randint(0, len(titles) - 1)]
-        rating = data[random_title]['rating']
-        print(f"Your movie for tonight: {random_title}, it's rated {rating}")
+        movie = self.random_movie()
+        if movie is None:
+            print('Movies database is empty!')
+            return
+        random_title, info = movie
+        print(f"Your movie for tonight: {random_title}, it's rated {info['rating']}")
+
+    def random_movie(self, titles=None):
+        """Selects random movie from a storage database
+        :param titles: optional list of all titles, kept by callers picking many random movies
+        :return: tuple (title, info) or None if the database is empty
+        """
+        if titles is None:
+            return self.query().sample(1).first()
+        if not titles:
+            return None
+        random_title = random.choice(titles)
+        return random_title, self._storage.get_movie(random_title)
 
     def _search_movie(self):
         """Searches movies matching user input criteria
         :return: None
         """
-        data = self._storage.list_movies()
         search_param = input('Enter part of movie name: ')
-        found_movies = []
-        for title in data.keys():
-            if search_param.lower() in title.lower():
-                found_movies.append(title)
-        if not found_movies:
+        if not self._print_movies(self.query().title(search_param), 'List of found movies:',
+                                  'One movie found matching your request:'):
             print('There are no movies matching your request.')
-        elif len(found_movies) == 1:
-            print(f'One movie found matching your request: {self._movie_string(found_movies)}')
-        else:
-            print(f'List of found movies:{self._movie_string(found_movies)}')
+            similar_movies = self.similar_movies(search_param)
+            if similar_movies and len(similar_movies) == 1:
+                print(f'Did you mean: {self._movies_string(similar_movies)}')
+            elif similar_movies:
+                print(f'Did you mean:{self._movies_string(similar_movies)}')
+
+    def search_movies(self, text):
+        """Finds movies which title contains given text, case-insensitive
+        :param text: part of a movie title
+        :return: list of (title, info) tuples
+        """
+        return list(self.query().title(text))
+
+    def similar_movies(self, text):
+        """Finds movies with titles similar to given text (with typos)
+        :param text: movie title
+        :return: list of (title, info) tuples, empty if the storage has no fuzzy search
+        """
+        return self._query('fuzzy_search_titles', text) or []
+
+    def sorted_movies(self, field, reverse=False, limit=None):
+        """Returns movies sorted by given field
+        :param field: 'rating' or 'year'
+        :param reverse: True for descending order
+        :param limit: maximum number of movies or None for all movies
+        :return: list of (title, info) tuples
+        """
+        return list(self.query().order_by(field, reverse).limit(limit))
 
     def _print_sorted_by_rating(self):
         """Prints all movies from a database sorted by theirs rating
         :return: None
         """
-        data = self._storage.list_movies()
-        movies_list = sorted(data.items(), key=lambda item: item[1]['rating'], reverse=True)
-        titles = []
-        for movie in movies_list:
-            titles.append(movie[0])
-        print(f'Movies sorted by rating: {self._movie_string(titles)}')
+        self._print_movies(self.query().order_by('rating', True), 'Movies sorted by rating:')
 
     def _print_sorted_by_year(self):
         """Prints all movies from a storage database by release year
         :return: None
         """
-        data = self._storage.list_movies()
         while True:
             years_sorting = input('Do you want the latest movies firs? (Y/N) ').lower()
             is_sorting_reverse = years_sorting == "y"
             if years_sorting in ("n", "y"):
                 break
             print('Please enter "Y" or "N"')
-        movies_list = sorted(data.items(), key=lambda item: item[1]['year'], reverse=is_sorting_reverse)
-        titles = []
-        for movie in movies_list:
-            titles.append(movie[0])
-        print(f'Movies sorted by year: {self._movie_string(titles)}')
+        self._print_movies(self.query().order_by('year', is_sorting_reverse), 'Movies sorted by year:')
 
     @staticmethod
     def movie_filters_range(extreme):
@@ -277,23 +463,25 @@ class MovieApp:
         Prints lis of movies, matching entered criteria.
         :return: None
         """
-        data = self._storage.list_movies()
-        filtered_movies = []
         # Getting user input
         min_rating = MovieApp.movie_filters_range("minimum")
         max_rating = MovieApp.movie_filters_range("maximum")
         start_year = MovieApp.movie_filters_year("start")
         end_year = MovieApp.movie_filters_year("end")
-        # creating list of filtered movies and printing the movies
-        for movie, info in data.items():
-            if (min_rating <= info['rating'] <= max_rating
-                    and start_year <= info['year'] <= end_year):
-                filtered_movies.append(movie)
-        if not filtered_movies:
+        # printing the filtered movies as they are found
+        query = self.query().rating(min_rating, max_rating).year(start_year, end_year)
+        if not self._print_movies(query, 'Filtered movies:'):
             print('No movies matching your filter')
-        else:
-            print('Filtered movies:')
-            print(self._movie_string(filtered_movies))
+
+    def filter_movies(self, min_rating, max_rating, start_year, end_year, countries=()):
+        """Returns movies with rating and year within given ranges (inclusive)
+        :param countries: optional country names or flags the movies must be from
+        :return: list of (title, info) tuples
+        """
+        query = self.query().rating(min_rating, max_rating).year(start_year, end_year)
+        if countries:
+            query = query.country(*countries)
+        return list(query)
 
     @staticmethod
     def print_header(text='My Movies Database'):
@@ -329,7 +517,12 @@ class MovieApp:
             if not menu_item:
                 print('Bye!')
                 break
-            list(MovieApp.function_list.values())[menu_item]()
+            name, command = list(MovieApp.function_list.items())[menu_item]
+            name = name.split('. ', 1)[1]
+            with METRICS.command(name):
+                command()
+            if MovieApp.print_metrics:
+                print(f'\n{METRICS.command_summary(name)}')
             input('\nPress "Enter" to continue')
             continue
 
@@ -345,76 +538,240 @@ class MovieApp:
 
     @staticmethod
     def serialize_movie(title, year, rating, poster, notes, imdb_id, flag):
-        """Serializes one movie, returns valid HTML markup for one move (list item)"""
-        country_flag = MovieApp.html_tag_wrap(flag, "div", "flag")
-        img = MovieApp.html_tag_wrap(poster, "img", "movie-poster")
-        if notes:
-            img = img.replace('<img',  f'<img title="{notes}" ')
-        img = (img.replace('<img', f'<a href="https://imdb.com/title/{imdb_id}" target="_blank"><img')
-               + '</a>')
-        movie_title = MovieApp.html_tag_wrap(title, "div", "movie-title")
-        release_year = MovieApp.html_tag_wrap(year, "div", "movie-year")
+        """Serializes one movie, returns valid HTML markup for one move (list item).
+        Text is HTML escaped, so titles and notes with quotes or tags don't break the page"""
         rating = float(rating) #  converting for valid HTML from JSON
-        rating_star = (f'<i style="left: {rating*10}%" class="fa-solid fa-star"></i>'
-                       f'<span style="left: {rating*10}%" class="ratings">{rating}</span>')
-        movie_rating = (MovieApp.html_tag_wrap(rating_star, "div", "movie-rating-bar")
-                        .replace('<div', '<div style="background: linear-gradient(#F2A766 0 0) 0/'
-                                         f'{rating*10}% no-repeat #F2D8C9;"'))
-        movie_html = MovieApp.html_tag_wrap(country_flag + img + movie_title + release_year
-                                            + movie_rating, "div", "movie")
-        return MovieApp.html_tag_wrap(movie_html, "li")
+        return MovieApp.card_template.render(flag=flag, imdb_id=imdb_id, notes=notes or '', poster=poster,
+                                             title=title, year=year, percent=rating * 10, rating=rating)
+
+    @staticmethod
+    def render_movie(title, info):
+        """Serializes one movie from its movies dictionary entry"""
+        return MovieApp.serialize_movie(title,
+                                        info['year'],
+                                        info['rating'],
+                                        info['poster'],
+                                        info.get('notes', ''),
+                                        info.get('imdb_id', ''),
+                                        info.get('flag', ''))
 
     def _generate_website(self):
-        """Generates static html file from html template"""
+        """Generates static html pages from html template and prints the result"""
+        pages, generator = self.generate_website()
+        if self.poster_cache is not None:
+            print(f'Posters: {self.poster_cache.summary()}')
+        print(f'Movie website was generated successfully: {len(pages)} page(s), '
+              f'{generator.rendered_pages} rendered, {generator.skipped_pages} unchanged.')
+
+    def generate_website(self):
+        """Generates static html pages from html template.
+        Pages whose movies didn't change since the last run are kept as they are.
+        Posters are downloaded into the website directory and pages link the local copies,
+        posters which could not be downloaded are linked to their remote urls
+        :return: tuple (list of page names, SiteGenerator)
+        """
+        generator = SiteGenerator(MovieApp.render_movie,
+                                  template_file=MovieApp.website_template,
+                                  output_dir=MovieApp.website_dir,
+                                  page_size=MovieApp.website_page_size,
+                                  by_year=MovieApp.website_by_year,
+                                  render_key=MovieApp.card_template.template,
+                                  workers=MovieApp.website_workers)
         movies = self._storage.list_movies()
-        movies_html_list_items = ""
-        for title, info in movies.items():
-            movies_html_list_items += MovieApp.serialize_movie(title,
-                                                               info['year'],
-                                                               info['rating'],
-                                                               info['poster'],
-                                                               info.get('notes', ''),
-                                                               info.get('imdb_id', ''),
-                                                               info.get('flag', ''))
-        with open("_static/index_template.html", 'r', encoding='utf-8') as handle:
-            html_template = handle.read()
-        with open('_static/index.html', 'w') as handle:
-            handle.write(html_template.replace("__TEMPLATE_MOVIE_GRID__", movies_html_list_items)
-                         .replace('__TEMPLATE_TITLE__', 'My Movie App'))
-        print('Movie website was generated successfully.')
+        if MovieApp.website_posters:
+            movies = self.cache_posters(movies)
+        return generator.generate(movies), generator
+
+    def cache_posters(self, movies):
+        """Downloads posters of the movies into the website directory
+        :param movies: dictionary of movies
+        :return: dictionary of movies with local poster paths
+        """
+        from poster_cache import LocalPosters, PosterCache
+        self.poster_cache = PosterCache(os.path.join(MovieApp.website_dir, MovieApp.website_posters_dir),
+                                        max_workers=MovieApp.poster_workers)
+        try:
+            files = self.poster_cache.prefetch(info.get('poster') for info in movies.values())
+        finally:
+            self.poster_cache.close()
+        prefix = MovieApp.website_posters_dir.replace(os.sep, '/')
+        return LocalPosters(movies, {url: f'{prefix}/{name}' for url, name in files.items()})
 
     def _update_movies_info(self):
-        """Goes through each movie title and updates all other info from API"""
-        new_movies = {}
-        for title in self._storage.list_movies().keys():
-            url = "http://www.omdbapi.com/?apikey=" + MovieApp.api_key + "&t=" + title
-            try:
-                response = requests.get(url).json()
-            except requests.exceptions.ConnectionError:
-                print('Houston, we have some connection problems. No internet connection.\n'
-                      "Try updating movies' information later")
-                return None
-            print(f'Updating movie "{title}" info.')
-            new_movies[title] = {'year': response['Year'],
-                                 'rating': response['imdbRating'],
-                                 'poster': response['Poster'],
-                                 'notes': self._storage.list_movies()[title].get('notes', ''),
-                                 'imdb_id': response['imdbID'],
-                                 'flag': MovieApp.get_country_flag(response)}
-        self._storage.update_database(new_movies)
-        print("All movies' info was updated successfully")
+        """Fetches info of movies due for a refresh from API concurrently and updates the database.
+        Movies which could not be fetched keep their old info"""
+        result = self.update_movies_info(
+            progress=lambda title, status: print(f'Updating movie "{title}" info: {status}.'))
+        if not (result.found or result.not_found or result.failed):
+            print(f'All movies were refreshed in the last {MovieApp.refresh_max_age // (24 * 3600)} days.')
+            return None
+        if result.failed and not result.found:
+            print('Houston, we have some connection problems. No internet connection.\n'
+                  "Try updating movies' information later")
+            return None
+        print(f"Movies' info update finished: {result.summary()}")
+
+    def update_movies_info(self, progress=None, max_age=None, batch_size=None):
+        """Fetches info of movies due for a refresh from API concurrently and saves
+        only the refreshed movies with one write. Every refreshed movie gets a new
+        last_refreshed time, the other fields are replaced only if the API info differs.
+        Movies unknown to the API are marked refreshed too, failed ones are retried next time
+        :param progress: optional callable(title, status) called for every fetched movie
+        :param max_age: seconds after which a movie is refreshed again, MovieApp.refresh_max_age by default
+        :param batch_size: maximum number of refreshed movies, MovieApp.refresh_batch_size by default
+        :return: RefreshResult
+        """
+        from omdb.refresh import RefreshScheduler
+        scheduler = RefreshScheduler(MovieApp.refresh_max_age if max_age is None else max_age,
+                                     MovieApp.refresh_batch_size if batch_size is None else batch_size)
+        movies = self._storage.list_movies()
+        now = int(time.time())
+        titles = scheduler.due(movies.items(), now)
+        # a refresh requests the API again, cached responses would only restamp old info
+        result = MovieApp.refresh_engine(use_cache=False).fetch(titles, progress=progress)
+        updates = {}
+        for title in titles:
+            info = movies.get(title)
+            if info is None or title in result.failed:
+                continue
+            info = dict(info)
+            if title in result.found:
+                new_info = MovieApp.movie_info(result.found[title], info)
+                if any(info.get(field) != value for field, value in new_info.items()):
+                    result.changed.append(title)
+                    info.update(new_info)
+            info['last_refreshed'] = now
+            updates[title] = info
+        self._storage.update_movies(updates)
+        return result
+
+    def _import_movies(self):
+        """Imports movies listed in a file by titles or IMDb ids (one per line)
+        with a single database write
+        :return: None
+        """
+        filename = input('Enter path of a file with movie titles or IMDb ids (one per line), '
+                         '"-" to type them ending with an empty line: ').strip()
+        try:
+            keys = MovieApp.read_import_keys(filename)
+        except OSError as error:
+            print(f'Can not read the file: {error}')
+            return
+        self.import_movies(keys)
+
+    @staticmethod
+    def read_import_keys(filename):
+        """Reads movie titles or IMDb ids to import, one per line.
+        '-' reads standard input, up to an empty line if it is a terminal
+        :param filename: file path or '-'
+        :return: list of strings
+        """
+        if filename != '-':
+            with open(filename, 'r', encoding='utf-8') as handle:
+                return BulkImporter.read_keys(handle)
+        if sys.stdin.isatty():
+            return BulkImporter.read_keys(takewhile(str.strip, sys.stdin))
+        return BulkImporter.read_keys(sys.stdin)
+
+    def import_movies(self, keys):
+        """Fetches movies info concurrently and adds found movies to the database at once
+        :param keys: list of movie titles or IMDb ids
+        :return: ImportResult
+        """
+        cache = MovieApp.omdb_client().cache
+        before = cache.stats() if cache else None
+        result = BulkImporter(self._storage, MovieApp.refresh_engine(), MovieApp.movie_info).run(keys)
+        print(f'Import finished: {result.summary()}')
+        if cache:
+            after = cache.stats()
+            result.cache_hits = after["hits"] - before["hits"]
+            result.cache_misses = after["misses"] - before["misses"]
+            print(f'API cache: {result.cache_hits} movies answered from the cache, '
+                  f'{result.cache_misses} requested from the API')
+        for label, skipped in (('Already in the database', result.duplicates),
+                            ('Not found', result.not_found),
+                            ('Failed', result.failed)):
+            if skipped:
+                print(f'{label}: {", ".join(skipped)}')
+        return result
+
+    @staticmethod
+    def movie_info(response, old_info=None):
+        """Converts API response to a movie info dictionary.
+        Notes (and the flag if the country is unknown) are kept from old_info
+        :param response: dict with API response
+        :param old_info: optional previous movie info
+        :return: dict
+        """
+        old_info = old_info or {}
+        flag = MovieApp.get_country_flag(response) or old_info.get('flag', '')
+        return {'year': MovieApp.api_number(response['Year'][:4], int, old_info.get('year', response['Year'])),
+                'rating': MovieApp.api_number(response['imdbRating'], float, old_info.get('rating', 0.0)),
+                'poster': response['Poster'],
+                'notes': old_info.get('notes', ''),
+                'imdb_id': response['imdbID'],
+                'flag': flag}
+
+    @staticmethod
+    def api_number(value, number_type, default):
+        """Converts API text like '2005' or '6.7' to a number, so movies keep numeric
+        years and ratings. Values like 'N/A' are replaced with the default
+        :param value: API value
+        :param number_type: int or float
+        :param default: value returned if the API value is not a number
+        :return: number or default
+        """
+        try:
+            return number_type(value)
+        except (TypeError, ValueError):
+            return default
+
+    @staticmethod
+    def refresh_engine(use_cache=True):
+        """Returns engine fetching many movies from the API concurrently
+        :param use_cache: False bypasses cached API responses (fresh responses are still cached)
+        :return: RefreshEngine
+        """
+        from omdb.refresh import RefreshEngine
+        return RefreshEngine(MovieApp.omdb_client(),
+                             max_workers=MovieApp.refresh_workers,
+                             rate_limit=MovieApp.refresh_rate_limit,
+                             use_cache=use_cache)
+
+    @classmethod
+    def omdb_client(cls):
+        """Returns OMDb API client shared by all commands
+        :return: OmdbClient
+        """
+        if cls._omdb_client is None:
+            # requests is imported only by commands using the API
+            from omdb.cache import ResponseCache
+            from omdb.client import OmdbClient
+            cache = ResponseCache(cls.omdb_cache_file, ttl=cls.omdb_cache_ttl)
+            cls._omdb_client = OmdbClient(cls.load_api_key(), cls.omdb_url or OmdbClient.default_url, cache=cache)
+        return cls._omdb_client
+
+    @classmethod
+    def load_api_key(cls):
+        """Reads OMDb API key from the .env file once
+        :return: API key string or None if it is not set
+        """
+        if cls.api_key is None:
+            import dotenv
+            cls.api_key = dotenv.get_key(cls.env_file, 'API_KEY')
+        return cls.api_key
 
     @staticmethod
     def get_movie_info():
         """Asks user of movie title, gets movie's info from api. If connection error asks user for movie info
-        :return: tuple (title, year, rating, poster)
+        :return: tuple (title, year, rating, poster, imdb_id, flag)
         """
+        import requests
         while True:
             title = MovieApp.get_title()
-            url = "http://www.omdbapi.com/?apikey=" + MovieApp.api_key + "&t=" + title
             try:
-                response = requests.get(url).json()
-            except requests.exceptions.ConnectionError:
+                response = MovieApp.omdb_client().get_by_title(title)
+            except requests.exceptions.RequestException:
                 print('Houston, we have some connection problems! There is no Internet connection.')
                 try_again = input('Do you want to try again? y/N: ').strip().lower()
                 if try_again in ['yes', 'y']:
@@ -422,29 +779,24 @@ class MovieApp:
                 while True:
                     manual_enter = input('Do you want to enter required data manually? Y/n: ').strip().lower()
                     if manual_enter in ["", "y", "yes"]:
-                        return title, MovieApp.get_year(), MovieApp.get_rating(), MovieApp.get_poster()
+                        return title, MovieApp.get_year(), MovieApp.get_rating(), MovieApp.get_poster(), '', ''
                     print('Better luck next time!')
                     return None
             if response['Response'] == 'False':
                 print(response['Error'])
                 continue
             break
-        return (title,
-                response['Year'],
-                response['imdbRating'],
-                response['Poster'],
-                response['imdbID'],
-                MovieApp.get_country_flag(response))
+        info = MovieApp.movie_info(response)
+        return title, info['year'], info['rating'], info['poster'], info['imdb_id'], info['flag']
 
     @staticmethod
+    @METRICS.timed('flags.lookup')
     def get_country_flag(response):
-        """Gets country flag emoji from api response or entered country as a string"""
+        """Gets country flag emoji from api response or entered country as a string.
+        The first country of the response is used, empty string is returned for an unknown country"""
         if isinstance(response, str):
-            return pycountry.countries.get(name=response).flag
-        country = response['Country'].split(",")[0]
-        if country == 'Russia':
-            country = 'Russian Federation'
-        return pycountry.countries.get(name=country).flag
+            return country_flag(response)
+        return country_flag(response.get('Country', '').split(",")[0])
 
     def run(self):
         """Populates function_list dictionary and calls dispatcher function
@@ -463,4 +815,5 @@ class MovieApp:
         MovieApp.function_list['10. Filter movies'] = self._filter_movies
         MovieApp.function_list['11. Generate a website'] = self._generate_website
         MovieApp.function_list['12. Update movies info'] = self._update_movies_info
+        MovieApp.function_list['13. Import movies'] = self._import_movies
         MovieApp.dispatcher()
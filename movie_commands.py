@@ -0,0 +1,264 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import shlex
+import sys
+from movie_app import MovieApp
+
+
+class CommandError(Exception):
+    """Raised when a command can not be done, the message is reported in JSON output"""
+
+
+class MovieCommands:
+    """Non-interactive commands of MovieApp for scripts and batch use.
+    Every command returns a JSON serializable result instead of printing it"""
+
+    commands = ('list', 'add', 'delete', 'update', 'stats', 'search', 'filter', 'build-site', 'refresh', 'import',
+                'batch')
+    default_database = os.path.join('data', 'data.csv')
+
+    def __init__(self, storage):
+        """Instance initialization
+        :param storage: IStorage instance, loaded once for all commands
+        """
+        self._storage = storage
+        self._app = MovieApp(storage)
+
+    @staticmethod
+    def create_parser():
+        """Creates parser of command line arguments of all commands
+        :return: argparse.ArgumentParser
+        """
+        storage_options = argparse.ArgumentParser(add_help=False)
+        storage_options.add_argument('-d', '--database', default=MovieCommands.default_database,
+                                     help='database file (.csv, .json, .jsonl, .db, .sqlite or .shards)')
+        storage_options.add_argument('--journal', action='store_true',
+                                     help='append changes to a journal file instead of rewriting the database')
+        storage_options.add_argument('--compact', action='store_true',
+                                     help='keep movies in a compact columnar table to save memory')
+        parser = argparse.ArgumentParser(prog='main.py', description='Movies database commands with JSON output')
+        commands = parser.add_subparsers(dest='command', required=True)
+        command = commands.add_parser('list', parents=[storage_options], help='list movies')
+        command.add_argument('--sort', choices=('rating', 'year'), help='sort movies by the field')
+        command.add_argument('--reverse', action='store_true', help='sort in descending order')
+        command.add_argument('--limit', type=int, help='maximum number of listed movies')
+        command = commands.add_parser('add', parents=[storage_options], help='add a movie with info from OMDb API')
+        command.add_argument('title')
+        command = commands.add_parser('delete', parents=[storage_options], help='delete a movie')
+        command.add_argument('title')
+        command = commands.add_parser('update', parents=[storage_options], help='update notes of a movie')
+        command.add_argument('title')
+        command.add_argument('--notes', required=True)
+        command = commands.add_parser('stats', parents=[storage_options], help='rating statistics')
+        command.add_argument('--by', choices=MovieApp.breakdown_fields, action='append', default=[],
+                             help='add number of movies and average rating per release year or country flag')
+        command = commands.add_parser('search', parents=[storage_options], help='search movies by a part of title')
+        command.add_argument('text')
+        command = commands.add_parser('filter', parents=[storage_options], help='filter movies by rating and year')
+        command.add_argument('--min-rating', type=float, default=MovieApp.min_rating)
+        command.add_argument('--max-rating', type=float, default=MovieApp.max_rating)
+        command.add_argument('--start-year', type=int, default=0)
+        command.add_argument('--end-year', type=int, default=9999)
+        command.add_argument('--country', action='append', default=[],
+                             help='keep movies of the country (name or flag), can be repeated')
+        command = commands.add_parser('build-site', parents=[storage_options], help='generate the website')
+        command.add_argument('--output-dir', default=MovieApp.website_dir)
+        command.add_argument('--page-size', type=int, default=MovieApp.website_page_size)
+        command.add_argument('--by-year', action='store_true', help='one page per release year')
+        command.add_argument('--workers', type=int, default=MovieApp.website_workers,
+                             help='number of processes rendering the pages')
+        command.add_argument('--remote-posters', action='store_true',
+                             help="link posters to their remote urls instead of downloading them")
+        command = commands.add_parser('refresh', parents=[storage_options],
+                                      help='update info of movies not refreshed recently from OMDb API')
+        command.add_argument('--max-age', type=float, default=MovieApp.refresh_max_age / (24 * 3600),
+                             help='days after which a movie is refreshed again')
+        command.add_argument('--all', action='store_true', help='refresh all movies whatever their age')
+        command.add_argument('--limit', type=int, help='maximum number of refreshed movies')
+        command = commands.add_parser('import', parents=[storage_options],
+                                      help='add movies listed by titles or IMDb ids (one per line) with info from OMDb API')
+        command.add_argument('file', help="file with movie titles or IMDb ids, '-' reads standard input")
+        commands.add_parser('batch', parents=[storage_options],
+                            help='run commands read from standard input, one per line, with one database load')
+        return parser
+
+    def run(self, arguments, output=None):
+        """Runs the command and writes its result as one JSON line.
+        Messages printed by the storage and the app go to standard error
+        :param arguments: parsed command line arguments
+        :param output: text stream of JSON results, standard output by default
+        :return: exit code, 0 on success
+        """
+        output = output or sys.stdout
+        if arguments.command == 'batch':
+            return self.run_batch(sys.stdin, output)
+        try:
+            with contextlib.redirect_stdout(sys.stderr):
+                result = getattr(self, '_' + arguments.command.replace('-', '_'))(arguments)
+            exit_code = 0
+        except CommandError as error:
+            result = {"error": str(error)}
+            exit_code = 1
+        output.write(json.dumps(result, ensure_ascii=False) + '\n')
+        output.flush()
+        return exit_code
+
+    def run_batch(self, lines, output=None):
+        """Runs commands read from lines (like 'delete "The Godfather"') against the loaded database.
+        Storage options of the lines are ignored, empty lines and lines starting with # are skipped
+        :param lines: iterable of command lines
+        :param output: text stream of JSON results, one line per command, standard output by default
+        :return: exit code, 1 if any command failed
+        """
+        output = output or sys.stdout
+        parser = MovieCommands.create_parser()
+        exit_code = 0
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            errors = io.StringIO()
+            try:
+                with contextlib.redirect_stderr(errors):
+                    arguments = parser.parse_args(shlex.split(line))
+                if arguments.command == 'batch':
+                    raise CommandError('batch can not be nested')
+                if arguments.command == 'import' and arguments.file == '-':
+                    raise CommandError('standard input is read by batch, import needs a file')
+            except (SystemExit, ValueError, CommandError) as error:
+                details = errors.getvalue().strip().splitlines()
+                output.write(json.dumps({"error": f'invalid command: {line}',
+                                         "details": details[-1] if details else str(error)},
+                                        ensure_ascii=False) + '\n')
+                exit_code = 1
+                continue
+            exit_code = self.run(arguments, output) or exit_code
+        return exit_code
+
+    @staticmethod
+    def movie_json(title, info):
+        """Converts a movie to a JSON serializable dictionary"""
+        return {"title": title, **info}
+
+    @staticmethod
+    def movies_json(movies):
+        """Converts (title, info) tuples to a list of JSON serializable dictionaries"""
+        return [MovieCommands.movie_json(title, info) for title, info in movies]
+
+    def _list(self, arguments):
+        """Lists movies, optionally sorted and limited"""
+        if arguments.sort:
+            movies = self._app.sorted_movies(arguments.sort, arguments.reverse)
+        else:
+            movies = self._storage.list_movies().items()
+        movies = list(movies)
+        count = len(movies)
+        if arguments.limit is not None:
+            movies = movies[:arguments.limit]
+        return {"count": count, "movies": MovieCommands.movies_json(movies)}
+
+    def _add(self, arguments):
+        """Adds a movie with info from the API"""
+        import requests
+        try:
+            title, info = self._app.add_movie_from_api(arguments.title)
+        except requests.exceptions.RequestException as error:
+            raise CommandError(f'OMDb API connection problem: {error}') from error
+        except LookupError as error:
+            raise CommandError(str(error)) from error
+        return {"added": MovieCommands.movie_json(title, info)}
+
+    def _delete(self, arguments):
+        """Deletes a movie"""
+        try:
+            self._storage.delete_movie(arguments.title)
+        except KeyError as error:
+            raise CommandError(f'There is no movie called "{arguments.title}" in a database') from error
+        return {"deleted": arguments.title}
+
+    def _update(self, arguments):
+        """Updates notes of a movie"""
+        try:
+            self._storage.update_movie(arguments.title, arguments.notes)
+        except KeyError as error:
+            raise CommandError(f'There is no movie called "{arguments.title}" in a database') from error
+        return {"updated": MovieCommands.movie_json(arguments.title, self._storage.get_movie(arguments.title))}
+
+    @staticmethod
+    def stats_json(stats):
+        """Converts movie statistics to a JSON serializable dictionary"""
+        stats = dict(stats)
+        for key in ("best", "worst"):
+            if key in stats:
+                stats[key] = MovieCommands.movies_json(stats[key])
+        return stats
+
+    @staticmethod
+    def breakdown_json(field, breakdown):
+        """Converts a rating breakdown to a JSON serializable list ordered by the field value"""
+        return [{field: value, **group} for value, group in breakdown.items()]
+
+    def _stats(self, arguments):
+        """Returns rating statistics, with breakdowns by the fields given with --by"""
+        stats = MovieCommands.stats_json(self._app.movie_stats())
+        for field in arguments.by:
+            stats[f'by_{field}'] = MovieCommands.breakdown_json(field, self._app.movie_stats_breakdown(field))
+        return stats
+
+    def _search(self, arguments):
+        """Searches movies by a part of title, similar titles are returned when nothing is found"""
+        movies = self._app.search_movies(arguments.text)
+        similar = [] if movies else self._app.similar_movies(arguments.text)
+        return {"movies": MovieCommands.movies_json(movies), "similar": MovieCommands.movies_json(similar)}
+
+    def _filter(self, arguments):
+        """Filters movies by rating and year ranges, optionally by countries"""
+        movies = self._app.filter_movies(arguments.min_rating, arguments.max_rating,
+                                         arguments.start_year, arguments.end_year, arguments.country)
+        return {"movies": MovieCommands.movies_json(movies)}
+
+    def _build_site(self, arguments):
+        """Generates the website"""
+        MovieApp.website_dir = arguments.output_dir
+        MovieApp.website_page_size = arguments.page_size
+        MovieApp.website_by_year = arguments.by_year
+        MovieApp.website_posters = not arguments.remote_posters
+        MovieApp.website_workers = arguments.workers
+        try:
+            os.makedirs(arguments.output_dir, exist_ok=True)
+            pages, generator = self._app.generate_website()
+        except OSError as error:
+            raise CommandError(f'Can not generate the website: {error}') from error
+        result = {"pages": pages, "rendered": generator.rendered_pages, "unchanged": generator.skipped_pages}
+        if self._app.poster_cache is not None:
+            result["posters"] = {"downloaded": self._app.poster_cache.downloaded,
+                                 "cached": self._app.poster_cache.cached,
+                                 "failed": self._app.poster_cache.failed}
+        return result
+
+    def _refresh(self, arguments):
+        """Updates info of movies due for a refresh from the API"""
+        max_age = 0 if arguments.all else int(arguments.max_age * 24 * 3600)
+        result = self._app.update_movies_info(max_age=max_age, batch_size=arguments.limit)
+        if result.failed and not result.found:
+            raise CommandError('OMDb API connection problem, no movie was updated')
+        return {"updated": sorted(result.found),
+                "changed": sorted(result.changed),
+                "not_found": {title: str(error) for title, error in result.not_found.items()},
+                "failed": {title: str(error) for title, error in result.failed.items()}}
+
+    def _import(self, arguments):
+        """Adds movies listed in a file or standard input ('-') with info from the API"""
+        try:
+            keys = MovieApp.read_import_keys(arguments.file)
+        except OSError as error:
+            raise CommandError(f'Can not read the file: {error}') from error
+        result = self._app.import_movies(keys)
+        return {"added": result.added,
+                "duplicates": result.duplicates,
+                "not_found": result.not_found,
+                "failed": result.failed,
+                "cache": {"hits": result.cache_hits, "misses": result.cache_misses}}
@@ -0,0 +1,229 @@
+import heapq
+import random
+from itertools import islice
+from country_flags import country_flag
+from storage.sorted_index import rating_value, year_value
+
+
+def pages(movies, size):
+    """Splits movies into pages, reading only the movies of the next page
+    :param movies: iterable of (title, info) tuples
+    :param size: number of movies in a page
+    :return: generator of lists of (title, info) tuples
+    """
+    movies = iter(movies)
+    while True:
+        page = list(islice(movies, size))
+        if not page:
+            return
+        yield page
+
+
+class MovieQuery:
+    """Lazy chainable query of the movies of a storage, e.g.
+    MovieQuery(storage).rating(7, 10).year(1990, 1999).order_by('rating', reverse=True).limit(10).
+    Every step returns a new query, the movies are read when the query is iterated and flow
+    through the steps one at a time, in the order the steps were added. Leading steps are
+    answered by storage query methods (indexes, SQL) when the storage provides them:
+    a title filter by search_titles, rating and year filters by filter_movies, sorting
+    by sorted_movies, otherwise movies are streamed by iter_movies.
+    The source picked by the last run is kept in the plan attribute.
+    Streamed movies are filtered and sorted by rating and year converted like the sorted
+    indexes do, so strings stored by JSON databases compare as numbers"""
+
+    converters = {'rating': rating_value, 'year': year_value}
+
+    def __init__(self, storage, steps=()):
+        """Instance initialization
+        :param storage: IStorage instance
+        :param steps: tuple of (step name, arguments) tuples
+        """
+        self._storage = storage
+        self._steps = tuple(steps)
+        self.plan = None
+
+    def title(self, text):
+        """Keeps movies which title contains given text, case-insensitive"""
+        return self._step('title', text)
+
+    def rating(self, low=float('-inf'), high=float('inf')):
+        """Keeps movies with low <= rating <= high"""
+        return self._step('rating', low, high)
+
+    def year(self, start=float('-inf'), end=float('inf')):
+        """Keeps movies released from start to end year (inclusive)"""
+        return self._step('year', start, end)
+
+    def country(self, *countries):
+        """Keeps movies of given countries
+        :param countries: country names (OMDb spellings like 'USA' included) or flag emojis
+        """
+        flags = {country_flag(country) or country for country in countries}
+        return self._step('country', frozenset(flags))
+
+    def order_by(self, field, reverse=False):
+        """Sorts movies by 'rating' or 'year', movies with equal values keep their order,
+        movies without a value come last"""
+        return self._step('order_by', field, reverse)
+
+    def limit(self, count):
+        """Keeps first count movies, None keeps all movies"""
+        return self if count is None else self._step('limit', count)
+
+    def sample(self, count):
+        """Keeps count random movies (all movies if there are fewer), in random order"""
+        return self._step('sample', count)
+
+    def pages(self, size):
+        """Runs the query and returns its movies in pages
+        :return: generator of lists of (title, info) tuples
+        """
+        return pages(self, size)
+
+    def first(self):
+        """Runs the query and returns its first movie
+        :return: tuple (title, info) or None if no movie matches
+        """
+        return next(iter(self), None)
+
+    def __iter__(self):
+        """Runs the query
+        :return: iterator of (title, info) tuples
+        """
+        movies, steps = self._source()
+        position = 0
+        while position < len(steps):
+            name, *arguments = steps[position]
+            position += 1
+            if name == 'order_by' and position < len(steps) and steps[position][0] == 'limit':
+                # top-k keeps only the limit of movies in memory instead of sorting them all
+                movies = MovieQuery._apply_top(movies, *arguments, steps[position][1])
+                position += 1
+            else:
+                movies = getattr(MovieQuery, f'_apply_{name}')(movies, *arguments)
+        return iter(movies)
+
+    def _step(self, name, *arguments):
+        """Returns a new query with one more step"""
+        return MovieQuery(self._storage, self._steps + ((name, *arguments),))
+
+    def _source(self):
+        """Picks the source of movies for the leading steps: a storage query method
+        or iter_movies, and returns the steps left to apply to it
+        :return: tuple (iterable of (title, info) tuples, list of steps)
+        """
+        steps = list(self._steps)
+        filters = 0
+        while filters < len(steps) and steps[filters][0] in ('title', 'rating', 'year', 'country'):
+            filters += 1
+        names = [step[0] for step in steps[:filters]]
+        if 'title' in names:
+            step = steps[names.index('title')]
+            movies = self._query('search_titles', step[1])
+            if movies is not None:
+                steps.remove(step)
+                self.plan = 'search_titles'
+                return movies, steps
+        if 'rating' in names or 'year' in names:
+            # one rating and one year range are passed to filter_movies, other ranges stay steps
+            used = [steps[names.index(name)] for name in ('rating', 'year') if name in names]
+            ranges = {step[0]: step[1:] for step in used}
+            movies = self._query('filter_movies', *ranges.get('rating', (float('-inf'), float('inf'))),
+                                 *ranges.get('year', (float('-inf'), float('inf'))))
+            if movies is not None:
+                for step in used:
+                    steps.remove(step)
+                self.plan = 'filter_movies'
+                return movies, steps
+        if not filters and steps and steps[0][0] == 'order_by':
+            field, reverse = steps[0][1:]
+            limit = steps[1][1] if len(steps) > 1 and steps[1][0] == 'limit' else None
+            movies = self._query('sorted_movies', field, reverse, limit)
+            if movies is not None:
+                self.plan = 'sorted_movies'
+                return movies, steps[1 if limit is None else 2:]
+        self.plan = 'iter_movies'
+        return self._storage.iter_movies(), steps
+
+    def _query(self, name, *arguments):
+        """Calls optional query method of the storage
+        :return: query result or None if the storage can't answer the query
+        """
+        query = getattr(self._storage, name, None)
+        if query is None:
+            return None
+        try:
+            return query(*arguments)
+        except ValueError:
+            # e.g. a field SQLite can't sort by
+            return None
+
+    @staticmethod
+    def _value(info, field):
+        """Returns converted rating or year of a movie or None if it can't be converted"""
+        try:
+            return MovieQuery.converters[field](info[field])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _order_key(field, reverse):
+        """Returns sort key of movies by the field, putting movies without a value last in both orders"""
+        def key(movie):
+            value = MovieQuery._value(movie[1], field)
+            return (value is None) != reverse, 0 if value is None else value
+        return key
+
+    @staticmethod
+    def _in_range(info, field, low, high):
+        """Tells if the converted field value is within the range, movies without a value are not"""
+        value = MovieQuery._value(info, field)
+        return value is not None and low <= value <= high
+
+    @staticmethod
+    def _apply_title(movies, text):
+        text = text.lower()
+        return ((title, info) for title, info in movies if text in title.lower())
+
+    @staticmethod
+    def _apply_rating(movies, low, high):
+        return ((title, info) for title, info in movies if MovieQuery._in_range(info, 'rating', low, high))
+
+    @staticmethod
+    def _apply_year(movies, start, end):
+        return ((title, info) for title, info in movies if MovieQuery._in_range(info, 'year', start, end))
+
+    @staticmethod
+    def _apply_country(movies, flags):
+        return ((title, info) for title, info in movies if info.get('flag') in flags)
+
+    @staticmethod
+    def _apply_order_by(movies, field, reverse):
+        return sorted(movies, key=MovieQuery._order_key(field, reverse), reverse=reverse)
+
+    @staticmethod
+    def _apply_top(movies, field, reverse, count):
+        select = heapq.nlargest if reverse else heapq.nsmallest
+        return select(count, movies, key=MovieQuery._order_key(field, reverse))
+
+    @staticmethod
+    def _apply_limit(movies, count):
+        return islice(movies, count)
+
+    @staticmethod
+    def _apply_sample(movies, count):
+        """Samples a list directly, a stream by reservoir sampling keeping only count movies in memory"""
+        if isinstance(movies, list):
+            if count == 1 and movies:
+                return [random.choice(movies)]
+            return random.sample(movies, min(count, len(movies)))
+        reservoir = []
+        for number, movie in enumerate(movies):
+            if number < count:
+                reservoir.append(movie)
+                continue
+            position = random.randint(0, number)
+            if position < count:
+                reservoir[position] = movie
+        random.shuffle(reservoir)
+        return reservoir
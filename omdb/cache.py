@@ -0,0 +1,126 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class ResponseCache:
+    """Persistent OMDb response cache stored in an SQLite file.
+    Responses are keyed by normalized title and by IMDb id, expire after a TTL
+    and the least recently used entries are evicted above the size limit.
+    The size is checked every evict_interval stored responses and on close,
+    so the limit can be exceeded by that many responses in between.
+    Negative responses (unknown titles) are cached too"""
+
+    def __init__(self, filepath, ttl=7 * 24 * 3600, negative_ttl=24 * 3600, max_entries=100000,
+                 evict_interval=1000):
+        """Instance initialization
+        :param filepath: cache file path
+        :param ttl: lifetime of a found movie response in seconds
+        :param negative_ttl: lifetime of a 'not found' response in seconds
+        :param max_entries: maximum number of cached responses
+        :param evict_interval: number of stored responses between checks of the cache size
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.evict_interval = evict_interval
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(filepath, check_same_thread=False)
+        with self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS responses ('
+                                     'key TEXT PRIMARY KEY, response TEXT, '
+                                     'expires REAL, accessed REAL)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS responses_accessed '
+                                     'ON responses (accessed)')
+
+    @staticmethod
+    def title_key(title):
+        """Returns cache key of a movie title: case and extra whitespace are ignored"""
+        return 't:' + ' '.join(title.split()).casefold()
+
+    @staticmethod
+    def id_key(imdb_id):
+        """Returns cache key of an IMDb id"""
+        return 'i:' + imdb_id.strip().lower()
+
+    def get(self, key):
+        """Returns cached response or None if there is no fresh response for the key
+        :param key: title_key or id_key result
+        :return: dict or None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute('SELECT response, expires FROM responses WHERE key = ?',
+                                           (key,)).fetchone()
+            if row is None or row[1] < now:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._connection:
+                self._connection.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+        return json.loads(row[0])
+
+    def put(self, key, response):
+        """Stores a response. Found movies are stored under their IMDb id as well
+        :param key: title_key or id_key result
+        :param response: dict with API response
+        :return: None
+        """
+        if response.get('Response') == 'False':
+            if 'not found' not in response.get('Error', '').lower():
+                # errors like an invalid API key are not a property of the movie
+                return
+            ttl = self.negative_ttl
+        else:
+            ttl = self.ttl
+        now = time.time()
+        keys = {key}
+        if response.get('imdbID'):
+            keys.add(ResponseCache.id_key(response['imdbID']))
+        payload = json.dumps(response)
+        with self._lock, self._connection:
+            self._connection.executemany('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)',
+                                         [(cache_key, payload, now + ttl, now) for cache_key in keys])
+            self._puts += 1
+            if self._puts % self.evict_interval == 0:
+                self._evict()
+
+    def stats(self):
+        """Returns cache counters
+        :return: dict
+        """
+        with self._lock:
+            entries = self._connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "entries": entries}
+
+    def clear(self):
+        """Removes all cached responses"""
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM responses')
+
+    def close(self):
+        """Evicts responses above the size limit and closes the cache file"""
+        with self._lock, self._connection:
+            self._evict()
+        self._connection.close()
+
+    def _evict(self):
+        """Removes expired responses and least recently used ones above max_entries.
+        Must be called holding the lock inside a transaction"""
+        count = self._connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        if count <= self.max_entries:
+            return
+        cursor = self._connection.execute('DELETE FROM responses WHERE expires < ?', (time.time(),))
+        removed = cursor.rowcount
+        excess = count - removed - self.max_entries
+        if excess > 0:
+            self._connection.execute('DELETE FROM responses WHERE key IN ('
+                                     'SELECT key FROM responses ORDER BY accessed LIMIT ?)', (excess,))
+            removed += excess
+        self.evictions += removed
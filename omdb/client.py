@@ -0,0 +1,84 @@
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import METRICS
+from omdb.cache import ResponseCache
+
+
+class OmdbClient:
+    """OMDb API client sharing one pooled HTTP session between all requests and threads"""
+
+    default_url = "http://www.omdbapi.com/"
+
+    def __init__(self, api_key, base_url=default_url, timeout=10, pool_size=10, cache=None):
+        """Instance initialization
+        :param api_key: OMDb API key
+        :param base_url: OMDb API url, can point to a local stub server
+        :param timeout: request timeout in seconds
+        :param pool_size: number of kept alive connections
+        :param cache: optional ResponseCache
+        """
+        self.api_key = api_key
+        self.cache = cache
+        self.base_url = base_url
+        self.timeout = timeout
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def get_by_title(self, title, use_cache=True):
+        """Gets movie info by movie title
+        :param title: movie title
+        :param use_cache: False requests the API even if the response is cached
+        :return: dict with API response
+        """
+        return self._cached_get(ResponseCache.title_key(title) if self.cache else None, {"t": title}, use_cache)
+
+    def get_by_id(self, imdb_id, use_cache=True):
+        """Gets movie info by IMDb id
+        :param imdb_id: IMDb id like 'tt0371724'
+        :param use_cache: False requests the API even if the response is cached
+        :return: dict with API response
+        """
+        return self._cached_get(ResponseCache.id_key(imdb_id) if self.cache else None, {"i": imdb_id}, use_cache)
+
+    def close(self):
+        """Closes pooled connections and the response cache"""
+        self._session.close()
+        if self.cache:
+            self.cache.close()
+
+    def _cached_get(self, key, params, use_cache=True):
+        """Returns cached response for the key or requests the API and caches its response
+        :param key: cache key or None if there is no cache
+        :param params: query parameters
+        :param use_cache: False skips the cached response, the fresh response is still cached
+        :return: dict with API response
+        """
+        if key is None:
+            return self._get(params)
+        if not use_cache:
+            METRICS.count('omdb.cache_bypasses')
+            response = self._get(params)
+            self.cache.put(key, response)
+            return response
+        response = self.cache.get(key)
+        if response is None:
+            METRICS.count('omdb.cache_misses')
+            response = self._get(params)
+            self.cache.put(key, response)
+        else:
+            METRICS.count('omdb.cache_hits')
+        return response
+
+    @METRICS.timed('omdb.request')
+    def _get(self, params):
+        """Sends request to the API. Raises requests.exceptions.RequestException
+        on connection problems and HTTP errors
+        :param params: query parameters
+        :return: dict with API response
+        """
+        response = self._session.get(self.base_url, params={"apikey": self.api_key, **params},
+                                     timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
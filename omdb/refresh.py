@@ -0,0 +1,122 @@
+import heapq
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from omdb.rate_limit import TokenBucket
+
+
+class RefreshResult:
+    """Outcome of a refresh run: responses of found titles, titles unknown to the API
+    and titles that failed after all retries. Titles of found movies whose info
+    differs from the stored one are added to changed by the caller"""
+
+    def __init__(self):
+        """Instance initialization"""
+        self.found = {}
+        self.not_found = {}
+        self.failed = {}
+        self.changed = []
+
+    def summary(self):
+        """Returns one line summary of the run
+        :return: string
+        """
+        return (f'{len(self.found)} updated ({len(self.changed)} changed), {len(self.not_found)} not found, '
+                f'{len(self.failed)} failed')
+
+
+class RefreshScheduler:
+    """Picks movies due for a refresh by their last_refreshed time (Unix seconds,
+    0 or missing for never refreshed movies): movies older than max_age,
+    the longest unrefreshed first, at most batch_size of them per run"""
+
+    def __init__(self, max_age=30 * 24 * 3600, batch_size=None):
+        """Instance initialization
+        :param max_age: seconds after which a movie is refreshed again, 0 refreshes all movies
+        :param batch_size: maximum number of movies refreshed by one run, None for no limit
+        """
+        self.max_age = max_age
+        self.batch_size = batch_size
+
+    def due(self, movies, now=None):
+        """Returns titles of movies due for a refresh
+        :param movies: iterable of (title, info) tuples
+        :param now: current Unix time, time.time() by default
+        :return: list of titles, the longest unrefreshed first
+        """
+        deadline = (time.time() if now is None else now) - self.max_age
+        due = []
+        for title, info in movies:
+            refreshed = info.get('last_refreshed') or 0
+            if refreshed <= deadline:
+                due.append((refreshed, title))
+        if self.batch_size is not None:
+            due = heapq.nsmallest(self.batch_size, due)
+        else:
+            due.sort()
+        return [title for refreshed, title in due]
+
+
+class RefreshEngine:
+    """Fetches OMDb info of many movies concurrently with a rate limit
+    and retries with exponential backoff for each movie"""
+
+    def __init__(self, client, max_workers=8, rate_limit=10, retries=3, backoff=0.5, use_cache=True):
+        """Instance initialization
+        :param client: OmdbClient instance
+        :param max_workers: maximum number of concurrent requests
+        :param rate_limit: maximum number of requests per second
+        :param retries: number of retries of a failed request
+        :param backoff: delay before the first retry in seconds, doubled for each next retry
+        :param use_cache: False requests every movie from the API, fresh responses are still cached
+        """
+        self._client = client
+        self.use_cache = use_cache
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self._bucket = TokenBucket(rate_limit)
+
+    def fetch(self, keys, by_id=False, progress=None):
+        """Fetches movies info. A failing movie doesn't stop the others
+        :param keys: iterable of movie titles (or IMDb ids)
+        :param by_id: True if keys are IMDb ids
+        :param progress: optional callable (key, status) called after each movie
+        :return: RefreshResult
+        """
+        result = RefreshResult()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {key: executor.submit(self._fetch_one, key, by_id) for key in keys}
+            for key, future in futures.items():
+                try:
+                    response = future.result()
+                except requests.exceptions.RequestException as error:
+                    result.failed[key] = str(error)
+                    status = 'failed'
+                else:
+                    if response.get('Response') == 'False':
+                        result.not_found[key] = response.get('Error', '')
+                        status = 'not found'
+                    else:
+                        result.found[key] = response
+                        status = 'updated'
+                if progress:
+                    progress(key, status)
+        return result
+
+    def _fetch_one(self, key, by_id):
+        """Fetches one movie info, retries on connection problems and HTTP errors
+        :return: dict with API response
+        """
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            self._bucket.acquire()
+            try:
+                if by_id:
+                    return self._client.get_by_id(key, self.use_cache)
+                return self._client.get_by_title(key, self.use_cache)
+            except requests.exceptions.RequestException:
+                if attempt == self.retries:
+                    raise
+            time.sleep(delay)
+            delay *= 2
@@ -0,0 +1,87 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubOmdbServer:
+    """Local OMDb API stub for tests and benchmarks.
+    Answers 't' and 'i' queries from given movies and can fail a number
+    of requests per title to exercise retries"""
+
+    def __init__(self, movies, failures=None, host='127.0.0.1', port=0):
+        """Instance initialization
+        :param movies: dict of title -> OMDb response dict
+        :param failures: optional dict of title -> number of requests answered with HTTP 503
+        :param host: interface to listen on
+        :param port: port to listen on, 0 picks a free port
+        """
+        self.movies = movies
+        self.failures = dict(failures or {})
+        self.requests_count = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """Base url of the running stub"""
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def start(self):
+        """Starts serving in a background thread
+        :return: self
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the server"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def respond(self, query):
+        """Builds a response for parsed query parameters
+        :return: (HTTP status, response dict)
+        """
+        with self._lock:
+            self.requests_count += 1
+            key = (query.get('t') or query.get('i') or [''])[0]
+            if self.failures.get(key):
+                self.failures[key] -= 1
+                return 503, {"Response": "False", "Error": "Service unavailable"}
+        if 'i' in query:
+            for movie in self.movies.values():
+                if movie.get('imdbID') == key:
+                    return 200, movie
+        elif key in self.movies:
+            return 200, self.movies[key]
+        return 200, {"Response": "False", "Error": "Movie not found!"}
+
+    def _handler_class(self):
+        """Creates request handler class bound to this stub"""
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, body = stub.respond(parse_qs(urlparse(self.path).query))
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,249 @@
+"""Local cache of movie posters for the generated website.
+Posters are downloaded once and the website links the local copies, so its pages
+load quickly and work offline"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import METRICS
+from storage.file_lock import atomic_write
+
+
+class PosterCache:
+    """Content-addressed store of poster images.
+    Posters are downloaded concurrently into '<cache_dir>/<sha1 of content>.<extension>',
+    so posters with the same content are stored once whatever their urls are.
+    The url -> file index is kept in '<cache_dir>/index.json'. A download is written to
+    a '.part' file first, an interrupted one is continued with an HTTP Range request.
+    With Pillow installed, a JPEG thumbnail of thumbnail_size is made of every poster"""
+
+    index_name = 'index.json'
+    extensions = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/gif': '.gif', 'image/webp': '.webp'}
+    # small chunks keep most of an interrupted download in the part file
+    chunk_size = 16 * 1024
+
+    def __init__(self, cache_dir='_static/posters', max_workers=8, timeout=10, retries=2, backoff=0.5,
+                 thumbnail_size=(256, 386)):
+        """Instance initialization
+        :param cache_dir: directory of cached posters
+        :param max_workers: maximum number of concurrent downloads
+        :param timeout: request timeout in seconds
+        :param retries: number of retries of a failed download
+        :param backoff: delay before the first retry in seconds, doubled for each next retry
+        :param thumbnail_size: (width, height) bounding box of thumbnails, None to keep posters as they are
+        """
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.thumbnail_size = thumbnail_size
+        self.downloaded = 0
+        self.cached = 0
+        self.failed = {}
+        self._index = None
+        self._image = None
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def prefetch(self, urls, progress=None):
+        """Downloads posters which are not cached yet. A failing poster doesn't stop the others
+        :param urls: iterable of poster urls, duplicates and values which are not http(s) urls
+                     (like 'N/A') are skipped
+        :param progress: optional callable (url, status) called after each poster
+        :return: dict of url -> file name in cache_dir of the thumbnail (or the poster itself)
+        """
+        urls = list(dict.fromkeys(url for url in urls if PosterCache.is_remote(url)))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if self._index is None:
+            self._index = self._read_index()
+        if self.thumbnail_size and self._image is None:
+            self._image = PosterCache._pillow()
+        files = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {url: executor.submit(self._fetch, url) for url in urls}
+                for url, future in futures.items():
+                    try:
+                        files[url], status = future.result()
+                    except (requests.exceptions.RequestException, OSError, ValueError) as error:
+                        self.failed[url] = str(error)
+                        status = 'failed'
+                        METRICS.count('posters.failed')
+                    if progress:
+                        progress(url, status)
+        finally:
+            self._write_index()
+        return files
+
+    def summary(self):
+        """Returns one line summary of the downloads
+        :return: string
+        """
+        return f'{self.downloaded} downloaded, {self.cached} cached, {len(self.failed)} failed'
+
+    def close(self):
+        """Closes pooled connections"""
+        self._session.close()
+
+    @staticmethod
+    def is_remote(url):
+        """Returns True if the poster is an http(s) url"""
+        return isinstance(url, str) and url.startswith(('http://', 'https://'))
+
+    def _fetch(self, url):
+        """Returns the cached poster of the url, downloads it if it's not cached
+        :return: tuple (file name, 'cached' or 'downloaded')
+        """
+        with self._lock:
+            entry = self._index.get(url)
+        if entry is not None and os.path.exists(os.path.join(self.cache_dir, entry['file'])):
+            status = 'cached'
+            with self._lock:
+                self.cached += 1
+            METRICS.count('posters.cached')
+        else:
+            entry = {"file": self._download(url)}
+            status = 'downloaded'
+            with self._lock:
+                self.downloaded += 1
+            METRICS.count('posters.downloaded')
+        thumbnail = entry.get('thumbnail')
+        if self._image is not None and (thumbnail is None
+                                        or not os.path.exists(os.path.join(self.cache_dir, thumbnail))):
+            thumbnail = entry['thumbnail'] = self._make_thumbnail(entry['file'])
+        with self._lock:
+            self._index[url] = entry
+        return thumbnail or entry['file'], status
+
+    def _download(self, url):
+        """Downloads the poster into the cache, retries on connection problems and HTTP errors
+        :return: file name of the poster
+        """
+        part_file = os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.part')
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                return self._download_once(url, part_file)
+            except requests.exceptions.RequestException:
+                if attempt == self.retries:
+                    raise
+            time.sleep(delay)
+            delay *= 2
+
+    @METRICS.timed('posters.download')
+    def _download_once(self, url, part_file):
+        """Downloads the poster into the part file, continuing a previous partial download,
+        and moves the complete file to its content address
+        :return: file name of the poster
+        """
+        offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        with self._session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 416:
+                # the part file doesn't match the poster any more, start over
+                os.remove(part_file)
+                raise requests.exceptions.HTTPError(f'416 Range Not Satisfiable for url: {url}',
+                                                    response=response)
+            response.raise_for_status()
+            content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+            if content_type and not content_type.startswith('image/'):
+                raise ValueError(f'{url} is not an image but {content_type}')
+            with open(part_file, 'ab' if response.status_code == 206 else 'wb') as handle:
+                for chunk in response.iter_content(PosterCache.chunk_size):
+                    handle.write(chunk)
+        digest = hashlib.sha1()
+        with open(part_file, 'rb') as handle:
+            for chunk in iter(lambda: handle.read(64 * 1024), b''):
+                digest.update(chunk)
+        name = digest.hexdigest() + PosterCache._extension(url, content_type)
+        poster_file = os.path.join(self.cache_dir, name)
+        if os.path.exists(poster_file):
+            os.remove(part_file)
+        else:
+            os.replace(part_file, poster_file)
+        return name
+
+    @staticmethod
+    def _extension(url, content_type):
+        """Returns file extension of the poster from its content type or url"""
+        if content_type in PosterCache.extensions:
+            return PosterCache.extensions[content_type]
+        extension = os.path.splitext(urlsplit(url).path)[1].lower()
+        return extension if extension in PosterCache.extensions.values() else '.jpg'
+
+    def _make_thumbnail(self, name):
+        """Makes a JPEG thumbnail of the cached poster
+        :return: file name of the thumbnail, None if the poster can not be read by Pillow
+        """
+        width, height = self.thumbnail_size
+        thumbnail = f'{os.path.splitext(name)[0]}-{width}x{height}.jpg'
+        thumbnail_file = os.path.join(self.cache_dir, thumbnail)
+        if os.path.exists(thumbnail_file):
+            return thumbnail
+        try:
+            with self._image.open(os.path.join(self.cache_dir, name)) as image:
+                image.thumbnail((width, height))
+                with atomic_write(thumbnail_file, 'wb') as handle:
+                    image.convert('RGB').save(handle, 'JPEG', quality=85, optimize=True)
+        except (OSError, ValueError):
+            return None
+        return thumbnail
+
+    @staticmethod
+    def _pillow():
+        """Returns PIL.Image module, None if Pillow is not installed"""
+        try:
+            from PIL import Image
+        except ImportError:
+            return None
+        return Image
+
+    def _read_index(self):
+        """Reads url -> poster index of the cache
+        :return: dict
+        """
+        try:
+            with open(os.path.join(self.cache_dir, PosterCache.index_name), 'r', encoding='utf-8') as handle:
+                return json.loads(handle.read())
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self):
+        """Saves url -> poster index of the cache"""
+        with self._lock:
+            index = json.dumps(self._index)
+        with atomic_write(os.path.join(self.cache_dir, PosterCache.index_name), 'w', encoding='utf-8') as handle:
+            handle.write(index)
+
+
+class LocalPosters(Mapping):
+    """Read-only view of a movies dictionary with remote poster urls replaced by local paths"""
+
+    def __init__(self, movies, posters):
+        """Instance initialization
+        :param movies: dictionary of movies
+        :param posters: dict of poster url -> local path
+        """
+        self._movies = movies
+        self._posters = posters
+
+    def __getitem__(self, title):
+        info = self._movies[title]
+        path = self._posters.get(info.get('poster'))
+        return info if path is None else {**info, 'poster': path}
+
+    def __iter__(self):
+        return iter(self._movies)
+
+    def __len__(self):
+        return len(self._movies)
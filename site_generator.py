@@ -0,0 +1,198 @@
+import collections
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from metrics import METRICS
+
+
+def _render_chunk(render_movie, movies):
+    """Returns HTML of a chunk of (title, info) tuples, run in worker processes"""
+    return ''.join([render_movie(title, info) for title, info in movies])
+
+
+class SiteGenerator:
+    """Static website generator. Streams movie list items straight into page files,
+    splits big libraries into pages (by count or by release year) and keeps a manifest
+    of movie content hashes, so pages whose movies didn't change are not rendered again.
+    Movies of big sites can be rendered in chunks by a pool of worker processes"""
+
+    grid_placeholder = '__TEMPLATE_MOVIE_GRID__'
+    title_placeholder = '__TEMPLATE_TITLE__'
+    manifest_name = '.site_manifest.json'
+
+    def __init__(self, render_movie, template_file='_static/index_template.html',
+                 output_dir='_static', page_size=1000, by_year=False, site_title='My Movie App',
+                 render_key='', workers=1, chunk_size=2000):
+        """Instance initialization
+        :param render_movie: callable (title, info) returning HTML list item of a movie,
+                             a module level function or static method if workers > 1
+        :param template_file: HTML template with grid and title placeholders
+        :param output_dir: directory for generated pages
+        :param page_size: maximum number of movies on one page
+        :param by_year: if True, generates one page per release year instead
+        :param site_title: page title
+        :param render_key: text identifying the movie markup (like its template), all pages are
+                           rendered again when it changes
+        :param workers: number of rendering processes, 1 renders in this process
+        :param chunk_size: number of movies rendered by a worker process at once
+        """
+        self._render_movie = render_movie
+        self.template_file = template_file
+        self.output_dir = output_dir
+        self.page_size = page_size
+        self.by_year = by_year
+        self.site_title = site_title
+        self.render_key = render_key
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.rendered_pages = 0
+        self.skipped_pages = 0
+
+    @METRICS.timed('website.generate')
+    def generate(self, movies):
+        """Generates website pages, skips pages whose content didn't change
+        :param movies: dictionary of movies
+        :return: list of generated page file names
+        """
+        with open(self.template_file, 'r', encoding='utf-8') as handle:
+            template = handle.read()
+        head, tail = template.replace(SiteGenerator.title_placeholder, self.site_title) \
+            .split(SiteGenerator.grid_placeholder, 1)
+        pages = self._split_pages(movies)
+        page_names = [name for name, label, titles in pages]
+        navigation = self._navigation(pages)
+        layout_hash = SiteGenerator._hash(template, self.site_title, navigation, self.render_key)
+        tail = tail.replace('</body>', navigation + '</body>', 1)
+        old_manifest = self._read_manifest()
+        manifest = {"pages": {}}
+        changed_pages = []
+        for name, label, titles in pages:
+            movie_hashes = [SiteGenerator.movie_hash(title, movies[title]) for title in titles]
+            page_hash = SiteGenerator._hash(layout_hash, *movie_hashes)
+            manifest["pages"][name] = {"hash": page_hash, "movies": movie_hashes}
+            page_file = os.path.join(self.output_dir, name)
+            old_page = old_manifest["pages"].get(name, {})
+            if old_page.get("hash") == page_hash and os.path.exists(page_file):
+                self.skipped_pages += 1
+                METRICS.count('website.pages_skipped')
+                continue
+            changed_pages.append((page_file, titles))
+        if self.workers > 1 and sum(len(titles) for page_file, titles in changed_pages) > self.chunk_size:
+            self._render_parallel(changed_pages, head, tail, movies)
+        else:
+            for page_file, titles in changed_pages:
+                self._write_page(page_file, head, tail,
+                                 (self._render_movie(title, movies[title]) for title in titles))
+        for name in old_manifest["pages"]:
+            if name not in manifest["pages"] and os.path.exists(os.path.join(self.output_dir, name)):
+                os.remove(os.path.join(self.output_dir, name))
+        self._write_manifest(manifest)
+        return page_names
+
+    @staticmethod
+    def movie_hash(title, info):
+        """Returns content hash of one movie. The refresh time isn't shown on the pages,
+        so refreshing a movie without changes doesn't render its page again"""
+        info = {field: value for field, value in info.items() if field != 'last_refreshed'}
+        return SiteGenerator._hash(json.dumps([title, info], sort_keys=True, ensure_ascii=False))
+
+    def _split_pages(self, movies):
+        """Splits movie titles into pages
+        :return: list of (file name, navigation label, list of titles) tuples
+        """
+        if self.by_year:
+            years = {}
+            for title, info in movies.items():
+                years.setdefault(str(info['year']), []).append(title)
+            ordered_years = sorted(years, reverse=True)
+            return [('index.html' if number == 0 else f'year-{year}.html', year, years[year])
+                    for number, year in enumerate(ordered_years)]
+        titles = list(movies.keys())
+        pages = []
+        for start in range(0, max(len(titles), 1), self.page_size):
+            number = len(pages) + 1
+            pages.append(('index.html' if number == 1 else f'page-{number}.html', str(number),
+                          titles[start:start + self.page_size]))
+        return pages
+
+    @staticmethod
+    def _navigation(pages):
+        """Returns HTML navigation between pages, empty for a single page site"""
+        if len(pages) < 2:
+            return ''
+        links = ''.join(f'<a href="{name}">{label}</a>' for name, label, titles in pages)
+        return f'<nav class="pagination">{links}</nav>\n'
+
+    def _render_parallel(self, pages, head, tail, movies):
+        """Renders chunks of movies in worker processes and writes the pages in order.
+        Only a few chunks per worker are in flight, so memory doesn't grow with the site size
+        :param pages: list of (page file path, list of titles) tuples
+        :param head: template part before the movie grid
+        :param tail: template part after the movie grid
+        :param movies: dictionary of movies
+        :return: None
+        """
+        chunks = ((number, titles[start:start + self.chunk_size])
+                  for number, (page_file, titles) in enumerate(pages)
+                  for start in range(0, len(titles), self.chunk_size))
+        in_flight = collections.deque()
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            def page_fragments(page_number):
+                while True:
+                    while len(in_flight) < self.workers * 2:
+                        chunk = next(chunks, None)
+                        if chunk is None:
+                            break
+                        number, titles = chunk
+                        in_flight.append((number, executor.submit(
+                            _render_chunk, self._render_movie, [(title, movies[title]) for title in titles])))
+                    if not in_flight or in_flight[0][0] != page_number:
+                        return
+                    yield in_flight.popleft()[1].result()
+
+            for page_number, (page_file, titles) in enumerate(pages):
+                self._write_page(page_file, head, tail, page_fragments(page_number))
+
+    @METRICS.timed('website.render_page')
+    def _write_page(self, page_file, head, tail, fragments):
+        """Streams one page into a temporary file and moves it into place
+        :param page_file: page file path
+        :param head: template part before the movie grid
+        :param tail: template part after the movie grid
+        :param fragments: iterable of HTML strings of the movie grid
+        :return: None
+        """
+        temporary_file = page_file + '.tmp'
+        with open(temporary_file, 'w', encoding='utf-8') as handle:
+            handle.write(head)
+            for fragment in fragments:
+                handle.write(fragment)
+            handle.write(tail)
+        os.replace(temporary_file, page_file)
+        self.rendered_pages += 1
+        METRICS.count('website.pages_rendered')
+
+    def _read_manifest(self):
+        """Reads the manifest of the previous run
+        :return: dict
+        """
+        try:
+            with open(os.path.join(self.output_dir, SiteGenerator.manifest_name), 'r', encoding='utf-8') as handle:
+                return json.loads(handle.read())
+        except (OSError, ValueError):
+            return {"pages": {}}
+
+    def _write_manifest(self, manifest):
+        """Saves the manifest of this run"""
+        with open(os.path.join(self.output_dir, SiteGenerator.manifest_name), 'w', encoding='utf-8') as handle:
+            handle.write(json.dumps(manifest))
+
+    @staticmethod
+    def _hash(*parts):
+        """Returns hex digest of given strings"""
+        digest = hashlib.sha1()
+        for part in parts:
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
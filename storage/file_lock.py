@@ -0,0 +1,149 @@
+import contextlib
+import os
+import stat
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# os.umask can only be read by setting it, so it is read once on import
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+
+
+class FileLock:
+    """Inter-process shared/exclusive lock of a database file.
+    The lock is taken on a '<database>.lock' file next to the database, because the database
+    file itself is replaced on every write. Uses fcntl.flock on POSIX. On Windows msvcrt
+    locking has no shared mode, so readers lock exclusively too. Without both only threads
+    of this process are synchronized.
+    The lock is reentrant within a process: one instance per file is shared by all storages
+    (see for_file), exclusive locking inside a shared one upgrades it"""
+
+    _locks = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, filepath):
+        """Instance initialization, use FileLock.for_file to get the lock shared by the process
+        :param filepath: database file path, None for a lock of this process only
+        """
+        self.lock_file = f'{filepath}.lock' if filepath else None
+        self._handle = None
+        self._shared = 0
+        self._exclusive = 0
+        self._state = threading.Lock()
+        self._writer = threading.RLock()
+
+    @classmethod
+    def for_file(cls, filepath):
+        """Returns the lock of the database file shared by all storages of this process
+        :param filepath: database file path
+        :return: FileLock
+        """
+        key = os.path.abspath(filepath) if filepath else None
+        with cls._registry_lock:
+            lock = cls._locks.get(key)
+            if lock is None:
+                lock = cls._locks[key] = cls(filepath)
+            return lock
+
+    @contextlib.contextmanager
+    def shared(self):
+        """Context manager holding the lock shared with other readers"""
+        with self._state:
+            if not self._shared and not self._exclusive:
+                self._lock(exclusive=False)
+            self._shared += 1
+        try:
+            yield
+        finally:
+            with self._state:
+                self._shared -= 1
+                if not self._shared and not self._exclusive:
+                    self._unlock()
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        """Context manager holding the lock exclusively, for writers.
+        Threads of this process take it one by one"""
+        with self._writer:
+            with self._state:
+                if not self._exclusive:
+                    self._lock(exclusive=True)
+                self._exclusive += 1
+            try:
+                yield
+            finally:
+                with self._state:
+                    self._exclusive -= 1
+                    if not self._exclusive:
+                        if self._shared:
+                            self._lock(exclusive=False)
+                        else:
+                            self._unlock()
+
+    def _lock(self, exclusive):
+        """Locks (or relocks in another mode) the lock file"""
+        if self.lock_file is None or (fcntl is None and msvcrt is None):
+            return
+        if self._handle is None:
+            self._handle = open(self.lock_file, 'a+b')
+        if fcntl is not None:
+            fcntl.flock(self._handle.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        elif not self._shared and not self._exclusive:
+            # msvcrt lock is always exclusive, a held lock needs no relocking
+            self._handle.seek(0)
+            msvcrt.locking(self._handle.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock(self):
+        """Unlocks and closes the lock file"""
+        if self._handle is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+        else:
+            self._handle.seek(0)
+            msvcrt.locking(self._handle.fileno(), msvcrt.LK_UNLCK, 1)
+        self._handle.close()
+        self._handle = None
+
+
+@contextlib.contextmanager
+def atomic_write(filepath, mode='w', **kwargs):
+    """Context manager returning a handle of a temporary file next to the file.
+    On success the temporary file is flushed to disk and atomically renamed over the file,
+    so readers see either the old or the new content, never a partially written file.
+    On error the temporary file is removed and the file is left untouched
+    :param filepath: path of the written file
+    :param mode: 'w' or 'wb'
+    :param kwargs: open() arguments like encoding and newline
+    """
+    directory = os.path.dirname(os.path.abspath(filepath))
+    descriptor, temporary_file = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(filepath)}.',
+                                                  suffix='.tmp')
+    try:
+        with open(descriptor, mode, **kwargs) as handle:
+            os.chmod(temporary_file, _file_mode(filepath))
+            yield handle
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temporary_file, filepath)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temporary_file)
+        raise
+
+
+def _file_mode(filepath):
+    """Returns permissions of the existing file or default permissions of a new file"""
+    try:
+        return stat.S_IMODE(os.stat(filepath).st_mode)
+    except OSError:
+        return 0o666 & ~_UMASK
@@ -1,35 +1,143 @@
+import os
 from abc import ABC, abstractmethod
+from storage.file_lock import FileLock
+
+
+class ConcurrentModificationError(Exception):
+    """Raised when the database file keeps being changed by other processes
+    during every attempt of a read-modify-write"""
 
 
 class IStorage(ABC):
 
+    modify_attempts = 10
+
+    @property
+    def filepath(self):
+        """Path of the file the storage reads from and writes to"""
+        return None
+
+    def signature(self):
+        """Returns an (inode, modification time, size) tuple of the storage file
+        or None if the file does not exist. Used to detect changes made to the file
+        :return: tuple or None
+        """
+        return IStorage.file_signature(self.filepath)
+
+    @staticmethod
+    def file_signature(filepath):
+        """Returns an (inode, modification time, size) tuple of a file or None if it does not exist.
+        Writes replace files by atomic renames, so the inode tells apart a write landing
+        in the same modification time tick with the same size
+        :param filepath: path of the file
+        :return: tuple or None
+        """
+        try:
+            stat = os.stat(filepath)
+        except (OSError, TypeError):
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def version(self):
+        """Returns a version of the storage file, changed by every write of any process.
+        Every write replaces the file, so the inode number is part of the version
+        :return: tuple or None if the file does not exist
+        """
+        return IStorage.file_signature(self.filepath)
+
+    def file_lock(self):
+        """Returns shared/exclusive lock of the storage file used by all processes
+        :return: FileLock
+        """
+        return FileLock.for_file(self.filepath)
+
     @abstractmethod
     def list_movies(self):
         pass
 
+    def iter_movies(self):
+        """Returns movies one by one. Storages able to read records lazily
+        override it, others read the whole database
+        :return: iterator of (title, info) tuples
+        """
+        return iter(self.list_movies().items())
+
+    def get_movie(self, title):
+        """Returns info of one movie
+        :param title: movie title
+        :return: dict or None if there is no such movie
+        """
+        return self.list_movies().get(title)
+
     def add_movie(self, title, year, rating, poster, imdb_id="", flag=""):
         """Reads movies database, adds one movie, saves new database to a csv file"""
-        movies = self.list_movies()
-        movies[title] = {"year": year,
-                         "rating": rating,
-                         "poster": poster,
-                         "imdb_id": imdb_id,
-                         "flag": flag}
-        self.update_database(movies)
+        def add(movies):
+            movies[title] = {"year": year,
+                             "rating": rating,
+                             "poster": poster,
+                             "imdb_id": imdb_id,
+                             "flag": flag}
+        self._read_modify_write(add)
         print(f'Movie "{title}" was added successfully')
 
+    def add_movies(self, movies):
+        """Adds many movies with a single database write
+        :param movies: dictionary of movies
+        :return: None
+        """
+        self._read_modify_write(lambda database: database.update(movies))
+
+    def update_movies(self, movies):
+        """Replaces info of many existing movies with a single database write.
+        Movies deleted in the meantime are skipped, nothing is written for no movies
+        :param movies: dictionary of movies
+        :return: None
+        """
+        if not movies:
+            return
+
+        def update(database):
+            for title, info in movies.items():
+                if title in database:
+                    database[title] = info
+        self._read_modify_write(update)
+
     def delete_movie(self, title):
         """Removes a movie from a database based on a given movie title"""
-        movies = self.list_movies()
-        del movies[title]
-        self.update_database(movies)
+        def delete(movies):
+            del movies[title]
+        self._read_modify_write(delete)
 
     def update_movie(self, title, movie_notes):
         """Updates movie's notes"""
-        movies = self.list_movies()
-        movies[title]['notes'] = movie_notes
-        self.update_database(movies)
+        def update(movies):
+            movies[title]['notes'] = movie_notes
+        self._read_modify_write(update)
 
     @abstractmethod
     def update_database(self, database):
         pass
+
+    def _read_modify_write(self, change):
+        """Reads the database, changes it and writes it back unless another process
+        wrote the file in the meantime, in which case the change is retried on fresh data.
+        The database is read under a shared lock, only the version check and the write
+        hold the exclusive lock
+        :param change: callable changing movies dictionary in place, exceptions it raises
+        (like KeyError of a missing movie) cancel the write
+        :return: None
+        """
+        for _ in range(self.modify_attempts):
+            version = self.version()
+            movies = self.list_movies()
+            change(movies)
+            with self.file_lock().exclusive():
+                if self.version() != version:
+                    continue
+                self.update_database(movies)
+                return
+        raise ConcurrentModificationError(f'{self.filepath} was changed by other processes '
+                                          f'during {self.modify_attempts} attempts')
+
+    def close(self):
+        """Releases storage resources. File storages have nothing to release"""
@@ -0,0 +1,225 @@
+import math
+from array import array
+from collections.abc import MutableMapping
+
+
+class MovieRow(MutableMapping):
+    """Mapping view of one movie stored in a MovieTable. Changes are written to the table"""
+
+    __slots__ = ('_table', '_row')
+
+    def __init__(self, table, row):
+        """Instance initialization
+        :param table: MovieTable instance
+        :param row: row number of the movie
+        """
+        self._table = table
+        self._row = row
+
+    def __getitem__(self, field):
+        return self._table.get_field(self._row, field)
+
+    def __setitem__(self, field, value):
+        self._table.set_field(self._row, field, value)
+
+    def __delitem__(self, field):
+        raise TypeError('Movie fields can not be deleted')
+
+    def __iter__(self):
+        return iter(MovieTable.fields)
+
+    def __len__(self):
+        return len(MovieTable.fields)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class MovieTable(MutableMapping):
+    """Compact columnar in-memory movies table with a mapping interface
+    compatible with the movies dictionary of dictionaries.
+    Years, ratings, refresh times and IMDb ids are kept in typed arrays, flags and poster url prefixes
+    are deduplicated, deleted rows are tombstones until the table is compacted"""
+
+    fields = ("year", "rating", "poster", "notes", "imdb_id", "flag", "last_refreshed")
+
+    def __init__(self, movies=None):
+        """Instance initialization
+        :param movies: optional mapping of movies to fill the table with
+        """
+        self._rows = {}
+        self._titles = []
+        self._years = array('i')
+        self._ratings = array('d')
+        self._poster_prefixes = array('I')
+        self._poster_names = []
+        self._notes = []
+        self._imdb_ids = array('q')
+        self._flags = array('H')
+        self._refreshed = array('q')
+        self._prefixes = []
+        self._prefix_ids = {}
+        self._flag_values = []
+        self._flag_ids = {}
+        self._raw_values = {}
+        self._deleted = 0
+        if movies:
+            for title, info in movies.items():
+                self[title] = info
+
+    def __getitem__(self, title):
+        return MovieRow(self, self._rows[title])
+
+    def __setitem__(self, title, info):
+        """Adds a movie or replaces all fields of an existing movie"""
+        row = self._rows.get(title)
+        if row is None:
+            row = len(self._titles)
+            self._rows[title] = row
+            self._titles.append(title)
+            self._years.append(0)
+            self._ratings.append(0.0)
+            self._poster_prefixes.append(0)
+            self._poster_names.append('')
+            self._notes.append('')
+            self._imdb_ids.append(-1)
+            self._flags.append(0)
+            self._refreshed.append(0)
+        values = {field: info.get(field, '') for field in MovieTable.fields}
+        for field, value in values.items():
+            self.set_field(row, field, value)
+
+    def __delitem__(self, title):
+        row = self._rows.pop(title)
+        self._titles[row] = None
+        self._poster_names[row] = self._notes[row] = ''
+        for field in ('year', 'rating', 'imdb_id'):
+            self._raw_values.pop((row, field), None)
+        self._deleted += 1
+        if self._deleted > 1024 and self._deleted * 2 > len(self._titles):
+            self.compact()
+
+    def __iter__(self):
+        for title in self._titles:
+            if title is not None:
+                yield title
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, title):
+        return title in self._rows
+
+    def __repr__(self):
+        return f'MovieTable({len(self)} movies)'
+
+    def pop(self, title, *default):
+        """Removes a movie and returns a dictionary copy of its fields"""
+        if title not in self._rows:
+            if default:
+                return default[0]
+            raise KeyError(title)
+        info = dict(self[title])
+        del self[title]
+        return info
+
+    def get_field(self, row, field):
+        """Returns one field value of a row"""
+        if field == 'year':
+            return self._raw_values.get((row, field), self._years[row])
+        if field == 'rating':
+            return self._raw_values.get((row, field), self._ratings[row])
+        if field == 'poster':
+            return self._prefixes[self._poster_prefixes[row]] + self._poster_names[row]
+        if field == 'notes':
+            return self._notes[row]
+        if field == 'imdb_id':
+            number = self._imdb_ids[row]
+            if number < 0:
+                return self._raw_values.get((row, field), '')
+            digits, number = divmod(number, 10 ** 12)
+            return f'tt{number:0{digits}d}'
+        if field == 'flag':
+            return self._flag_values[self._flags[row]]
+        if field == 'last_refreshed':
+            return self._refreshed[row]
+        raise KeyError(field)
+
+    def set_field(self, row, field, value):
+        """Sets one field value of a row"""
+        if field in ('year', 'rating'):
+            self._set_number(row, field, value)
+        elif field == 'poster':
+            prefix, separator, name = str(value).rpartition('/')
+            self._poster_prefixes[row] = MovieTable._intern(prefix + separator, self._prefixes,
+                                                            self._prefix_ids)
+            self._poster_names[row] = name
+        elif field == 'notes':
+            self._notes[row] = value
+        elif field == 'imdb_id':
+            self._set_imdb_id(row, value)
+        elif field == 'flag':
+            self._flags[row] = MovieTable._intern(value, self._flag_values, self._flag_ids)
+        elif field == 'last_refreshed':
+            self._refreshed[row] = int(value or 0)
+        else:
+            raise KeyError(field)
+
+    def compact(self):
+        """Removes tombstones of deleted movies from the columns"""
+        live_rows = [row for row, title in enumerate(self._titles) if title is not None]
+        raw_values = {}
+        for new_row, old_row in enumerate(live_rows):
+            for field in ('year', 'rating', 'imdb_id'):
+                if (old_row, field) in self._raw_values:
+                    raw_values[(new_row, field)] = self._raw_values[(old_row, field)]
+        self._titles = [self._titles[row] for row in live_rows]
+        self._years = array('i', (self._years[row] for row in live_rows))
+        self._ratings = array('d', (self._ratings[row] for row in live_rows))
+        self._poster_prefixes = array('I', (self._poster_prefixes[row] for row in live_rows))
+        self._poster_names = [self._poster_names[row] for row in live_rows]
+        self._notes = [self._notes[row] for row in live_rows]
+        self._imdb_ids = array('q', (self._imdb_ids[row] for row in live_rows))
+        self._flags = array('H', (self._flags[row] for row in live_rows))
+        self._refreshed = array('q', (self._refreshed[row] for row in live_rows))
+        self._rows = {title: row for row, title in enumerate(self._titles)}
+        self._raw_values = raw_values
+        self._deleted = 0
+
+    def _set_number(self, row, field, value):
+        """Stores year or rating in its typed column. Values which are not numbers
+        (e.g. 'N/A' or '2005–2010') are kept as they are"""
+        column = self._years if field == 'year' else self._ratings
+        try:
+            number = int(value) if field == 'year' else float(value)
+            if field == 'rating' and math.isnan(number):
+                raise ValueError
+            column[row] = number
+        except (TypeError, ValueError, OverflowError):
+            self._raw_values[(row, field)] = value
+            return
+        self._raw_values.pop((row, field), None)
+
+    def _set_imdb_id(self, row, value):
+        """Stores IMDb id like 'tt0371724' as a number with its digits count,
+        other values are kept as they are"""
+        digits = value[2:] if isinstance(value, str) and value.startswith('tt') else ''
+        if digits.isdigit() and digits.isascii() and len(digits) <= 12:
+            self._imdb_ids[row] = len(digits) * 10 ** 12 + int(digits)
+            self._raw_values.pop((row, 'imdb_id'), None)
+        else:
+            self._imdb_ids[row] = -1
+            if value:
+                self._raw_values[(row, 'imdb_id')] = value
+            else:
+                self._raw_values.pop((row, 'imdb_id'), None)
+
+    @staticmethod
+    def _intern(value, values, ids):
+        """Returns id of a deduplicated value, adds the value if it is new"""
+        value_id = ids.get(value)
+        if value_id is None:
+            value_id = len(values)
+            values.append(value)
+            ids[value] = value_id
+        return value_id
@@ -0,0 +1,111 @@
+from bisect import bisect_left, bisect_right
+from itertools import chain, islice
+
+
+def rating_value(value):
+    """Converts stored movie rating to a number"""
+    return float(value)
+
+
+def year_value(value):
+    """Converts stored movie release year to a number, '2005–2010' of series gives 2005"""
+    return int(str(value)[:4])
+
+
+class SortedIndex:
+    """Sorted secondary index of one movie field for StorageCached.
+    Answers range queries in O(log n + k) and top-k/bottom-k without sorting all movies.
+    Movies with a value that can't be converted to a number are kept apart: range queries
+    skip them and top lists them after all other movies"""
+
+    def __init__(self, field, convert=rating_value):
+        """Instance initialization
+        :param field: movie field name, e.g. 'rating' or 'year'
+        :param convert: callable converting stored field value to a comparable number
+        """
+        self.field = field
+        self._convert = convert
+        self._values = []
+        self._titles = []
+        self._unindexed = {}
+
+    def rebuild(self, movies, signature=None):
+        """Builds the index from movies"""
+        pairs = []
+        self._unindexed = {}
+        for title, info in movies.items():
+            value = self._value(info)
+            if value is not None:
+                pairs.append((value, title))
+            else:
+                self._unindexed[title] = None
+        pairs.sort(key=lambda pair: pair[0])
+        self._values = [value for value, title in pairs]
+        self._titles = [title for value, title in pairs]
+
+    def put(self, title, info, old_info=None):
+        """Indexes added movie or moves updated movie to its new position"""
+        value = self._value(info)
+        if old_info is not None:
+            old_value = self._value(old_info)
+            if old_value == value:
+                return
+            self._discard(title, old_value)
+        if value is None:
+            self._unindexed[title] = None
+            return
+        position = bisect_right(self._values, value)
+        self._values.insert(position, value)
+        self._titles.insert(position, title)
+
+    def remove(self, title, info):
+        """Removes deleted movie from the index"""
+        self._discard(title, self._value(info))
+
+    def close(self, signature):
+        """Nothing to save, the index is rebuilt on load"""
+
+    def range(self, low, high):
+        """Returns titles of movies with low <= value <= high, in ascending value order
+        :return: list of titles
+        """
+        return self._titles[bisect_left(self._values, low):bisect_right(self._values, high)]
+
+    def top(self, limit=None, reverse=False):
+        """Returns titles of movies in ascending value order, or descending if reverse is True.
+        Movies with equal values keep their order in both directions, movies without
+        a value come last
+        :param limit: maximum number of titles or None for all titles
+        :return: list of titles
+        """
+        titles = self._descending() if reverse else self._titles
+        return list(islice(chain(titles, self._unindexed), limit))
+
+    def value(self, info):
+        """Returns converted indexed value of a movie or None"""
+        return self._value(info)
+
+    def _value(self, info):
+        """Returns converted field value of a movie or None if it can't be converted"""
+        try:
+            return self._convert(info[self.field])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def _descending(self):
+        """Yields titles in descending value order, equal values in index order"""
+        end = len(self._values)
+        while end:
+            start = bisect_left(self._values, self._values[end - 1], 0, end)
+            yield from self._titles[start:end]
+            end = start
+
+    def _discard(self, title, value):
+        """Removes title with given value from the index"""
+        if value is None:
+            self._unindexed.pop(title, None)
+            return
+        position = self._titles.index(title, bisect_left(self._values, value),
+                                      bisect_right(self._values, value))
+        del self._values[position]
+        del self._titles[position]
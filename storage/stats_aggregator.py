@@ -0,0 +1,130 @@
+from bisect import bisect_left, insort
+from storage.sorted_index import rating_value, year_value
+
+
+class StatsAggregator:
+    """Incrementally maintained rating statistics for StorageCached.
+    Keeps count, sum, a sorted list of ratings for the median, titles of each rating
+    for best/worst tie sets and per-year and per-country (flag) breakdowns,
+    so reading the statistics doesn't scan the movies"""
+
+    breakdown_fields = ("year", "flag")
+
+    def __init__(self):
+        """Instance initialization"""
+        self._reset()
+
+    def rebuild(self, movies, signature=None):
+        """Recalculates statistics from movies"""
+        self._reset()
+        for title, info in movies.items():
+            self._add(title, info)
+        self._ratings.sort()
+
+    def put(self, title, info, old_info=None):
+        """Adds movie to the statistics, replaces previous state of an updated movie"""
+        if old_info is not None:
+            self._remove(title, old_info)
+        rating = self._add(title, info)
+        if rating is not None:
+            # _add appends, move the rating to its sorted position
+            self._ratings.pop()
+            insort(self._ratings, rating)
+
+    def remove(self, title, info):
+        """Removes deleted movie from the statistics"""
+        self._remove(title, info)
+
+    def close(self, signature):
+        """Nothing to save, statistics are recalculated on load"""
+
+    def stats(self):
+        """Returns rating statistics
+        :return: dict with count, average, median, best and worst movie titles
+        """
+        count = len(self._ratings)
+        if not count:
+            return {"count": 0}
+        middle = count // 2
+        if count % 2:
+            median = self._ratings[middle]
+        else:
+            median = (self._ratings[middle - 1] + self._ratings[middle]) / 2
+        return {"count": count,
+                "average": self._sum / count,
+                "median": median,
+                "best": list(self._titles_by_rating[self._ratings[-1]]),
+                "worst": list(self._titles_by_rating[self._ratings[0]])}
+
+    def breakdown(self, field):
+        """Returns number of movies and average rating per release year or per country flag
+        :param field: 'year' or 'flag'
+        :return: dict of value -> {"count": int, "average": float}
+        """
+        if field not in StatsAggregator.breakdown_fields:
+            raise ValueError(f'There is no breakdown by {field}')
+        groups = sorted(self._breakdowns[field].items(),
+                        key=lambda item: (item[0] is None, item[0] or 0))
+        return {value: {"count": count, "average": total / count}
+                for value, (count, total) in groups}
+
+    def _reset(self):
+        """Clears all statistics"""
+        self._sum = 0.0
+        self._ratings = []
+        self._titles_by_rating = {}
+        self._breakdowns = {field: {} for field in StatsAggregator.breakdown_fields}
+
+    @staticmethod
+    def _rating(info):
+        """Returns movie rating as a number or None"""
+        try:
+            return rating_value(info['rating'])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _group(info, field):
+        """Returns breakdown group of a movie"""
+        if field == 'year':
+            try:
+                return year_value(info['year'])
+            except (KeyError, TypeError, ValueError):
+                return None
+        return info.get(field) or None
+
+    def _add(self, title, info):
+        """Adds movie rating unsorted to the end of the ratings list
+        :return: added rating or None
+        """
+        rating = StatsAggregator._rating(info)
+        if rating is None:
+            return None
+        self._sum += rating
+        self._ratings.append(rating)
+        self._titles_by_rating.setdefault(rating, {})[title] = None
+        for field, groups in self._breakdowns.items():
+            group = groups.setdefault(StatsAggregator._group(info, field), [0, 0.0])
+            group[0] += 1
+            group[1] += rating
+        return rating
+
+    def _remove(self, title, info):
+        """Removes movie rating from the statistics"""
+        rating = StatsAggregator._rating(info)
+        if rating is None:
+            return
+        del self._ratings[bisect_left(self._ratings, rating)]
+        # start from an exact zero instead of accumulated float error
+        self._sum = self._sum - rating if self._ratings else 0.0
+        titles = self._titles_by_rating[rating]
+        del titles[title]
+        if not titles:
+            del self._titles_by_rating[rating]
+        for field, groups in self._breakdowns.items():
+            key = StatsAggregator._group(info, field)
+            group = groups[key]
+            group[0] -= 1
+            group[1] -= rating
+            if not group[0]:
+                del groups[key]
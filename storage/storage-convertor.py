@@ -1,51 +1,185 @@
+"""Streaming movies database convertor between CSV, JSON, JSON Lines, SQLite and sharded libraries.
+Movies are read and written one at a time, so files of any size are converted in constant memory.
+
+Usage: python storage/storage-convertor.py data/data.json data/data.csv
+"""
+import argparse
 import json
-import csv
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage.storage_csv import StorageCsv  # noqa: E402
+from storage.storage_json import StorageJson  # noqa: E402
+from storage.storage_jsonl import StorageJsonl  # noqa: E402
+from storage.storage_sharded import StorageSharded  # noqa: E402
+from storage.storage_sqlite import StorageSqlite  # noqa: E402
 
 
 class StorageConvertor:
-    """Class for storage convertor JSON -> CSV and CSV -> JSON"""
+    """Class for streaming storage convertor between CSV, JSON, JSON Lines, SQLite and sharded libraries"""
+
+    formats = ('csv', 'json', 'jsonl', 'sqlite', 'shards')
+
+    def __init__(self, chunk_size=1000, progress_every=100000, progress_stream=sys.stderr,
+                 shard_by='hash', shard_count=16):
+        """Instance initialization
+        :param chunk_size: number of movies written at once
+        :param progress_every: number of movies between progress reports, 0 disables reports
+        :param progress_stream: text stream for progress reports
+        :param shard_by: sharding scheme of a new sharded library, 'hash' of the title or 'year'
+        :param shard_count: number of shards of a new sharded library sharded by hash
+        """
+        self.chunk_size = chunk_size
+        self.progress_every = progress_every
+        self._progress_stream = progress_stream
+        self.shard_by = shard_by
+        self.shard_count = shard_count
 
-    def __init__(self, datafile):
-        """Instance initialization. Reads datafile and converts it to dict"""
-        with open(datafile, 'r') as handle:
-            if datafile.endswith(".json"):
-                self._storage = json.loads(handle.read())
+    @staticmethod
+    def file_format(datafile):
+        """Detects database format by file extension
+        :param datafile: file path
+        :return: one of StorageConvertor.formats
+        """
+        extension = os.path.splitext(datafile)[1].lower()
+        if extension in ('.db', '.sqlite'):
+            return 'sqlite'
+        if extension[1:] in StorageConvertor.formats:
+            return extension[1:]
+        raise ValueError(f'Unknown database format of "{datafile}"')
+
+    def convert(self, source_file, target_file):
+        """Converts source database file to target database file
+        :return: number of converted movies
+        """
+        movies = self._progress(self.read_movies(source_file))
+        target_format = StorageConvertor.file_format(target_file)
+        if target_format == 'sqlite':
+            count = self._write_sqlite(target_file, movies)
+        elif target_format == 'shards':
+            count = self._write_shards(target_file, movies)
+        else:
+            with open(target_file, 'w', encoding='utf-8', newline='') as handle:
+                count = self._write_text(handle, target_format, movies)
+        print(f'{count} movies were saved to file {target_file} successfully.')
+        return count
+
+    @staticmethod
+    def read_movies(source_file):
+        """Reads movies of a database file one by one
+        :return: generator of (title, info) tuples
+        """
+        source_format = StorageConvertor.file_format(source_file)
+        if source_format == 'csv':
+            yield from StorageCsv(source_file).iter_movies()
+        elif source_format == 'json':
+            yield from StorageJson(source_file).iter_movies()
+        elif source_format == 'shards':
+            if not os.path.exists(source_file):
+                raise FileNotFoundError(f'No such file: "{source_file}"')
+            storage = StorageSharded(source_file, workers=1)
+            try:
+                yield from storage.iter_movies()
+            finally:
+                storage.close()
+        else:
+            # JSON Lines databases may contain superseded and deleted records,
+            # StorageJsonl reads only the latest record of every movie
+            storage = StorageJsonl(source_file) if source_format == 'jsonl' else StorageSqlite(source_file)
+            try:
+                yield from storage.iter_movies()
+            finally:
+                storage.close()
+
+    def _write_text(self, handle, target_format, movies):
+        """Writes movies to a text file in chunks
+        :return: number of written movies
+        """
+        count = 0
+        if target_format == 'json':
+            handle.write('{')
+        elif target_format == 'csv':
+            StorageCsv.write_rows(handle, (), write_header=True)
+        for chunk in self._chunks(movies):
+            if target_format == 'csv':
+                StorageCsv.write_rows(handle, chunk)
+            elif target_format == 'jsonl':
+                handle.write(''.join(json.dumps({"title": title, **info}) + '\n' for title, info in chunk))
             else:
-                handle.readline()
-                reader = csv.reader(handle)
-                self._storage = {}
-                for line in reader:
-                    title, year, rating, poster, notes, imdb_id, flag = tuple(line)
-                    year = int(year)
-                    rating = float(rating)
-                    self._storage[title] = {"year": year,
-                                            "rating": rating,
-                                            "poster": poster,
-                                            "notes": notes,
-                                            "imdb_id": imdb_id,
-                                            "flag": flag}
-
-    def save_database_as_csv(self, csv_file):
-        """Saves database as a valid JSON file"""
-        with open(csv_file, 'w') as handle:
-            handle.write('"title","year","rating","poster","notes","imdb_id","flag"')
-            for title, info in self._storage.items():
-                year = info['year']
-                rating = info['rating']
-                poster = info.get('poster', '')
-                notes = info.get('notes', '')
-                imdb_id = info.get('imdb_id', '')
-                flag = info.get('flag', '')
-                handle.write(f'\n"{title}",{year},{rating},"{poster}","{notes}","{imdb_id}","{flag}"')
-        print(f'Movies database was save to file {csv_file} successfully.')
-
-    def save_database_as_json(self, json_file):
-        """Saves database as a valid JSON file"""
-        with open(json_file, 'w') as handle:
-            handle.write(json.dumps(self._storage))
-        print(f'Movies database was saved to file {json_file} successfully.')
-
-
-sor = StorageConvertor('../data/data.json')
-sor.save_database_as_csv('../data/data.csv')
-# sor.save_database_as_json('data2.json')
\ No newline at end of file
+                separator = ', ' if count else ''
+                handle.write(separator + ', '.join(f'{json.dumps(title)}: {json.dumps(dict(info))}'
+                                                   for title, info in chunk))
+            count += len(chunk)
+        if target_format == 'json':
+            handle.write('}')
+        return count
+
+    def _write_sqlite(self, target_file, movies):
+        """Inserts movies into an SQLite database, one transaction per chunk
+        :return: number of written movies
+        """
+        storage = StorageSqlite(target_file)
+        storage.update_database({})
+        count = 0
+        for chunk in self._chunks(movies):
+            storage.add_movies(dict(chunk))
+            count += len(chunk)
+        storage.close()
+        return count
+
+    def _write_shards(self, target_file, movies):
+        """Writes movies to a sharded library, every movie is written to its shard as it is read
+        :return: number of written movies
+        """
+        storage = StorageSharded(target_file, self.shard_by, self.shard_count, workers=1)
+        try:
+            return storage.write_movies(movies, self.chunk_size)
+        finally:
+            storage.close()
+
+    def _chunks(self, movies):
+        """Groups movies into lists of chunk_size movies"""
+        chunk = []
+        for movie in movies:
+            chunk.append(movie)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _progress(self, movies):
+        """Passes movies through, reporting their number every progress_every movies"""
+        count = 0
+        for movie in movies:
+            count += 1
+            if self.progress_every and count % self.progress_every == 0:
+                print(f'{count} movies converted...', file=self._progress_stream, flush=True)
+            yield movie
+
+
+def main():
+    """Reads command line arguments and converts the database"""
+    parser = argparse.ArgumentParser(description='Converts movies database between CSV, JSON, '
+                                                 'JSON Lines (.jsonl), SQLite (.db, .sqlite) files '
+                                                 'and sharded libraries (.shards)')
+    parser.add_argument('source', help='source database file')
+    parser.add_argument('target', help='target database file, format is taken from its extension')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='number of movies written at once')
+    parser.add_argument('--progress', type=int, default=100000,
+                        help='report progress every N movies, 0 disables reports')
+    parser.add_argument('--shard-by', choices=StorageSharded.schemes, default='hash',
+                        help='sharding scheme of a new sharded library: hash of the title or release year')
+    parser.add_argument('--shards', type=int, default=16, help='number of shards of a new library sharded by hash')
+    arguments = parser.parse_args()
+    try:
+        convertor = StorageConvertor(arguments.chunk_size, arguments.progress,
+                                     shard_by=arguments.shard_by, shard_count=arguments.shards)
+        convertor.convert(arguments.source, arguments.target)
+    except (OSError, ValueError) as error:
+        parser.exit(1, f'Conversion failed: {error}\n')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+from metrics import METRICS
+from storage.istorage import IStorage
+
+
+class StorageCached(IStorage):
+    """Caching layer for any IStorage (StorageCsv, StorageJson).
+    Keeps the parsed movies dictionary in memory and reloads it from the wrapped storage
+    only when the database file is replaced or its modification time or size changes.
+    Changes are made under the exclusive lock of the database file, after the cache
+    is revalidated, so changes made by other processes are not overwritten.
+    A change is applied to the cache and the indexes before it is written; if the write
+    fails, the cache is dropped and the next read reloads the file and rebuilds the indexes.
+    Optional indexes are kept up to date with the cache and answer query methods.
+    An index provides rebuild(movies, signature), put(title, info, old_info),
+    remove(title, info) and close(signature) methods"""
+
+    def __init__(self, storage, indexes=()):
+        """Instance initialization
+        :param storage: wrapped IStorage instance
+        :param indexes: indexes maintained on every change of the movies (e.g. TitleIndex)
+        """
+        self._backend = storage
+        self._indexes = list(indexes)
+        self._movies = None
+        self._signature = None
+        self.hits = 0
+        self.reloads = 0
+
+    @property
+    def filepath(self):
+        """Path of the wrapped storage database file"""
+        return self._backend.filepath
+
+    def signature(self):
+        """Returns the signature of the wrapped storage database file"""
+        return self._backend.signature()
+
+    def list_movies(self):
+        """Returns cached movies dictionary, reloads it if the database file was changed.
+        The returned dictionary and its movie dictionaries are the cache itself, shared with
+        every other caller and the indexes. They must be treated as read-only: a change made
+        to them is not saved and puts the indexes out of date. Copy a movie before changing it
+        and pass the copy to update_movies
+        :return: dict
+        """
+        signature = self.signature()
+        if self._movies is None or signature is None or signature != self._signature:
+            self._movies = self._load()
+            self._signature = signature
+            self.reloads += 1
+            METRICS.count('storage.cache.reloads')
+            self._rebuild_indexes()
+        else:
+            self.hits += 1
+            METRICS.count('storage.cache.hits')
+        return self._movies
+
+    def add_movie(self, title, year, rating, poster, imdb_id="", flag=""):
+        """Adds one movie to the cache and saves it"""
+        with self.file_lock().exclusive():
+            movies = self.list_movies()
+            old_info = dict(movies[title]) if title in movies else None
+            movies[title] = {"year": year,
+                             "rating": rating,
+                             "poster": poster,
+                             "imdb_id": imdb_id,
+                             "flag": flag}
+            for index in self._indexes:
+                index.put(title, movies[title], old_info)
+            self._save(self._save_movie, title, movies[title])
+        print(f'Movie "{title}" was added successfully')
+
+    def add_movies(self, movies):
+        """Adds many movies to the cache and saves them at once
+        :param movies: dictionary of movies
+        :return: None
+        """
+        with self.file_lock().exclusive():
+            database = self.list_movies()
+            for title, info in movies.items():
+                old_info = dict(database[title]) if title in database else None
+                database[title] = info
+                for index in self._indexes:
+                    index.put(title, database[title], old_info)
+            self._save(self._save_movies, movies)
+
+    def update_movies(self, movies):
+        """Replaces info of many existing movies in the cache and saves only them,
+        movies deleted in the meantime are skipped
+        :param movies: dictionary of movies
+        :return: None
+        """
+        if not movies:
+            return
+        with self.file_lock().exclusive():
+            database = self.list_movies()
+            changed = {}
+            for title, info in movies.items():
+                if title not in database:
+                    continue
+                old_info = dict(database[title])
+                database[title] = info
+                changed[title] = info
+                for index in self._indexes:
+                    index.put(title, database[title], old_info)
+            if changed:
+                self._save(self._save_movies, changed)
+
+    def delete_movie(self, title):
+        """Removes a movie from the cache and saves the change.
+        Raises KeyError if there is no such movie"""
+        with self.file_lock().exclusive():
+            movies = self.list_movies()
+            info = movies.pop(title)
+            for index in self._indexes:
+                index.remove(title, info)
+            self._save(self._save_deletion, title)
+
+    def update_movie(self, title, movie_notes):
+        """Updates movie's notes in the cache and saves the change"""
+        with self.file_lock().exclusive():
+            movies = self.list_movies()
+            old_info = dict(movies[title])
+            movies[title]['notes'] = movie_notes
+            for index in self._indexes:
+                index.put(title, movies[title], old_info)
+            self._save(self._save_movie, title, movies[title])
+
+    def update_database(self, database):
+        """Writes given database with the wrapped storage and keeps it as the cache
+        :param database: dictionary of movies
+        :return: None
+        """
+        self._backend.update_database(database)
+        self._movies = database
+        self._signature = self.signature()
+        self._rebuild_indexes()
+
+    def invalidate(self):
+        """Drops cached movies, next list_movies call reloads the database file"""
+        self._movies = None
+        self._signature = None
+
+    def cache_info(self):
+        """Returns cache counters
+        :return: dict
+        """
+        return {"hits": self.hits, "reloads": self.reloads}
+
+    def search_titles(self, text):
+        """Finds movies which title contains given text with the title index
+        :param text: part of a movie title
+        :return: list of (title, info) tuples or None without a title index
+        """
+        index = self._find_index('search')
+        if index is None:
+            return None
+        movies = self.list_movies()
+        return [(title, movies[title]) for title in index.search(text)]
+
+    def fuzzy_search_titles(self, text):
+        """Finds movies with titles similar to given text with the title index
+        :param text: movie title with possible typos
+        :return: list of (title, info) tuples, most similar first, or None without a title index
+        """
+        index = self._find_index('fuzzy_search')
+        if index is None:
+            return None
+        movies = self.list_movies()
+        return [(title, movies[title]) for title, similarity in index.fuzzy_search(text)]
+
+    def filter_movies(self, min_rating, max_rating, start_year, end_year):
+        """Finds movies within given rating and release year ranges with sorted indexes.
+        The narrower index range is taken and checked against the other range.
+        A range unbounded on both ends is no condition, movies without a value of its field are kept
+        :return: list of (title, info) tuples or None without rating and year indexes
+        """
+        rating_index = self._find_index('range', field='rating')
+        year_index = self._find_index('range', field='year')
+        if rating_index is None or year_index is None:
+            return None
+        movies = self.list_movies()
+        ranges = [(index.range(low, high), index, low, high)
+                  for index, low, high in ((rating_index, min_rating, max_rating), (year_index, start_year, end_year))
+                  if (low, high) != (float('-inf'), float('inf'))]
+        if not ranges:
+            return list(movies.items())
+        ranges.sort(key=lambda candidate: len(candidate[0]))
+        found_movies = []
+        for title in ranges[0][0]:
+            info = movies[title]
+            if all(index.value(info) is not None and low <= index.value(info) <= high
+                   for _, index, low, high in ranges[1:]):
+                found_movies.append((title, info))
+        return found_movies
+
+    def sorted_movies(self, field, reverse=False, limit=None):
+        """Returns movies ordered by field with the sorted index of the field
+        :param field: field name to sort by, e.g. 'rating' or 'year'
+        :param reverse: descending order if True
+        :param limit: maximum number of movies or None for all movies
+        :return: list of (title, info) tuples or None without an index of the field
+        """
+        index = self._find_index('top', field=field)
+        if index is None:
+            return None
+        movies = self.list_movies()
+        return [(title, movies[title]) for title in index.top(limit, reverse)]
+
+    def movie_stats(self):
+        """Returns rating statistics kept up to date by the stats aggregator
+        :return: dict with count, average, median, best and worst movies
+        or None without a stats aggregator
+        """
+        index = self._find_index('stats')
+        if index is None:
+            return None
+        movies = self.list_movies()
+        stats = index.stats()
+        for extreme in ("best", "worst"):
+            if extreme in stats:
+                stats[extreme] = [(title, movies[title]) for title in stats[extreme]]
+        return stats
+
+    def movie_stats_breakdown(self, field):
+        """Returns number of movies and average rating per release year or per country flag
+        :param field: 'year' or 'flag'
+        :return: dict or None without a stats aggregator
+        """
+        index = self._find_index('breakdown')
+        if index is None:
+            return None
+        self.list_movies()
+        return index.breakdown(field)
+
+    def close(self):
+        """Saves indexes and closes the wrapped storage"""
+        for index in self._indexes:
+            index.close(self._signature)
+        self._backend.close()
+
+    def _find_index(self, method_name, **attributes):
+        """Returns the first index providing given query method
+        and having given attribute values, or None"""
+        for index in self._indexes:
+            if hasattr(index, method_name) and all(getattr(index, name, None) == value
+                                                   for name, value in attributes.items()):
+                return index
+        return None
+
+    @METRICS.timed('storage.index.rebuild')
+    def _rebuild_indexes(self):
+        """Rebuilds all indexes from the cached movies"""
+        for index in self._indexes:
+            index.rebuild(self._movies, self._signature)
+
+    def _load(self):
+        """Reads movies from the wrapped storage
+        :return: dict
+        """
+        return self._backend.list_movies()
+
+    def _save(self, save, *arguments):
+        """Persists a change already applied to the cache and the indexes with one of the _save_*
+        methods. If it fails, the cache is dropped, so the change that was not written is not
+        served and the next read reloads the file and rebuilds the indexes"""
+        try:
+            save(*arguments)
+        except BaseException:
+            self.invalidate()
+            raise
+
+    def _write_movies(self):
+        """Rewrites the database file with the cached movies. The indexes were already
+        updated by put and remove, so only the cache signature is refreshed"""
+        self._backend.update_database(self._movies)
+        self._signature = self.signature()
+
+    def _save_movie(self, title, info):
+        """Persists an added or updated movie. The plain cache rewrites the whole database"""
+        self._write_movies()
+
+    def _save_movies(self, movies):
+        """Persists added or updated movies. The plain cache rewrites the whole database once"""
+        self._write_movies()
+
+    def _save_deletion(self, title):
+        """Persists a deleted movie. The plain cache rewrites the whole database"""
+        self._write_movies()
@@ -1,48 +1,106 @@
 import csv
+from metrics import METRICS
+from storage.file_lock import atomic_write
 from storage.istorage import IStorage
+from storage.movie_table import MovieTable
 
 
 class StorageCsv(IStorage):
     """class for dealing with csv-file movie storages"""
 
-    def __init__(self, storage):
-        """Instance initialization"""
+    # files written before last_refreshed was added have 7 columns
+    header = ("title", "year", "rating", "poster", "notes", "imdb_id", "flag", "last_refreshed")
+
+    def __init__(self, storage, compact=False):
+        """Instance initialization
+        :param storage: csv file path
+        :param compact: if True, list_movies returns a compact MovieTable instead of a dict
+        """
         self._storage = storage
+        self._compact = compact
 
+    @property
+    def filepath(self):
+        """Path of the csv database file"""
+        return self._storage
+
+    @METRICS.timed('storage.csv.read')
     def list_movies(self):
         """Reads database file, converts csv data into movies dictionary
-         returns dictionary
+         returns dictionary (or MovieTable in compact mode)
          :return: dict"""
-        with open(self._storage, 'r') as handle:
+        movies = MovieTable() if self._compact else {}
+        for title, info in self.iter_movies():
+            movies[title] = info
+        return movies
+
+    def iter_movies(self):
+        """Reads database file line by line under a shared lock
+        :return: generator of (title, info) tuples
+        """
+        with self.file_lock().shared(), open(self._storage, 'r', encoding='utf-8', newline='') as handle:
             handle.readline()
             reader = csv.reader(handle)
-            movies = {}
             for line in reader:
-                if len(line) < 7:
-                    line += [""] * (7 - len(line))
-                title, year, rating, poster, notes, imdb_id, flag = tuple(line)
-                year = int(year)
-                rating = float(rating)
-                movies[title] = {"year": year,
-                                 "rating": rating,
-                                 "poster": poster,
-                                 "notes": notes,
-                                 "imdb_id": imdb_id,
-                                 "flag": flag}
-        return movies
+                yield StorageCsv.parse_row(line)
 
+    @METRICS.timed('storage.csv.write')
     def update_database(self, database):
-        """Writes given database in a csv file
+        """Writes given database to a temporary file and replaces the csv file with it
+        under an exclusive lock
         :param database: dictionary of movies
         :return: None
         """
-        with open(self._storage, 'w') as handle:
-            handle.write('"title","year","rating","poster","notes","imdb_id","flag"')
-            for title, info in database.items():
-                handle.write(f'\n"{title}",'
-                             f'{info["year"]},'
-                             f'{info["rating"]},'
-                             f'"{info["poster"]}",'
-                             f'"{info.get("notes", "")}",'
-                             f'"{info.get("imdb_id", "")}",'
-                             f'"{info.get("flag", "")}"')
+        with self.file_lock().exclusive(), atomic_write(self._storage, 'w', encoding='utf-8', newline='') as handle:
+            StorageCsv.write_rows(handle, database.items(), write_header=True)
+
+    @staticmethod
+    def parse_row(line):
+        """Converts one csv row into a (title, info) tuple. A year or rating that is
+        not a number (e.g. 'N/A' from OMDb) is kept as a string, the way it was written
+        :param line: list of csv values
+        :return: tuple
+        """
+        if len(line) < 8:
+            line += [""] * (8 - len(line))
+        title, year, rating, poster, notes, imdb_id, flag, last_refreshed = line[:8]
+        year = StorageCsv._number(year, int)
+        rating = StorageCsv._number(rating, float)
+        return title, {"year": year,
+                       "rating": rating,
+                       "poster": poster,
+                       "notes": notes,
+                       "imdb_id": imdb_id,
+                       "flag": flag,
+                       "last_refreshed": int(last_refreshed) if last_refreshed else 0}
+
+    @staticmethod
+    def write_rows(handle, movies, write_header=False):
+        """Writes movies as csv rows. Strings are quoted (quotes inside are doubled),
+        numbers are not, the same layout as the existing database files
+        :param handle: text file object opened with newline=''
+        :param movies: iterable of (title, info) tuples
+        :param write_header: writes the header row first if True
+        :return: None
+        """
+        writer = csv.writer(handle, quoting=csv.QUOTE_NONNUMERIC, lineterminator='\n')
+        if write_header:
+            writer.writerow(StorageCsv.header)
+        writer.writerows((title,
+                          StorageCsv._number(info["year"], int),
+                          StorageCsv._number(info["rating"], float),
+                          info["poster"],
+                          info.get("notes", ""),
+                          info.get("imdb_id", ""),
+                          info.get("flag", ""),
+                          StorageCsv._number(info.get("last_refreshed") or 0, int))
+                         for title, info in movies)
+
+    @staticmethod
+    def _number(value, number_type):
+        """Converts numeric strings (JSON databases keep years and ratings as strings)
+        to numbers, so they are written unquoted. Other values are kept as they are"""
+        try:
+            return number_type(value)
+        except (TypeError, ValueError):
+            return value
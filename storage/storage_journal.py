@@ -0,0 +1,251 @@
+import json
+import os
+import sys
+import threading
+from metrics import METRICS
+from storage.storage_cached import StorageCached
+
+
+class StorageJournal(StorageCached):
+    """Journaled storage mode for any IStorage (StorageCsv, StorageJson).
+    Added, deleted and updated movies are appended as records to a journal file
+    next to the base database file instead of rewriting the whole database.
+    The journal is replayed on load and compacted into the base file
+    in a background thread once it grows past the size threshold.
+    Several processes can share the database: the files are read under a shared lock,
+    and appends and compactions hold the exclusive lock of the base database file.
+    A record left unterminated by an interrupted append is not replayed and is cut off
+    the journal before the next append, damaged records are skipped and reported"""
+
+    default_compact_threshold = 1024 * 1024
+
+    def __init__(self, storage, compact_threshold=default_compact_threshold, indexes=()):
+        """Instance initialization
+        :param storage: wrapped IStorage instance holding the base database
+        :param compact_threshold: journal size in bytes that triggers compaction
+        :param indexes: indexes maintained on every change of the movies
+        """
+        super().__init__(storage, indexes)
+        self.compact_threshold = compact_threshold
+        self.compactions = 0
+        self._journal_file = f'{storage.filepath}.journal'
+        self._compacting_file = f'{storage.filepath}.journal.compacting'
+        self._lock = threading.RLock()
+        self._compaction = None
+        self.dropped_records = 0
+
+    def signature(self):
+        """Returns signatures of the base database file and of the journal files"""
+        return (self._backend.signature(),
+                self.file_signature(self._compacting_file),
+                self.file_signature(self._journal_file))
+
+    def list_movies(self):
+        """Returns movies of the base database with the journal replayed on top of it
+        :return: dict
+        """
+        with self._lock:
+            return super().list_movies()
+
+    def add_movie(self, title, year, rating, poster, imdb_id="", flag=""):
+        """Adds one movie by appending a journal record"""
+        with self._lock:
+            super().add_movie(title, year, rating, poster, imdb_id, flag)
+
+    def add_movies(self, movies):
+        """Adds many movies by appending their journal records at once"""
+        with self._lock:
+            super().add_movies(movies)
+
+    def update_movies(self, movies):
+        """Updates many movies by appending their journal records at once"""
+        with self._lock:
+            super().update_movies(movies)
+
+    def delete_movie(self, title):
+        """Deletes one movie by appending a journal record"""
+        with self._lock:
+            super().delete_movie(title)
+
+    def update_movie(self, title, movie_notes):
+        """Updates movie's notes by appending a journal record"""
+        with self._lock:
+            super().update_movie(title, movie_notes)
+
+    def update_database(self, database):
+        """Rewrites the base database file and clears the journal
+        :param database: dictionary of movies
+        :return: None
+        """
+        self._wait_compaction()
+        with self._lock, self.file_lock().exclusive():
+            self._backend.update_database(database)
+            for filepath in (self._compacting_file, self._journal_file):
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+            self._movies = database
+            self._signature = self.signature()
+            self._rebuild_indexes()
+
+    def compact(self, wait=True):
+        """Merges the journal into the base database file.
+        The current journal is rotated under the lock and the snapshot is written to the
+        base file in a background thread, so the change that triggered compaction returns at once
+        :param wait: if False, compaction runs in a background thread
+        :return: None
+        """
+        with self._lock, self.file_lock().exclusive():
+            if self._is_compacting():
+                return
+            if os.path.exists(self._compacting_file):
+                # left over by an interrupted compaction
+                self.update_database(self.list_movies())
+                return
+            if not os.path.exists(self._journal_file):
+                return
+            snapshot = {title: dict(info) for title, info in self.list_movies().items()}
+            os.replace(self._journal_file, self._compacting_file)
+            self._signature = self.signature()
+            self._compaction = threading.Thread(target=self._compact,
+                                                args=(snapshot, self.file_signature(self._compacting_file)),
+                                                name='journal-compaction')
+            self._compaction.start()
+        if wait:
+            self._compaction.join()
+
+    def close(self):
+        """Waits for a running compaction to finish and closes the wrapped storage"""
+        self._wait_compaction()
+        super().close()
+
+    def _wait_compaction(self):
+        """Waits for a running compaction thread to finish"""
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+
+    def _is_compacting(self):
+        """Returns True while a compaction thread is running"""
+        return self._compaction is not None and self._compaction.is_alive()
+
+    @METRICS.timed('storage.journal.compact')
+    def _compact(self, snapshot, compacting_signature):
+        """Writes snapshot to the base database file and drops the rotated journal.
+        Nothing is written if another process has already merged the rotated journal
+        :param snapshot: movies dictionary including the rotated journal records
+        :param compacting_signature: signature of the rotated journal file
+        :return: None
+        """
+        with self._lock, self.file_lock().exclusive():
+            if self.file_signature(self._compacting_file) != compacting_signature:
+                self._signature = None
+                return
+            up_to_date = self.signature() == self._signature
+            self._backend.update_database(snapshot)
+            os.remove(self._compacting_file)
+            # the cache misses records appended by other processes since it was loaded
+            self._signature = self.signature() if up_to_date else None
+            self.compactions += 1
+
+    def _load(self):
+        """Reads the base database and replays journal records on top of it
+        :return: dict
+        """
+        with self.file_lock().shared():
+            try:
+                movies = self._backend.list_movies()
+            except json.decoder.JSONDecodeError:
+                movies = {}
+            dropped = sum(self._replay(filepath, movies) for filepath in (self._compacting_file, self._journal_file))
+        if dropped:
+            self.dropped_records += dropped
+            METRICS.count('storage.journal.dropped_records', dropped)
+            print(f'{dropped} damaged records of the journal of {self._backend.filepath} were skipped',
+                  file=sys.stderr)
+        return movies
+
+    @staticmethod
+    @METRICS.timed('storage.journal.read')
+    def _replay(filepath, movies):
+        """Applies records of a journal file to movies dictionary.
+        Records hold the full movie state, so replaying them twice is harmless.
+        Lines that can't be parsed and an unterminated last line are skipped
+        :param filepath: journal file path
+        :param movies: dictionary of movies
+        :return: number of skipped lines
+        """
+        if not os.path.exists(filepath):
+            return 0
+        dropped = 0
+        with open(filepath, 'r', encoding='utf-8', errors='replace') as handle:
+            for line in handle:
+                try:
+                    if not line.endswith('\n'):
+                        # a partially written last record after a crash
+                        raise ValueError('Unterminated record')
+                    record = json.loads(line)
+                    title, operation = record['title'], record['op']
+                    if operation == 'delete':
+                        movies.pop(title, None)
+                    else:
+                        movies[title] = record['movie']
+                except (ValueError, KeyError, TypeError):
+                    dropped += 1
+        return dropped
+
+    @METRICS.timed('storage.journal.write')
+    def _append(self, *records):
+        """Appends records to the journal and starts compaction if the journal is too big.
+        Callers hold the exclusive lock of the database file"""
+        self._cut_unterminated_record()
+        with open(self._journal_file, 'a', encoding='utf-8') as handle:
+            handle.write(''.join(json.dumps(record) + '\n' for record in records))
+            journal_size = handle.tell()
+        self._signature = self.signature()
+        if journal_size >= self.compact_threshold:
+            self.compact(wait=False)
+
+    def _cut_unterminated_record(self):
+        """Cuts an unterminated last record left by an interrupted append off the journal,
+        so the next record is not joined to it. Callers hold the exclusive lock
+        :return: None
+        """
+        try:
+            handle = open(self._journal_file, 'r+b')
+        except FileNotFoundError:
+            return
+        with handle:
+            size = handle.seek(0, os.SEEK_END)
+            if not size:
+                return
+            handle.seek(size - 1)
+            if handle.read(1) == b'\n':
+                return
+            end = position = size
+            while position:
+                start = max(0, position - 64 * 1024)
+                handle.seek(start)
+                newline = handle.read(position - start).rfind(b'\n')
+                if newline >= 0:
+                    end = start + newline + 1
+                    break
+                position = start
+            else:
+                end = 0
+            handle.truncate(end)
+        METRICS.count('storage.journal.dropped_records')
+        print(f'An unterminated record of {size - end} bytes was cut off the journal {self._journal_file}',
+              file=sys.stderr)
+
+    def _save_movie(self, title, info):
+        """Appends an added or updated movie record to the journal"""
+        self._append({"op": "put", "title": title, "movie": dict(info)})
+
+    def _save_movies(self, movies):
+        """Appends records of added or updated movies to the journal with one write"""
+        self._append(*({"op": "put", "title": title, "movie": dict(self._movies[title])}
+                       for title in movies))
+
+    def _save_deletion(self, title):
+        """Appends a deleted movie record to the journal"""
+        self._append({"op": "delete", "title": title})
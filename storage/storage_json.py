@@ -1,14 +1,29 @@
 import json
+from metrics import METRICS
+from storage.file_lock import atomic_write
 from storage.istorage import IStorage
+from storage.movie_table import MovieTable
 
 
 class StorageJson(IStorage):
     """Storage class for dealing with json files storage"""
 
-    def __init__(self, filepath):
-        """Instance initialization"""
+    chunk_size = 1024 * 1024
+
+    def __init__(self, filepath, compact=False):
+        """Instance initialization
+        :param filepath: json file path
+        :param compact: if True, list_movies returns a compact MovieTable instead of a dict
+        """
         self._data_file = filepath
+        self._compact = compact
+
+    @property
+    def filepath(self):
+        """Path of the json database file"""
+        return self._data_file
 
+    @METRICS.timed('storage.json.read')
     def list_movies(self):
         """Returns a dictionary of dictionaries that
         contains the movies information in the database.
@@ -16,13 +31,98 @@ class StorageJson(IStorage):
         file and returns the data.
         :return: dictionary
         """
-        with open(self._data_file, "r") as database_file:
-            return json.loads(database_file.read())
+        with self.file_lock().shared(), open(self._data_file, "r", encoding="utf-8") as database_file:
+            movies = json.loads(database_file.read())
+        if self._compact:
+            return MovieTable(movies)
+        return movies
+
+    def iter_movies(self):
+        """Parses database file incrementally, one movie at a time,
+        holding only a chunk of the file in memory
+        :return: generator of (title, info) tuples
+        """
+        with self.file_lock().shared(), open(self._data_file, "r", encoding="utf-8") as database_file:
+            yield from StorageJson.iter_json_object(database_file, StorageJson.chunk_size)
+
+    @staticmethod
+    def iter_json_object(handle, chunk_size=chunk_size):
+        """Parses top level JSON object of a file member by member.
+        The parsed prefix of the buffer is dropped only when the next chunk is read
+        :param handle: text file object
+        :param chunk_size: number of characters read at once
+        :return: generator of (key, value) tuples
+        """
+        decoder = json.JSONDecoder()
+        buffer = handle.read(chunk_size).lstrip()
+        if not buffer:
+            return
+        if buffer[0] != '{':
+            raise json.decoder.JSONDecodeError('Expected a JSON object', buffer, 0)
+        position = 1
+        at_end = False
+        expected = None
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n':
+                position += 1
+            if position == len(buffer):
+                if at_end:
+                    raise json.decoder.JSONDecodeError('Unexpected end of the JSON object', buffer, position)
+                buffer, position = buffer[position:], 0
+                chunk = handle.read(chunk_size)
+                at_end = not chunk
+                buffer += chunk
+                continue
+            character = buffer[position]
+            if character == '}' and expected != ':':
+                return
+            if character in ',:' and expected is None:
+                expected = character
+                position += 1
+                continue
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+                if end == len(buffer) and not at_end:
+                    # a value at the very end of the buffer might continue in the next chunk
+                    raise ValueError
+            except ValueError:
+                if at_end:
+                    raise
+                buffer, position = buffer[position:], 0
+                chunk = handle.read(chunk_size)
+                at_end = not chunk
+                buffer += chunk
+                continue
+            position = end
+            if expected == ':':
+                yield key, value
+            else:
+                key = value
+            expected = None
+
+    @staticmethod
+    def write_movies(handle, movies):
+        """Writes movies as a JSON object member by member,
+        in the same layout as json.dumps of the whole dictionary
+        :param handle: text file object
+        :param movies: iterable of (title, info) tuples
+        :return: None
+        """
+        handle.write('{')
+        separator = ''
+        for title, info in movies:
+            handle.write(f'{separator}{json.dumps(title)}: {json.dumps(dict(info))}')
+            separator = ', '
+        handle.write('}')
 
+    @METRICS.timed('storage.json.write')
     def update_database(self, database):
-        """Rewrites database JSON file
+        """Writes database to a temporary file and replaces the JSON file with it
+        under an exclusive lock
         :param database: dictionary
         :return: None
         """
-        with open(self._data_file, "w") as database_file:
+        if not isinstance(database, dict):
+            database = {title: dict(info) for title, info in database.items()}
+        with self.file_lock().exclusive(), atomic_write(self._data_file, "w", encoding="utf-8") as database_file:
             database_file.write(json.dumps(database))
@@ -0,0 +1,317 @@
+import json
+import mmap
+import os
+import pickle
+from metrics import METRICS
+from storage.file_lock import atomic_write
+from storage.istorage import IStorage
+
+
+class StorageJsonl(IStorage):
+    """Record oriented storage of JSON Lines files, one movie per line.
+    Changes are appended as new records, deletions as tombstone records.
+    A title -> (offset, length) index of the latest records lets a single movie
+    be read from the memory mapped file with one seek. The index is saved
+    next to the database file and the file is compacted when most of it is dead records.
+    Every call checks the file signature first: records appended by another process
+    are indexed, a file compacted by another process is indexed again.
+    Reads take the shared and writes the exclusive lock of the database file"""
+
+    def __init__(self, filepath, compact_ratio=1.0):
+        """Instance initialization. Loads the saved index or builds it by scanning the file
+        :param filepath: JSON Lines file path
+        :param compact_ratio: dead to live bytes ratio that triggers compaction
+        """
+        self._data_file = filepath
+        self._index_file = f'{filepath}.idx'
+        self.compact_ratio = compact_ratio
+        self._offsets = {}
+        self._live_bytes = 0
+        self._dead_bytes = 0
+        self._end = 0
+        self._signature = None
+        self._map = None
+        if not os.path.exists(filepath):
+            open(filepath, 'ab').close()
+        with self.file_lock().shared():
+            if not self._load_index():
+                self._build_index()
+
+    @property
+    def filepath(self):
+        """Path of the JSON Lines database file"""
+        return self._data_file
+
+    @METRICS.timed('storage.jsonl.read')
+    def list_movies(self):
+        """Reads all live movies
+        :return: dict
+        """
+        return dict(self.iter_movies())
+
+    def iter_movies(self):
+        """Reads live movies one by one in file order. The movies of the file as it was
+        when the iteration started are read, changes made meanwhile are not seen
+        :return: generator of (title, info) tuples
+        """
+        with self.file_lock().shared():
+            self._revalidate()
+            ordered = sorted(self._offsets.items(), key=lambda item: item[1][0])
+            data = self._mapped(self._end)
+        for title, (offset, length) in ordered:
+            yield title, StorageJsonl._parse(data, offset, length)
+
+    @METRICS.timed('storage.jsonl.read')
+    def get_movie(self, title):
+        """Reads one movie with a single seek
+        :param title: movie title
+        :return: dict or None if there is no such movie
+        """
+        with self.file_lock().shared():
+            self._revalidate()
+            position = self._offsets.get(title)
+            if position is None:
+                return None
+            return self._read(*position)
+
+    def add_movie(self, title, year, rating, poster, imdb_id="", flag=""):
+        """Appends one movie record"""
+        with self.file_lock().exclusive():
+            self._revalidate()
+            self._append([(title, {"year": year,
+                                   "rating": rating,
+                                   "poster": poster,
+                                   "notes": "",
+                                   "imdb_id": imdb_id,
+                                   "flag": flag})])
+        print(f'Movie "{title}" was added successfully')
+
+    def add_movies(self, movies):
+        """Appends records of many movies with one write
+        :param movies: dictionary of movies
+        :return: None
+        """
+        with self.file_lock().exclusive():
+            self._revalidate()
+            self._append(list(movies.items()))
+
+    def update_movies(self, movies):
+        """Appends new records of many existing movies with one write,
+        movies not in the database are skipped
+        :param movies: dictionary of movies
+        :return: None
+        """
+        with self.file_lock().exclusive():
+            self._revalidate()
+            existing = [(title, info) for title, info in movies.items() if title in self._offsets]
+            if existing:
+                self._append(existing)
+
+    def delete_movie(self, title):
+        """Appends a tombstone record, raises KeyError if there is no such movie"""
+        with self.file_lock().exclusive():
+            self._revalidate()
+            if title not in self._offsets:
+                raise KeyError(title)
+            self._append([(title, None)])
+
+    def update_movie(self, title, movie_notes):
+        """Appends a new record of the movie with updated notes,
+        raises KeyError if there is no such movie"""
+        with self.file_lock().exclusive():
+            info = self.get_movie(title)
+            if info is None:
+                raise KeyError(title)
+            info['notes'] = movie_notes
+            self._append([(title, info)])
+
+    @METRICS.timed('storage.jsonl.write')
+    def update_database(self, database):
+        """Rewrites the database file with live records only
+        :param database: dictionary of movies
+        :return: None
+        """
+        with self.file_lock().exclusive():
+            self._rewrite(database.items())
+
+    @METRICS.timed('storage.jsonl.compact')
+    def compact(self):
+        """Rewrites the database file without dead records"""
+        with self.file_lock().exclusive():
+            self._rewrite(list(self.iter_movies()))
+
+    def close(self):
+        """Saves the index and closes the memory map"""
+        with self.file_lock().shared():
+            self._revalidate()
+            self._save_index()
+        self._unmap()
+
+    @staticmethod
+    def _record(title, info):
+        """Serializes one record line, info None makes a tombstone"""
+        if info is None:
+            return (json.dumps({"title": title, "deleted": True}) + '\n').encode('utf-8')
+        return (json.dumps({"title": title, **info}) + '\n').encode('utf-8')
+
+    @staticmethod
+    def _parse(data, offset, length):
+        """Parses the record at given position of mapped file data
+        :return: dict
+        """
+        info = json.loads(data[offset:offset + length])
+        del info['title']
+        return info
+
+    def _read(self, offset, length):
+        """Reads and parses the record at given position
+        :return: dict
+        """
+        return StorageJsonl._parse(self._mapped(offset + length), offset, length)
+
+    def _mapped(self, size):
+        """Returns the memory map of the database file, mapped again if it is shorter than size"""
+        if self._map is None or size > len(self._map):
+            self._remap()
+        return self._map
+
+    def _revalidate(self):
+        """Brings the index up to date with the database file, called under the file lock.
+        Records appended since the file was indexed are scanned, a replaced or shrunk file
+        is indexed again"""
+        signature = self.signature()
+        if signature == self._signature:
+            return
+        if (self._signature is not None and signature is not None
+                and signature[0] == self._signature[0] and signature[2] >= self._end):
+            self._scan(self._end)
+        elif not self._load_index():
+            self._build_index()
+        self._map = None
+
+    @METRICS.timed('storage.jsonl.write')
+    def _append(self, movies):
+        """Appends records of (title, info) tuples, info None deletes the movie.
+        Called under the exclusive lock with a revalidated index. An unterminated
+        last record left by an interrupted append is cut off the file first"""
+        records = [StorageJsonl._record(title, info) for title, info in movies]
+        if self._signature is not None and self._signature[2] > self._end:
+            os.truncate(self._data_file, self._end)
+        with open(self._data_file, 'ab') as handle:
+            offset = handle.seek(0, os.SEEK_END)
+            handle.write(b''.join(records))
+        for (title, info), record in zip(movies, records):
+            previous = self._offsets.pop(title, None)
+            if previous is not None:
+                self._live_bytes -= previous[1]
+                self._dead_bytes += previous[1]
+            if info is None:
+                self._dead_bytes += len(record)
+            else:
+                self._offsets[title] = (offset, len(record))
+                self._live_bytes += len(record)
+            offset += len(record)
+        self._end = offset
+        self._signature = self.signature()
+        if self._dead_bytes > max(self._live_bytes, 4096) * self.compact_ratio:
+            self.compact()
+
+    def _rewrite(self, movies):
+        """Writes given (title, info) tuples to a new file and replaces the database file with it,
+        called under the exclusive lock"""
+        offsets = {}
+        offset = 0
+        with atomic_write(self._data_file, 'wb') as handle:
+            for title, info in movies:
+                record = StorageJsonl._record(title, dict(info))
+                handle.write(record)
+                offsets[title] = (offset, len(record))
+                offset += len(record)
+            self._unmap()
+        self._offsets = offsets
+        self._live_bytes = offset
+        self._dead_bytes = 0
+        self._end = offset
+        self._signature = self.signature()
+
+    def _build_index(self):
+        """Scans the database file and indexes the latest record of every title"""
+        self._offsets = {}
+        self._live_bytes = 0
+        self._dead_bytes = 0
+        self._scan(0)
+
+    def _scan(self, offset):
+        """Indexes the records from given offset to the end of the file.
+        The scan stops at an unterminated last record, which is left by an interrupted append
+        and cut off by the next write, other records that can't be parsed are skipped as dead records
+        :param offset: offset of the first scanned record
+        :return: None
+        """
+        self._signature = self.signature()
+        with open(self._data_file, 'rb') as handle:
+            handle.seek(offset)
+            for line in handle:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line) if line.strip() else None
+                except ValueError:
+                    record = None
+                if record is not None:
+                    previous = self._offsets.pop(record['title'], None)
+                    if previous is not None:
+                        self._live_bytes -= previous[1]
+                        self._dead_bytes += previous[1]
+                    if record.get('deleted'):
+                        self._dead_bytes += len(line)
+                    else:
+                        self._offsets[record['title']] = (offset, len(line))
+                        self._live_bytes += len(line)
+                else:
+                    self._dead_bytes += len(line)
+                offset += len(line)
+        self._end = offset
+
+    def _load_index(self):
+        """Loads the saved index if it was saved for the current database file
+        :return: True if the index was loaded
+        """
+        try:
+            with open(self._index_file, 'rb') as handle:
+                saved = pickle.load(handle)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return False
+        signature = self.signature()
+        if saved.get("signature") != signature or "end" not in saved:
+            return False
+        self._offsets = saved["offsets"]
+        self._live_bytes = saved["live_bytes"]
+        self._dead_bytes = saved["dead_bytes"]
+        self._end = saved["end"]
+        self._signature = signature
+        return True
+
+    def _save_index(self):
+        """Saves the index with the database file signature it was built for"""
+        with atomic_write(self._index_file, 'wb') as handle:
+            pickle.dump({"signature": self._signature,
+                         "offsets": self._offsets,
+                         "live_bytes": self._live_bytes,
+                         "dead_bytes": self._dead_bytes,
+                         "end": self._end}, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _remap(self):
+        """Maps the current database file into memory. The previous map is not closed,
+        running iterations still read it"""
+        with open(self._data_file, 'rb') as handle:
+            if os.fstat(handle.fileno()).st_size:
+                self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._map = b''
+
+    def _unmap(self):
+        """Closes the memory map"""
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._map = None
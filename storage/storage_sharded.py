@@ -0,0 +1,450 @@
+import contextlib
+import json
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from metrics import METRICS
+from storage.file_lock import atomic_write
+from storage.istorage import IStorage
+from storage.sorted_index import SortedIndex, rating_value, year_value
+from storage.storage_csv import StorageCsv
+from storage.storage_json import StorageJson
+
+
+def _scan_shard(shard_file, query, arguments):
+    """Runs a scan query over one shard file in a worker process
+    :return: list of (title, info) tuples
+    """
+    return StorageSharded.scan(StorageSharded.shard_storage(shard_file), query, arguments)
+
+
+class StorageSharded(IStorage):
+    """Library split across several CSV or JSON shard files by hash of the title or by release year.
+    A small JSON manifest file keeps the sharding scheme and the list of shards, the shard files
+    are kept in the '<manifest>.d' directory. A change reads and rewrites only the shard of the
+    changed movie. Title searches and rating/year filters scan the shards in a pool of worker
+    processes and merge the results, year filters skip shards of other years.
+    With hash shards a movie is found in its shard directly, with year shards a title lookup
+    scans all shards"""
+
+    schemes = ('hash', 'year')
+    shard_formats = ('csv', 'json')
+    # shard of movies whose year is not a number
+    unknown_year = 'unknown'
+
+    def __init__(self, filepath, scheme='hash', shard_count=16, shard_format='csv', workers=None):
+        """Instance initialization. Reads the manifest, creates an empty library with given
+        scheme, number of shards and shard format if the manifest doesn't exist
+        :param filepath: manifest file path ('.shards')
+        :param scheme: 'hash' of the title or release 'year'
+        :param shard_count: number of shards of the hash scheme
+        :param shard_format: 'csv' or 'json' shard files
+        :param workers: number of scanning processes, os.cpu_count() by default, 1 scans in this process
+        """
+        if scheme not in StorageSharded.schemes:
+            raise ValueError(f'Unknown sharding scheme {scheme}')
+        if shard_format not in StorageSharded.shard_formats:
+            raise ValueError(f'Unknown shard format {shard_format}')
+        self._manifest_file = filepath
+        self._shards_dir = f'{filepath}.d'
+        self.scheme = scheme
+        self.shard_count = shard_count
+        self.shard_format = shard_format
+        self.workers = workers or os.cpu_count() or 1
+        self._keys = []
+        self._shards = {}
+        self._manifest_signature = None
+        self._pool = None
+        if not os.path.exists(filepath):
+            self._create()
+        self._read_manifest()
+
+    @property
+    def filepath(self):
+        """Path of the manifest file"""
+        return self._manifest_file
+
+    def signature(self):
+        """Returns signatures of the manifest and of all shard files"""
+        self._read_manifest()
+        return (self.file_signature(self._manifest_file),
+                *(self.file_signature(self._shard_file(key)) for key in self._keys))
+
+    def version(self):
+        """Returns versions of the manifest and of all shard files"""
+        self._read_manifest()
+        return (IStorage.version(self), *(self._shard(key).version() for key in self._keys))
+
+    @METRICS.timed('storage.sharded.read')
+    def list_movies(self):
+        """Reads movies of all shards, shard by shard
+        :return: dict
+        """
+        return dict(self.iter_movies())
+
+    def iter_movies(self):
+        """Reads movies shard by shard
+        :return: generator of (title, info) tuples
+        """
+        self._read_manifest()
+        for key in list(self._keys):
+            yield from self._shard(key).iter_movies()
+
+    def get_movie(self, title):
+        """Reads one movie from its shard
+        :param title: movie title
+        :return: dict or None if there is no such movie
+        """
+        key = self._locate(title)
+        return None if key is None else self._shard(key).get_movie(title)
+
+    def add_movie(self, title, year, rating, poster, imdb_id="", flag=""):
+        """Adds one movie rewriting only its shard"""
+        key = self._key(title, {"year": year})
+        if self.scheme == 'year':
+            old_key = self._locate(title)
+            if old_key is not None and old_key != key:
+                self._shard(old_key).delete_movie(title)
+                self._drop_if_empty(old_key)
+        self._shard(key, create=True).add_movie(title, year, rating, poster, imdb_id, flag)
+
+    def add_movies(self, movies):
+        """Adds many movies with one write of every affected shard
+        :param movies: dictionary of movies
+        :return: None
+        """
+        if self.scheme == 'year':
+            self._remove_moved(movies)
+        for key, shard_movies in self._group(movies).items():
+            self._shard(key, create=True).add_movies(shard_movies)
+
+    def update_movies(self, movies):
+        """Replaces info of many existing movies with one write of every affected shard,
+        movies not in the library are skipped
+        :param movies: dictionary of movies
+        :return: None
+        """
+        if self.scheme == 'hash':
+            for key, shard_movies in self._group(movies).items():
+                self._shard(key).update_movies(shard_movies)
+            return
+        locations = self._locate_all(movies)
+        moved = self._remove_moved({title: movies[title] for title in locations}, locations)
+        for key, shard_movies in self._group({title: movies[title] for title in locations}).items():
+            shard = self._shard(key, create=True)
+            shard_moved = {title: info for title, info in shard_movies.items() if title in moved}
+            if shard_moved:
+                shard.add_movies(shard_moved)
+            shard.update_movies({title: info for title, info in shard_movies.items() if title not in moved})
+
+    def delete_movie(self, title):
+        """Removes a movie from its shard, raises KeyError if there is no such movie"""
+        key = self._locate(title)
+        if key is None:
+            raise KeyError(title)
+        self._shard(key).delete_movie(title)
+        self._drop_if_empty(key)
+
+    def update_movie(self, title, movie_notes):
+        """Updates movie's notes in its shard, raises KeyError if there is no such movie"""
+        key = self._locate(title)
+        if key is None:
+            raise KeyError(title)
+        self._shard(key).update_movie(title, movie_notes)
+
+    def update_database(self, database):
+        """Replaces all movies of the library, year shards left without movies are removed
+        :param database: dictionary of movies
+        :return: None
+        """
+        self.write_movies(database.items())
+
+    @METRICS.timed('storage.sharded.write')
+    def write_movies(self, movies, chunk_size=1000):
+        """Replaces all movies of the library with a stream of movies, each title given once.
+        Movies are written to new shard files as they are read, at most chunk_size movies
+        are kept in memory, so a library of any size is written in constant memory.
+        The shard files replace the old ones when the stream ends, year shards left without
+        movies are removed
+        :param movies: iterable of (title, info) tuples
+        :param chunk_size: number of movies buffered before they are written to their shards
+        :return: number of written movies
+        """
+        count = 0
+        with self.file_lock().exclusive():
+            self._read_manifest()
+            with contextlib.ExitStack() as files:
+                handles, pending, written = {}, {}, {}
+                for title, info in movies:
+                    key = self._key(title, info)
+                    if key not in handles:
+                        handles[key] = self._open_shard(key, files)
+                        pending[key], written[key] = [], 0
+                    pending[key].append((title, info))
+                    count += 1
+                    if count % chunk_size == 0:
+                        for pending_key, pending_movies in pending.items():
+                            written[pending_key] = self._write_rows(handles[pending_key], pending_movies,
+                                                                    written[pending_key])
+                            pending[pending_key] = []
+                if self.scheme == 'hash':
+                    for key in set(self._keys) - set(handles):
+                        handles[key] = self._open_shard(key, files)
+                        pending[key], written[key] = [], 0
+                for key, handle in handles.items():
+                    self._write_rows(handle, pending[key], written[key])
+                    if self.shard_format == 'json':
+                        handle.write('}')
+            keys = sorted(handles)
+            for key in set(self._keys) - set(keys):
+                os.remove(self._shard_file(key))
+                self._shards.pop(key, None)
+            self._keys = keys
+            self._write_manifest()
+        return count
+
+    def search_titles(self, text):
+        """Finds movies which title contains given text, case-insensitive, scanning the shards in parallel
+        :param text: part of a movie title
+        :return: list of (title, info) tuples
+        """
+        return self._scan('search', (text,))
+
+    def filter_movies(self, min_rating, max_rating, start_year, end_year):
+        """Finds movies within given rating and release year ranges scanning the shards in parallel,
+        year shards out of the year range are skipped. A range unbounded on both ends is no condition,
+        movies without a value of its field are kept
+        :return: list of (title, info) tuples
+        """
+        keys = None
+        if self.scheme == 'year' and (start_year, end_year) != (float('-inf'), float('inf')):
+            self._read_manifest()
+            keys = [key for key in self._keys if key != StorageSharded.unknown_year
+                    and start_year <= int(key) <= end_year]
+        return self._scan('filter', (min_rating, max_rating, start_year, end_year), keys)
+
+    def close(self):
+        """Stops the scanning processes"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    @staticmethod
+    def shard_storage(shard_file):
+        """Returns the storage of a shard file by its extension"""
+        return StorageCsv(shard_file) if shard_file.endswith('.csv') else StorageJson(shard_file)
+
+    @staticmethod
+    def scan(storage, query, arguments):
+        """Scans one shard
+        :param storage: shard storage
+        :param query: 'search' (text), 'filter' (min_rating, max_rating, start_year, end_year)
+                      or 'titles' (set of titles)
+        :param arguments: tuple of query arguments
+        :return: list of (title, info) tuples
+        """
+        found = []
+        if query == 'search':
+            text = arguments[0].lower()
+            for title, info in storage.iter_movies():
+                if text in title.lower():
+                    found.append((title, info))
+        elif query == 'filter':
+            # stored values are converted like the sorted indexes do, movies without numbers are skipped
+            min_rating, max_rating, start_year, end_year = arguments
+            ranges = [(SortedIndex(field, convert), low, high)
+                      for field, convert, low, high in (('rating', rating_value, min_rating, max_rating),
+                                                        ('year', year_value, start_year, end_year))
+                      if (low, high) != (float('-inf'), float('inf'))]
+            for title, info in storage.iter_movies():
+                if all(index.value(info) is not None and low <= index.value(info) <= high
+                       for index, low, high in ranges):
+                    found.append((title, info))
+        elif query == 'titles':
+            titles = arguments[0]
+            for title, info in storage.iter_movies():
+                if title in titles:
+                    found.append((title, info))
+        else:
+            raise ValueError(f'Unknown scan query {query}')
+        return found
+
+    @METRICS.timed('storage.sharded.scan')
+    def _scan(self, query, arguments, keys=None):
+        """Runs a scan query over the shards, in worker processes if there are several shards
+        :param keys: scanned shards, all shards by default
+        :return: list of (title, info) tuples in shard order
+        """
+        return [movie for key, found in self._scan_shards(query, arguments, keys) for movie in found]
+
+    def _scan_shards(self, query, arguments, keys=None):
+        """Runs a scan query over the shards
+        :return: list of (shard key, list of (title, info) tuples)
+        """
+        self._read_manifest()
+        keys = list(self._keys if keys is None else keys)
+        if self.workers <= 1 or len(keys) < 2:
+            return [(key, StorageSharded.scan(self._shard(key), query, arguments)) for key in keys]
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        shard_files = [self._shard_file(key) for key in keys]
+        return list(zip(keys, self._pool.map(_scan_shard, shard_files, repeat(query), repeat(arguments))))
+
+    def _key(self, title, info):
+        """Returns key of the shard of a movie"""
+        if self.scheme == 'hash':
+            return f'{zlib.crc32(title.encode("utf-8")) % self.shard_count:03d}'
+        try:
+            return str(year_value(info['year']))
+        except (KeyError, TypeError, ValueError):
+            return StorageSharded.unknown_year
+
+    def _group(self, movies):
+        """Groups movies by their shards
+        :return: dict of shard key -> dictionary of movies
+        """
+        groups = {}
+        for title, info in movies.items():
+            groups.setdefault(self._key(title, info), {})[title] = info
+        return groups
+
+    def _locate(self, title):
+        """Returns key of the shard holding the movie or None if there is no such movie"""
+        if self.scheme == 'hash':
+            key = self._key(title, {})
+            self._read_manifest()
+            return key if key in self._keys and self._shard(key).get_movie(title) is not None else None
+        return self._locate_all([title]).get(title)
+
+    def _locate_all(self, titles):
+        """Finds shards of the year scheme holding given movies with one scan
+        :return: dict of title -> shard key for found movies
+        """
+        titles = set(titles)
+        return {title: key for key, found in self._scan_shards('titles', (titles,)) for title, info in found}
+
+    def _remove_moved(self, movies, locations=None):
+        """Removes movies whose year changed from their old year shards
+        :param movies: dictionary of movies with new info
+        :param locations: dict of title -> current shard key, found by a scan if not given
+        :return: set of removed titles
+        """
+        if locations is None:
+            locations = self._locate_all(movies)
+        moved = {}
+        for title, key in locations.items():
+            if key != self._key(title, movies[title]):
+                moved.setdefault(key, set()).add(title)
+        for key, titles in moved.items():
+            def remove(database, titles=titles):
+                for title in titles:
+                    database.pop(title, None)
+            self._shard(key)._read_modify_write(remove)
+            self._drop_if_empty(key)
+        return {title for titles in moved.values() for title in titles}
+
+    def _drop_if_empty(self, key):
+        """Removes a year shard left without movies from the manifest and deletes its file,
+        so scans don't read it any more. Hash shards are kept"""
+        if self.scheme != 'year':
+            return
+        with self.file_lock().exclusive():
+            self._read_manifest()
+            if key not in self._keys:
+                return
+            shard = self._shard(key)
+            with shard.file_lock().exclusive():
+                if next(iter(shard.iter_movies()), None) is not None:
+                    return
+                self._keys = [other for other in self._keys if other != key]
+                self._write_manifest()
+                self._shards.pop(key, None)
+                os.remove(self._shard_file(key))
+
+    def _shard_file(self, key):
+        """Returns path of a shard file"""
+        return os.path.join(self._shards_dir, f'{key}.{self.shard_format}')
+
+    def _shard(self, key, create=False):
+        """Returns storage of a shard, a missing year shard is added to the manifest if create is True"""
+        shard = self._shards.get(key)
+        if shard is not None:
+            return shard
+        if key not in self._keys:
+            if not create:
+                raise KeyError(key)
+            with self.file_lock().exclusive():
+                self._read_manifest()
+                if key not in self._keys:
+                    self._write_shard(key, {})
+                    self._keys = sorted(self._keys + [key])
+                    self._write_manifest()
+        shard = self._shards[key] = StorageSharded.shard_storage(self._shard_file(key))
+        return shard
+
+    def _write_shard(self, key, movies):
+        """Writes a shard file"""
+        StorageSharded.shard_storage(self._shard_file(key)).update_database(movies)
+
+    def _open_shard(self, key, files):
+        """Locks a shard file and opens a new file replacing it when files are closed,
+        a CSV header or the opening brace of a JSON object is written first
+        :param files: contextlib.ExitStack closing the shard file
+        :return: text file object
+        """
+        shard_file = self._shard_file(key)
+        files.enter_context(StorageSharded.shard_storage(shard_file).file_lock().exclusive())
+        handle = files.enter_context(atomic_write(shard_file, 'w', encoding='utf-8', newline=''))
+        if self.shard_format == 'csv':
+            StorageCsv.write_rows(handle, (), write_header=True)
+        else:
+            handle.write('{')
+        return handle
+
+    def _write_rows(self, handle, movies, written):
+        """Writes movies to a shard file opened by _open_shard
+        :param written: number of movies already written to the file
+        :return: number of movies written to the file
+        """
+        if self.shard_format == 'csv':
+            StorageCsv.write_rows(handle, movies)
+        elif movies:
+            handle.write((', ' if written else '') + ', '.join(f'{json.dumps(title)}: {json.dumps(dict(info))}'
+                                                             for title, info in movies))
+        return written + len(movies)
+
+    def _create(self):
+        """Creates the shards directory, empty shards of the hash scheme and the manifest"""
+        os.makedirs(self._shards_dir, exist_ok=True)
+        with self.file_lock().exclusive():
+            if os.path.exists(self._manifest_file):
+                return
+            if self.scheme == 'hash':
+                self._keys = [f'{number:03d}' for number in range(self.shard_count)]
+            for key in self._keys:
+                self._write_shard(key, {})
+            self._write_manifest()
+
+    def _read_manifest(self):
+        """Reads the manifest if it was changed since the last read"""
+        signature = self.file_signature(self._manifest_file)
+        if signature == self._manifest_signature:
+            return
+        with self.file_lock().shared(), open(self._manifest_file, 'r', encoding='utf-8') as handle:
+            manifest = json.loads(handle.read())
+        self.scheme = manifest['scheme']
+        self.shard_count = manifest['shard_count']
+        self.shard_format = manifest['format']
+        self._keys = manifest['shards']
+        self._shards = {key: shard for key, shard in self._shards.items() if key in self._keys}
+        self._manifest_signature = signature
+
+    def _write_manifest(self):
+        """Saves the manifest, callers hold the exclusive lock of the manifest file"""
+        with atomic_write(self._manifest_file, 'w', encoding='utf-8') as handle:
+            handle.write(json.dumps({"scheme": self.scheme,
+                                     "shard_count": self.shard_count,
+                                     "format": self.shard_format,
+                                     "shards": self._keys}, indent=1))
+        self._manifest_signature = self.file_signature(self._manifest_file)
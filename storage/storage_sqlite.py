@@ -0,0 +1,198 @@
+import sqlite3
+from metrics import METRICS
+from storage.istorage import IStorage
+
+
+class StorageSqlite(IStorage):
+    """Storage class for dealing with SQLite database files.
+    Besides IStorage methods provides query methods (search_titles, filter_movies,
+    sorted_movies, movie_stats) that are answered by SQL using the table indexes"""
+
+    fields = ("year", "rating", "poster", "notes", "imdb_id", "flag", "last_refreshed")
+    sortable_fields = ("year", "rating")
+
+    def __init__(self, filepath):
+        """Instance initialization. Creates movies table and its indexes if they don't exist,
+        adds the last_refreshed column to tables created before it.
+        The connection may be used by another thread than the one that opened it
+        (e.g. a storage loaded in a worker thread), but by one thread at a time"""
+        self._data_file = filepath
+        self._connection = sqlite3.connect(filepath, check_same_thread=False)
+        with self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS movies ('
+                                     'title TEXT PRIMARY KEY, year INTEGER, rating REAL, '
+                                     'poster TEXT, notes TEXT, imdb_id TEXT, flag TEXT, '
+                                     'last_refreshed INTEGER NOT NULL DEFAULT 0)')
+            columns = [row[1] for row in self._connection.execute('PRAGMA table_info(movies)')]
+            if 'last_refreshed' not in columns:
+                self._connection.execute('ALTER TABLE movies '
+                                         'ADD COLUMN last_refreshed INTEGER NOT NULL DEFAULT 0')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS movies_rating ON movies (rating)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS movies_year ON movies (year)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS movies_imdb_id ON movies (imdb_id)')
+
+    @property
+    def filepath(self):
+        """Path of the SQLite database file"""
+        return self._data_file
+
+    def list_movies(self):
+        """Reads all movies from the database
+        :return: dict
+        """
+        return dict(self._select(''))
+
+    def iter_movies(self):
+        """Reads movies lazily from a database cursor
+        :return: generator of (title, info) tuples
+        """
+        cursor = self._connection.execute(f'SELECT title, {", ".join(StorageSqlite.fields)} FROM movies')
+        for row in cursor:
+            yield StorageSqlite._movie(row)
+
+    def get_movie(self, title):
+        """Selects one movie by its title
+        :param title: movie title
+        :return: dict or None if there is no such movie
+        """
+        found = self._select('WHERE title = ?', (title,))
+        return found[0][1] if found else None
+
+    @METRICS.timed('storage.sqlite.write')
+    def add_movie(self, title, year, rating, poster, imdb_id="", flag=""):
+        """Inserts or replaces one movie"""
+        with self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO movies VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                     (title, year, rating, poster, "", imdb_id, flag, 0))
+        print(f'Movie "{title}" was added successfully')
+
+    @METRICS.timed('storage.sqlite.write')
+    def add_movies(self, movies):
+        """Inserts or replaces many movies in one transaction
+        :param movies: dictionary of movies
+        :return: None
+        """
+        with self._connection:
+            self._connection.executemany('INSERT OR REPLACE INTO movies VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                         (StorageSqlite._row(title, info) for title, info in movies.items()))
+
+    @METRICS.timed('storage.sqlite.write')
+    def update_movies(self, movies):
+        """Updates many existing movies in one transaction, movies not in the database are skipped
+        :param movies: dictionary of movies
+        :return: None
+        """
+        assignments = ', '.join(f'{field} = ?' for field in StorageSqlite.fields)
+        with self._connection:
+            self._connection.executemany(f'UPDATE movies SET {assignments} WHERE title = ?',
+                                         (StorageSqlite._row(title, info)[1:] + (title,)
+                                          for title, info in movies.items()))
+
+    @METRICS.timed('storage.sqlite.write')
+    def delete_movie(self, title):
+        """Removes a movie from a database, raises KeyError if there is no such movie"""
+        with self._connection:
+            cursor = self._connection.execute('DELETE FROM movies WHERE title = ?', (title,))
+        if not cursor.rowcount:
+            raise KeyError(title)
+
+    @METRICS.timed('storage.sqlite.write')
+    def update_movie(self, title, movie_notes):
+        """Updates movie's notes, raises KeyError if there is no such movie"""
+        with self._connection:
+            cursor = self._connection.execute('UPDATE movies SET notes = ? WHERE title = ?',
+                                              (movie_notes, title))
+        if not cursor.rowcount:
+            raise KeyError(title)
+
+    @METRICS.timed('storage.sqlite.write')
+    def update_database(self, database):
+        """Replaces all movies of the database with given movies
+        :param database: dictionary of movies
+        :return: None
+        """
+        with self._connection:
+            self._connection.execute('DELETE FROM movies')
+            self._connection.executemany('INSERT INTO movies VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                         (StorageSqlite._row(title, info)
+                                          for title, info in database.items()))
+
+    def close(self):
+        """Closes the database connection"""
+        self._connection.close()
+
+    def search_titles(self, text):
+        """Finds movies which title contains given text, case-insensitive
+        :param text: part of a movie title
+        :return: list of (title, info) tuples
+        """
+        pattern = '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        return self._select("WHERE title LIKE ? ESCAPE '\\'", (pattern,))
+
+    def filter_movies(self, min_rating, max_rating, start_year, end_year):
+        """Finds movies within given rating and release year ranges.
+        A range unbounded on both ends is no condition, movies without a value of its field are kept
+        :return: list of (title, info) tuples
+        """
+        conditions, parameters = [], []
+        for field, low, high in (('rating', min_rating, max_rating), ('year', start_year, end_year)):
+            if (low, high) != (float('-inf'), float('inf')):
+                conditions.append(f'{field} BETWEEN ? AND ?')
+                parameters += [low, high]
+        return self._select(f'WHERE {" AND ".join(conditions)}' if conditions else '', parameters)
+
+    def sorted_movies(self, field, reverse=False, limit=None):
+        """Returns movies ordered by 'rating' or 'year'
+        :param field: field name to sort by
+        :param reverse: descending order if True
+        :param limit: maximum number of movies or None for all movies
+        :return: list of (title, info) tuples
+        """
+        if field not in StorageSqlite.sortable_fields:
+            raise ValueError(f'Movies can not be sorted by {field}')
+        order = 'DESC' if reverse else 'ASC'
+        return self._select(f'ORDER BY {field} {order} LIMIT ?',
+                            (-1 if limit is None else limit,))
+
+    def movie_stats(self):
+        """Calculates rating statistics with SQL aggregates
+        :return: dict with count, average, median, best and worst movies
+        or None if the database is empty
+        """
+        count, average, best_rating, worst_rating = self._connection.execute(
+            'SELECT COUNT(*), AVG(rating), MAX(rating), MIN(rating) FROM movies').fetchone()
+        if not count:
+            return None
+        middle = self._connection.execute('SELECT rating FROM movies ORDER BY rating LIMIT ? OFFSET ?',
+                                          (2 - count % 2, (count - 1) // 2)).fetchall()
+        return {"count": count,
+                "average": average,
+                "median": sum(rating for rating, in middle) / len(middle),
+                "best": self._select('WHERE rating = ?', (best_rating,)),
+                "worst": self._select('WHERE rating = ?', (worst_rating,))}
+
+    @METRICS.timed('storage.sqlite.read')
+    def _select(self, clause, parameters=()):
+        """Selects movies with given SQL clause
+        :return: list of (title, info) tuples
+        """
+        cursor = self._connection.execute(f'SELECT title, {", ".join(StorageSqlite.fields)} '
+                                          f'FROM movies {clause}', parameters)
+        return [StorageSqlite._movie(row) for row in cursor]
+
+    @staticmethod
+    def _movie(row):
+        """Converts a table row to a (title, info) tuple"""
+        return row[0], dict(zip(StorageSqlite.fields, row[1:]))
+
+    @staticmethod
+    def _row(title, info):
+        """Converts one movie to a table row"""
+        return (title,
+                info["year"],
+                info["rating"],
+                info.get("poster", ""),
+                info.get("notes", ""),
+                info.get("imdb_id", ""),
+                info.get("flag", ""),
+                info.get("last_refreshed") or 0)
@@ -0,0 +1,156 @@
+import math
+import os
+import pickle
+
+
+class TitleIndex:
+    """Trigram inverted index of movie titles for StorageCached.
+    Answers case-insensitive substring search (the same results as scanning all titles)
+    and ranked typo-tolerant fuzzy search. Can be persisted next to the database file"""
+
+    def __init__(self, filepath=None):
+        """Instance initialization
+        :param filepath: optional index file path, the index is saved there on close
+        and loaded from there when it matches the database file signature
+        """
+        self.filepath = filepath
+        self._postings = {}
+        self._lowered = {}
+        self._order = {}
+        self._next_order = 0
+        self._dirty = False
+
+    @staticmethod
+    def trigrams(text):
+        """Returns set of trigrams of lowercased text padded with spaces"""
+        padded = f'  {text} '
+        return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+    def rebuild(self, movies, signature=None):
+        """Builds the index from movies or loads it from the index file
+        if it was saved for the same database file signature
+        :param movies: dictionary of movies
+        :param signature: database file signature
+        :return: None
+        """
+        if signature is not None and self._load(signature, len(movies)):
+            return
+        self._postings = {}
+        self._lowered = {}
+        self._order = {}
+        self._next_order = 0
+        for title in movies:
+            self._add(title)
+        self._dirty = True
+
+    def put(self, title, info, old_info=None):
+        """Indexes added movie, nothing to do for an updated one"""
+        if old_info is None:
+            self._add(title)
+            self._dirty = True
+
+    def remove(self, title, info):
+        """Removes deleted movie from the index"""
+        lowered = self._lowered.pop(title)
+        del self._order[title]
+        for trigram in TitleIndex.trigrams(lowered):
+            titles = self._postings[trigram]
+            titles.discard(title)
+            if not titles:
+                del self._postings[trigram]
+        self._dirty = True
+
+    def close(self, signature):
+        """Saves the index if it has changed
+        :param signature: current database file signature
+        :return: None
+        """
+        if self.filepath is None or not self._dirty:
+            return
+        with open(self.filepath, 'wb') as handle:
+            pickle.dump({"signature": signature,
+                         "postings": self._postings,
+                         "order": self._order}, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        self._dirty = False
+
+    def search(self, text):
+        """Finds titles containing text, case-insensitive, in the database order
+        :param text: part of a movie title
+        :return: list of titles
+        """
+        query = text.lower()
+        if len(query) < 3:
+            candidates = self._lowered
+        else:
+            postings = []
+            for index in range(len(query) - 2):
+                titles = self._postings.get(query[index:index + 3])
+                if not titles:
+                    return []
+                postings.append(titles)
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for titles in postings[1:]:
+                if len(candidates) <= 32:
+                    # cheaper to check the few candidates directly
+                    break
+                candidates &= titles
+        found = [title for title in candidates if query in self._lowered[title]]
+        found.sort(key=self._order.__getitem__)
+        return found
+
+    def fuzzy_search(self, text, limit=10, min_similarity=0.3):
+        """Finds titles similar to text ranked by trigram similarity, tolerates typos
+        :param text: movie title with possible typos
+        :param limit: maximum number of titles
+        :param min_similarity: minimum Jaccard similarity of trigram sets (0 - 1)
+        :return: list of (title, similarity) tuples, most similar first
+        """
+        query_trigrams = TitleIndex.trigrams(text.lower())
+        # a title similar enough shares at least min_shared trigrams with the query,
+        # so it has to contain one of the len - min_shared + 1 rarest query trigrams
+        min_shared = max(1, math.ceil(min_similarity * len(query_trigrams)))
+        rarest = sorted(query_trigrams, key=lambda trigram: len(self._postings.get(trigram, ())))
+        candidates = set()
+        for trigram in rarest[:len(rarest) - min_shared + 1]:
+            candidates.update(self._postings.get(trigram, ()))
+        query_postings = [self._postings.get(trigram, ()) for trigram in query_trigrams]
+        ranked = []
+        for title in candidates:
+            shared = sum(1 for titles in query_postings if title in titles)
+            # a title of n characters has at most n + 1 distinct padded trigrams
+            title_size = len(self._lowered[title]) + 1
+            similarity = shared / (len(query_trigrams) + title_size - shared)
+            if similarity >= min_similarity:
+                ranked.append((title, similarity))
+        ranked.sort(key=lambda item: (-item[1], self._order[item[0]]))
+        return ranked[:limit]
+
+    def _add(self, title):
+        """Adds one title to the index"""
+        lowered = title.lower()
+        self._lowered[title] = lowered
+        self._order[title] = self._next_order
+        self._next_order += 1
+        for trigram in TitleIndex.trigrams(lowered):
+            self._postings.setdefault(trigram, set()).add(title)
+
+    def _load(self, signature, count):
+        """Loads the saved index if it was saved for given signature
+        :return: True if the index was loaded
+        """
+        if self.filepath is None or not os.path.exists(self.filepath):
+            return False
+        try:
+            with open(self.filepath, 'rb') as handle:
+                saved = pickle.load(handle)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return False
+        if saved["signature"] != signature or len(saved["order"]) != count:
+            return False
+        self._postings = saved["postings"]
+        self._order = saved["order"]
+        self._lowered = {title: title.lower() for title in self._order}
+        self._next_order = max(self._order.values(), default=-1) + 1
+        self._dirty = False
+        return True
@@ -0,0 +1,108 @@
+"""Tests of the HTTP API server against databases changed by another process.
+Run from the repository root: python -m unittest discover tests"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from urllib.parse import quote
+from api_server import MovieApiServer
+from benchmarks.generate_library import generate_movies, write_library
+from main import create_storage
+
+DELETE_MOVIES = '''
+import sys
+from main import create_storage
+storage = create_storage(sys.argv[1])
+for title in list(storage.list_movies())[:int(sys.argv[2])]:
+    storage.delete_movie(title)
+if hasattr(storage, 'compact'):
+    storage.compact()
+storage.close()
+'''
+
+
+class MovieApiServerTest(unittest.TestCase):
+    """Answers of the server before and after another process changes the database"""
+
+    count = 200
+
+    def setUp(self):
+        self._workdir = tempfile.TemporaryDirectory()
+        self.movies = dict(generate_movies(self.count))
+
+    def tearDown(self):
+        self._workdir.cleanup()
+
+    def database(self, extension):
+        """Writes the generated movies to a database file
+        :return: database file path
+        """
+        filepath = os.path.join(self._workdir.name, f'movies{extension}')
+        write_library(filepath, self.movies.items())
+        return filepath
+
+    @staticmethod
+    async def get(port, target):
+        """Sends one request
+        :return: tuple (status, decoded JSON body)
+        """
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(f'GET {target} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n'.encode('latin-1'))
+        response = await reader.read()
+        writer.close()
+        head, _, body = response.partition(b'\r\n\r\n')
+        return int(head.split()[1]), json.loads(body)
+
+    def delete_in_other_process(self, filepath, count):
+        """Deletes the first count movies of the database in another process"""
+        subprocess.run([sys.executable, '-c', DELETE_MOVIES, filepath, str(count)], check=True,
+                       stdout=subprocess.DEVNULL, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    def check_change(self, extension):
+        """Checks the answers of the server before and after another process deletes most movies"""
+        filepath = self.database(extension)
+        storage = create_storage(filepath)
+        deleted = list(storage.list_movies())[:150]
+        storage.close()
+
+        async def run():
+            server = MovieApiServer(lambda: create_storage(filepath), check_interval=0)
+            _, port = await server.start(port=0)
+            try:
+                status, body = await self.get(port, '/movies?limit=1')
+                self.assertEqual((status, body['count']), (200, self.count))
+                status, _ = await self.get(port, f'/movies/{quote(deleted[0])}')
+                self.assertEqual(status, 200)
+                await asyncio.to_thread(self.delete_in_other_process, filepath, len(deleted))
+                status, body = await self.get(port, '/movies')
+                self.assertEqual((status, body['count']), (200, self.count - len(deleted)))
+                self.assertFalse(set(deleted) & {movie['title'] for movie in body['movies']})
+                status, _ = await self.get(port, f'/movies/{quote(deleted[0])}')
+                self.assertEqual(status, 404)
+                status, body = await self.get(port, '/stats')
+                self.assertEqual((status, body['count']), (200, self.count - len(deleted)))
+                status, body = await self.get(port, '/stats?by=year')
+                self.assertEqual((status, sum(group['count'] for group in body['by_year'])),
+                                 (200, self.count - len(deleted)))
+                status, _ = await self.get(port, '/stats?by=rating')
+                self.assertEqual(status, 400)
+            finally:
+                await server.stop()
+
+        asyncio.run(run())
+
+    def test_csv_change_is_served(self):
+        self.check_change('.csv')
+
+    def test_jsonl_change_is_served(self):
+        self.check_change('.jsonl')
+
+    def test_sqlite_change_is_served(self):
+        self.check_change('.db')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""Tests of movie queries streamed through their steps and answered by storage indexes.
+Run from the repository root: python -m unittest discover tests"""
+import os
+import tempfile
+import unittest
+from movie_query import MovieQuery
+from storage.storage_cached import StorageCached
+from storage.storage_json import StorageJson
+from storage.storage_jsonl import StorageJsonl
+from storage.sorted_index import SortedIndex, rating_value, year_value
+
+# values as JSON databases store them: strings, a series year and values OMDb has no number for
+MOVIES = {
+    "Alpha": {"year": "2005", "rating": "9", "poster": "", "notes": ""},
+    "Bravo": {"year": "1999", "rating": "10", "poster": "", "notes": ""},
+    "Charlie": {"year": "N/A", "rating": "7.5", "poster": "", "notes": ""},
+    "Delta": {"year": "2010–2014", "rating": "N/A", "poster": "", "notes": ""},
+    "Echo": {"year": 2005, "rating": 9.0, "poster": "", "notes": ""},
+    "Foxtrot": {"year": "1999", "rating": "7.5", "poster": "", "notes": ""},
+}
+
+
+class MovieQueryTest(unittest.TestCase):
+    """Streamed steps convert stored values, indexed and streamed queries give equal results"""
+
+    def setUp(self):
+        self._workdir = tempfile.TemporaryDirectory()
+        self.streamed = StorageJsonl(os.path.join(self._workdir.name, 'movies.jsonl'))
+        self.streamed.update_database(MOVIES)
+        json_storage = StorageJson(os.path.join(self._workdir.name, 'movies.json'))
+        json_storage.update_database(MOVIES)
+        self.indexed = StorageCached(json_storage, indexes=[SortedIndex('rating', rating_value),
+                                                            SortedIndex('year', year_value)])
+
+    def tearDown(self):
+        self.streamed.close()
+        self.indexed.close()
+        self._workdir.cleanup()
+
+    @staticmethod
+    def titles(query):
+        """Runs the query and returns titles of its movies"""
+        return [title for title, info in query]
+
+    def test_filters_convert_strings_and_skip_values_without_numbers(self):
+        query = MovieQuery(self.streamed).rating(8, 10)
+        self.assertEqual(self.titles(query), ["Alpha", "Bravo", "Echo"])
+        self.assertEqual(query.plan, 'iter_movies')
+        self.assertEqual(self.titles(MovieQuery(self.streamed).year(2000, 2010)), ["Alpha", "Delta", "Echo"])
+        self.assertEqual(self.titles(MovieQuery(self.streamed).rating(7).year(1990, 2000)), ["Bravo", "Foxtrot"])
+
+    def test_order_by_sorts_numbers_keeps_ties_and_puts_values_without_numbers_last(self):
+        query = MovieQuery(self.streamed).order_by('rating', reverse=True)
+        self.assertEqual(self.titles(query), ["Bravo", "Alpha", "Echo", "Charlie", "Foxtrot", "Delta"])
+        query = MovieQuery(self.streamed).order_by('year')
+        self.assertEqual(self.titles(query), ["Bravo", "Foxtrot", "Alpha", "Echo", "Delta", "Charlie"])
+
+    def test_top_equals_order_by_with_limit(self):
+        for reverse in (False, True):
+            for field in ('rating', 'year'):
+                ordered = self.titles(MovieQuery(self.streamed).order_by(field, reverse))
+                for limit in range(len(MOVIES) + 1):
+                    query = MovieQuery(self.streamed).order_by(field, reverse).limit(limit)
+                    self.assertEqual(self.titles(query), ordered[:limit])
+
+    def test_indexed_queries_equal_streamed_queries(self):
+        queries = [lambda storage: MovieQuery(storage).rating(7.5, 9),
+                   lambda storage: MovieQuery(storage).year(1999, 2005),
+                   lambda storage: MovieQuery(storage).order_by('rating', reverse=True),
+                   lambda storage: MovieQuery(storage).order_by('year').limit(4)]
+        for query in queries:
+            indexed, streamed = query(self.indexed), query(self.streamed)
+            indexed_titles, streamed_titles = self.titles(indexed), self.titles(streamed)
+            self.assertNotEqual(indexed.plan, 'iter_movies')
+            if indexed.plan == 'filter_movies':
+                # range queries of the indexes return movies in value order
+                indexed_titles, streamed_titles = sorted(indexed_titles), sorted(streamed_titles)
+            self.assertEqual(indexed_titles, streamed_titles)
+
+    def test_sample_of_a_stream(self):
+        sample = self.titles(MovieQuery(self.streamed).sample(3))
+        self.assertEqual(len(set(sample)), 3)
+        self.assertLessEqual(set(sample), set(MOVIES))
+        self.assertEqual(len(self.titles(MovieQuery(self.streamed).sample(10))), len(MOVIES))
+
+
+if __name__ == '__main__':
+    unittest.main()
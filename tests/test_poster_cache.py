@@ -0,0 +1,102 @@
+"""Tests of the poster cache against the local stub image server of the poster benchmark.
+Run from the repository root: python -m unittest discover tests"""
+import hashlib
+import os
+import tempfile
+import unittest
+from benchmarks.bench_posters import StubImageServer
+from poster_cache import LocalPosters, PosterCache
+
+
+class PosterCacheTest(unittest.TestCase):
+    """Downloads, deduplication, resuming and failures of PosterCache"""
+
+    def setUp(self):
+        self._workdir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self._workdir.name, 'posters')
+        self.server = StubImageServer(distinct=3, latency=0)
+        self.server.__enter__()
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+        self._workdir.cleanup()
+
+    def url(self, number):
+        """Returns url of a stub poster, posters with equal number modulo 3 have equal content"""
+        return f'{self.server.url}poster-{number}.png'
+
+    def image(self, number):
+        """Returns content of a stub poster"""
+        return self.server.images[number % len(self.server.images)]
+
+    def prefetch(self, urls, retries=2):
+        """Runs one prefetch with a new cache, thumbnails disabled
+        :return: tuple (cache, dict of url -> file name)
+        """
+        cache = PosterCache(self.cache_dir, max_workers=4, retries=retries, backoff=0.01, thumbnail_size=None)
+        try:
+            return cache, cache.prefetch(urls)
+        finally:
+            cache.close()
+
+    def read(self, name):
+        """Returns content of a cached file"""
+        with open(os.path.join(self.cache_dir, name), 'rb') as handle:
+            return handle.read()
+
+    def test_equal_posters_are_stored_once(self):
+        urls = [self.url(number) for number in range(9)]
+        cache, files = self.prefetch(urls)
+        self.assertEqual(cache.downloaded, 9)
+        self.assertEqual(set(files), set(urls))
+        self.assertEqual(len(set(files.values())), 3)
+        for number, url in enumerate(urls):
+            self.assertEqual(self.read(files[url]), self.image(number))
+            self.assertEqual(files[url], hashlib.sha1(self.image(number)).hexdigest() + '.png')
+        stored = [name for name in os.listdir(self.cache_dir) if name != PosterCache.index_name]
+        self.assertEqual(len(stored), 3)
+
+    def test_cached_posters_are_not_downloaded_again(self):
+        urls = [self.url(number) for number in range(4)]
+        self.prefetch(urls)
+        requests_count = self.server.requests_count
+        cache, files = self.prefetch(urls + ['N/A', ''])
+        self.assertEqual((cache.downloaded, cache.cached), (0, 4))
+        self.assertEqual(self.server.requests_count, requests_count)
+        self.assertEqual(set(files), set(urls))
+
+    def test_interrupted_download_is_resumed(self):
+        self.server.truncate = {'/poster-1.png'}
+        cache, files = self.prefetch([self.url(1)])
+        self.assertEqual(self.server.range_requests, 1)
+        self.assertEqual(self.read(files[self.url(1)]), self.image(1))
+        self.assertFalse([name for name in os.listdir(self.cache_dir) if name.endswith('.part')])
+
+    def test_stale_part_file_is_restarted_after_416(self):
+        os.makedirs(self.cache_dir)
+        part_file = os.path.join(self.cache_dir, hashlib.sha1(self.url(2).encode('utf-8')).hexdigest() + '.part')
+        with open(part_file, 'wb') as handle:
+            handle.write(b'\0' * (len(self.image(2)) + 10))
+        cache, files = self.prefetch([self.url(2)])
+        self.assertEqual(self.server.range_requests, 1)
+        self.assertEqual(self.read(files[self.url(2)]), self.image(2))
+        self.assertFalse(os.path.exists(part_file))
+
+    def test_failed_poster_keeps_its_remote_url(self):
+        missing = f'{self.server.url}missing.png'
+        cache, files = self.prefetch([self.url(0), missing], retries=0)
+        self.assertEqual(list(cache.failed), [missing])
+        self.assertNotIn(missing, files)
+        movies = {"Found": {"poster": self.url(0), "year": 2000},
+                  "Missing": {"poster": missing, "year": 2001},
+                  "No poster": {"poster": "N/A", "year": 2002}}
+        local = LocalPosters(movies, {url: f'posters/{name}' for url, name in files.items()})
+        self.assertEqual(local["Found"], {"poster": f'posters/{files[self.url(0)]}', "year": 2000})
+        self.assertEqual(local["Missing"]["poster"], missing)
+        self.assertEqual(local["No poster"]["poster"], "N/A")
+        self.assertEqual(list(local), list(movies))
+        self.assertEqual(movies["Found"]["poster"], self.url(0))
+
+
+if __name__ == '__main__':
+    unittest.main()
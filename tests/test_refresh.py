@@ -0,0 +1,72 @@
+"""Tests of the refresh engine against the local stub OMDb API server.
+Run from the repository root: python -m unittest discover tests"""
+import time
+import unittest
+from benchmarks.generate_library import generate_movies, omdb_response
+from omdb.client import OmdbClient
+from omdb.refresh import RefreshEngine
+from omdb.stub_server import StubOmdbServer
+
+
+class RefreshEngineTest(unittest.TestCase):
+    """Retries, rate limiting and partial failures of RefreshEngine"""
+
+    def setUp(self):
+        self.movies = dict(generate_movies(30))
+        self.titles = list(self.movies)
+        self.client = None
+        self.server = None
+
+    def tearDown(self):
+        if self.client is not None:
+            self.client.close()
+        if self.server is not None:
+            self.server.__exit__(None, None, None)
+
+    def engine(self, failures=None, rate_limit=1000, retries=3):
+        """Starts a stub serving the generated movies and creates an engine requesting it
+        :param failures: optional dict of title -> number of requests answered with HTTP 503
+        :return: RefreshEngine
+        """
+        self.server = StubOmdbServer({title: omdb_response(title, info) for title, info in self.movies.items()},
+                                     failures)
+        self.server.__enter__()
+        self.client = OmdbClient('test', self.server.url)
+        return RefreshEngine(self.client, max_workers=4, rate_limit=rate_limit, retries=retries, backoff=0.01)
+
+    def test_failed_requests_are_retried(self):
+        engine = self.engine({self.titles[0]: 3, self.titles[1]: 1})
+        result = engine.fetch(self.titles)
+        self.assertEqual(set(result.found), set(self.titles))
+        self.assertFalse(result.failed or result.not_found)
+        self.assertEqual(result.found[self.titles[0]]['imdbID'], self.movies[self.titles[0]]['imdb_id'])
+        self.assertEqual(self.server.requests_count, len(self.titles) + 4)
+
+    def test_requests_are_rate_limited(self):
+        rate_limit = 20
+        engine = self.engine(rate_limit=rate_limit)
+        started = time.monotonic()
+        result = engine.fetch(self.titles)
+        elapsed = time.monotonic() - started
+        self.assertEqual(len(result.found), len(self.titles))
+        # the bucket starts full with rate_limit tokens, the other requests wait for new tokens
+        self.assertGreaterEqual(elapsed, (len(self.titles) - rate_limit) / rate_limit * 0.9)
+
+    def test_failing_movies_do_not_stop_the_others(self):
+        engine = self.engine({self.titles[0]: 10}, retries=2)
+        statuses = {}
+        result = engine.fetch(self.titles + ['No Such Movie'], progress=statuses.__setitem__)
+        self.assertEqual(list(result.failed), [self.titles[0]])
+        self.assertIn('503', result.failed[self.titles[0]])
+        self.assertEqual(list(result.not_found), ['No Such Movie'])
+        self.assertEqual(set(result.found), set(self.titles[1:]))
+        self.assertEqual(statuses[self.titles[0]], 'failed')
+        self.assertEqual(statuses['No Such Movie'], 'not found')
+        self.assertEqual(statuses[self.titles[1]], 'updated')
+        # the failing movie is requested once and retried twice
+        self.assertEqual(self.server.failures[self.titles[0]], 7)
+        self.assertEqual(result.summary(), f'{len(self.titles) - 1} updated (0 changed), 1 not found, 1 failed')
+
+
+if __name__ == '__main__':
+    unittest.main()
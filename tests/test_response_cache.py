@@ -0,0 +1,49 @@
+"""Tests of the persistent OMDb response cache.
+Run from the repository root: python -m unittest discover tests"""
+import os
+import tempfile
+import unittest
+from omdb.cache import ResponseCache
+
+
+class ResponseCacheTest(unittest.TestCase):
+    """Stored responses, counters and eviction of the least recently used responses"""
+
+    def setUp(self):
+        self._workdir = tempfile.TemporaryDirectory()
+        self.filepath = os.path.join(self._workdir.name, 'cache.db')
+
+    def tearDown(self):
+        self._workdir.cleanup()
+
+    @staticmethod
+    def response(number):
+        """Returns a found movie response"""
+        return {"Title": f'Movie {number}', "imdbID": f'tt{number:07d}', "Response": "True"}
+
+    def test_responses_are_found_by_title_and_id(self):
+        cache = ResponseCache(self.filepath)
+        cache.put(ResponseCache.title_key('Movie 1'), self.response(1))
+        self.assertEqual(cache.get(ResponseCache.title_key('  movie   1 ')), self.response(1))
+        self.assertEqual(cache.get(ResponseCache.id_key('TT0000001')), self.response(1))
+        self.assertIsNone(cache.get(ResponseCache.title_key('Movie 2')))
+        self.assertEqual((cache.stats()["hits"], cache.stats()["misses"]), (2, 1))
+        cache.close()
+
+    def test_size_is_checked_every_evict_interval_responses(self):
+        cache = ResponseCache(self.filepath, max_entries=3, evict_interval=4)
+        for number in range(7):
+            cache.put(ResponseCache.id_key(f'tt{number:07d}'), self.response(number))
+        # evicted down to 3 after the 4th response, 3 responses stored since then
+        self.assertEqual(cache.stats()["entries"], 6)
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertIsNone(cache.get(ResponseCache.id_key('tt0000000')))
+        self.assertIsNotNone(cache.get(ResponseCache.id_key('tt0000001')))
+        cache.close()
+        cache = ResponseCache(self.filepath)
+        self.assertEqual(cache.stats()["entries"], 3)
+        self.assertIsNotNone(cache.get(ResponseCache.id_key('tt0000001')))
+        cache.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+"""Tests of rating breakdowns per release year and per country flag.
+Run from the repository root: python -m unittest discover tests"""
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from benchmarks.generate_library import generate_movies, write_library
+from main import create_storage
+from movie_app import MovieApp
+from movie_commands import MovieCommands
+
+
+class MovieStatsBreakdownTest(unittest.TestCase):
+    """The stats aggregator of a cached storage and the calculation from the movies agree"""
+
+    def setUp(self):
+        self._workdir = tempfile.TemporaryDirectory()
+        self.movies = dict(generate_movies(300))
+        self.movies["Unknown Pleasures"] = {"year": "N/A", "rating": 6.0, "poster": "", "notes": "",
+                                            "imdb_id": "", "flag": ""}
+        self.movies["Not Rated"] = {"year": 1999, "rating": "N/A", "poster": "", "notes": "",
+                                    "imdb_id": "", "flag": ""}
+        self.storages = []
+
+    def tearDown(self):
+        for storage in self.storages:
+            storage.close()
+        self._workdir.cleanup()
+
+    def storage(self, extension):
+        """Writes the movies to a database file and opens it
+        :return: IStorage instance
+        """
+        filepath = os.path.join(self._workdir.name, f'movies{extension}')
+        write_library(filepath, self.movies.items())
+        storage = create_storage(filepath)
+        self.storages.append(storage)
+        return storage
+
+    def assertBreakdownsEqual(self, breakdown, expected):
+        self.assertEqual(list(breakdown), list(expected))
+        for value, group in expected.items():
+            self.assertEqual(breakdown[value]["count"], group["count"])
+            self.assertAlmostEqual(breakdown[value]["average"], group["average"])
+
+    def test_aggregator_matches_calculation(self):
+        storage = self.storage('.csv')
+        app = MovieApp(storage)
+        for field in MovieApp.breakdown_fields:
+            breakdown = storage.movie_stats_breakdown(field)
+            self.assertIsNotNone(breakdown)
+            self.assertBreakdownsEqual(app.movie_stats_breakdown(field),
+                                       MovieApp.calculate_breakdown(storage.list_movies(), field))
+            self.assertEqual(sum(group["count"] for group in breakdown.values()), len(self.movies) - 1)
+        self.assertIsNone(list(storage.movie_stats_breakdown('year'))[-1])
+
+    def test_aggregator_follows_changes(self):
+        storage = self.storage('.json')
+        titles = list(self.movies)
+        storage.delete_movie(titles[0])
+        storage.add_movie("Late Arrival", 1950, 9.5, "", flag=self.movies[titles[1]]["flag"])
+        storage.update_movies({titles[1]: dict(self.movies[titles[1]], rating=1.0)})
+        for field in MovieApp.breakdown_fields:
+            self.assertBreakdownsEqual(storage.movie_stats_breakdown(field),
+                                       MovieApp.calculate_breakdown(storage.list_movies(), field))
+
+    def test_storage_without_aggregator_is_calculated(self):
+        expected = MovieApp.calculate_breakdown(self.movies, 'flag')
+        self.assertBreakdownsEqual(MovieApp(self.storage('.db')).movie_stats_breakdown('flag'), expected)
+        self.assertBreakdownsEqual(MovieApp(self.storage('.csv')).movie_stats_breakdown('flag'), expected)
+        with self.assertRaises(ValueError):
+            MovieApp(self.storages[0]).movie_stats_breakdown('rating')
+
+    def test_stats_command_and_interactive_stats_show_breakdowns(self):
+        storage = self.storage('.csv')
+        output = io.StringIO()
+        MovieCommands(storage).run_batch(['stats --by year --by flag', 'stats'], output)
+        with_breakdowns, plain = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertNotIn('by_year', plain)
+        years = [group['year'] for group in with_breakdowns['by_year']]
+        self.assertEqual(years[-1], None)
+        self.assertEqual(years[:-1], sorted(years[:-1]))
+        self.assertEqual(sum(group['count'] for group in with_breakdowns['by_flag']), plain['count'])
+        printed = io.StringIO()
+        with redirect_stdout(printed):
+            MovieApp(storage)._command_movie_stats()
+        self.assertIn('Average rating per country:', printed.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
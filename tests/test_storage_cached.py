@@ -0,0 +1,81 @@
+"""Tests of the caching storage and its indexes.
+Run from the repository root: python -m unittest discover tests"""
+import os
+import tempfile
+import unittest
+from benchmarks.generate_library import generate_movies
+from storage.sorted_index import SortedIndex, rating_value, year_value
+from storage.stats_aggregator import StatsAggregator
+from storage.storage_cached import StorageCached
+from storage.storage_json import StorageJson
+from storage.title_index import TitleIndex
+
+
+class FailingStorageJson(StorageJson):
+    """JSON storage whose writes fail like a full disk once fail is set"""
+
+    fail = False
+
+    def update_database(self, database):
+        if self.fail:
+            raise OSError(28, 'No space left on device')
+        super().update_database(database)
+
+
+class StorageCachedTest(unittest.TestCase):
+    """The cache and the indexes serve only movies that were written"""
+
+    def setUp(self):
+        self._workdir = tempfile.TemporaryDirectory()
+        self.movies = dict(generate_movies(50))
+        self.titles = list(self.movies)
+        self.backend = FailingStorageJson(os.path.join(self._workdir.name, 'movies.json'))
+        self.backend.update_database(self.movies)
+        self.storage = StorageCached(self.backend, indexes=[TitleIndex(None),
+                                                            SortedIndex('rating', rating_value),
+                                                            SortedIndex('year', year_value),
+                                                            StatsAggregator()])
+        self.storage.list_movies()
+
+    def tearDown(self):
+        self.storage.close()
+        self._workdir.cleanup()
+
+    def assert_saved_movies_are_served(self):
+        """Checks that the cache and every index answer with the movies of the file"""
+        self.assertEqual(self.storage.list_movies(), self.movies)
+        best = max(self.movies.values(), key=lambda info: info['rating'])['rating']
+        self.assertEqual(self.storage.sorted_movies('rating', reverse=True, limit=1)[0][1]['rating'], best)
+        self.assertEqual(len(self.storage.filter_movies(0, 10, 0, 9999)), len(self.movies))
+        self.assertEqual(self.storage.movie_stats()['count'], len(self.movies))
+        self.assertEqual([title for title, info in self.storage.search_titles(self.titles[0])][:1],
+                         [self.titles[0]])
+
+    def test_failed_writes_are_not_served(self):
+        self.backend.fail = True
+        with self.assertRaises(OSError):
+            self.storage.add_movie('Unsaved', 2001, 10.0, '')
+        self.assertIsNone(self.storage.get_movie('Unsaved'))
+        with self.assertRaises(OSError):
+            self.storage.delete_movie(self.titles[0])
+        with self.assertRaises(OSError):
+            self.storage.update_movie(self.titles[1], 'unsaved notes')
+        with self.assertRaises(OSError):
+            self.storage.update_movies({self.titles[2]: dict(self.movies[self.titles[2]], rating=10.0)})
+        with self.assertRaises(OSError):
+            self.storage.add_movies({'Unsaved too': dict(self.movies[self.titles[3]])})
+        self.assert_saved_movies_are_served()
+
+    def test_write_after_a_failed_write(self):
+        self.backend.fail = True
+        with self.assertRaises(OSError):
+            self.storage.delete_movie(self.titles[0])
+        self.backend.fail = False
+        self.storage.update_movie(self.titles[0], 'saved notes')
+        self.movies[self.titles[0]]['notes'] = 'saved notes'
+        self.assertEqual(StorageJson(self.backend.filepath).list_movies()[self.titles[0]]['notes'], 'saved notes')
+        self.assert_saved_movies_are_served()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+"""Tests of the journaled storage after interrupted appends.
+Run from the repository root: python -m unittest discover tests"""
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from benchmarks.generate_library import generate_movies
+from storage.storage_journal import StorageJournal
+from storage.storage_json import StorageJson
+
+
+class StorageJournalTest(unittest.TestCase):
+    """Records after an unterminated or damaged journal record are kept"""
+
+    def setUp(self):
+        self._workdir = tempfile.TemporaryDirectory()
+        self.filepath = os.path.join(self._workdir.name, 'movies.json')
+        self.movies = dict(generate_movies(20))
+        self.titles = list(self.movies)
+        StorageJson(self.filepath).update_database(self.movies)
+        self.journal_file = f'{self.filepath}.journal'
+
+    def tearDown(self):
+        self._workdir.cleanup()
+
+    def open_storage(self):
+        """Opens the journaled storage, messages it prints go to self.errors"""
+        self.errors = io.StringIO()
+        with contextlib.redirect_stderr(self.errors), contextlib.redirect_stdout(io.StringIO()):
+            storage = StorageJournal(StorageJson(self.filepath))
+            storage.list_movies()
+        return storage
+
+    def test_record_after_an_interrupted_append_is_replayed(self):
+        storage = self.open_storage()
+        storage.update_movie(self.titles[0], 'first')
+        storage.close()
+        with open(self.journal_file, 'a', encoding='utf-8') as handle:
+            handle.write('{"op": "put", "title": "Half written", "mov')
+        storage = self.open_storage()
+        self.assertIsNone(storage.get_movie('Half written'))
+        self.assertIn('1 damaged records', self.errors.getvalue())
+        with contextlib.redirect_stderr(self.errors):
+            storage.update_movie(self.titles[1], 'second')
+            storage.delete_movie(self.titles[2])
+        self.assertIn('cut off', self.errors.getvalue())
+        storage.close()
+        storage = self.open_storage()
+        movies = storage.list_movies()
+        self.assertEqual(movies[self.titles[0]]['notes'], 'first')
+        self.assertEqual(movies[self.titles[1]]['notes'], 'second')
+        self.assertNotIn(self.titles[2], movies)
+        self.assertEqual(self.errors.getvalue(), '')
+        self.assertEqual(storage.dropped_records, 0)
+        storage.close()
+
+    def test_damaged_records_are_skipped_and_reported(self):
+        storage = self.open_storage()
+        storage.update_movie(self.titles[0], 'kept')
+        storage.close()
+        with open(self.journal_file, 'a', encoding='utf-8') as handle:
+            handle.write('not json\n{"op": "put"}\n')
+        storage = self.open_storage()
+        self.assertEqual(storage.get_movie(self.titles[0])['notes'], 'kept')
+        self.assertEqual(storage.dropped_records, 2)
+        self.assertIn('2 damaged records', self.errors.getvalue())
+        storage.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+"""Tests of the incremental JSON parser of the JSON storage.
+Run from the repository root: python -m unittest discover tests"""
+import io
+import json
+import unittest
+from benchmarks.generate_library import generate_movies
+from storage.storage_json import StorageJson
+
+
+class IterJsonObjectTest(unittest.TestCase):
+    """iter_json_object gives the members json.loads gives, whatever the chunk size"""
+
+    movies = dict(generate_movies(200))
+
+    def parse(self, text, chunk_size):
+        """Parses text with iter_json_object
+        :return: dict
+        """
+        return dict(StorageJson.iter_json_object(io.StringIO(text), chunk_size))
+
+    def test_members_are_parsed_for_any_chunk_size(self):
+        for text in (json.dumps(self.movies), json.dumps(self.movies, indent=4, ensure_ascii=False)):
+            for chunk_size in (1, 2, 7, 100, 4096, len(text) + 1):
+                self.assertEqual(self.parse(text, chunk_size), self.movies)
+
+    def test_empty_object(self):
+        self.assertEqual(self.parse(' { } ', 1), {})
+        self.assertEqual(self.parse('', 10), {})
+
+    def test_malformed_files_raise(self):
+        text = json.dumps(self.movies)
+        for malformed, chunk_size in ((text[:-1], 50), (text[:len(text) // 2], 1), ('[1, 2]', 10)):
+            with self.assertRaises(ValueError):
+                self.parse(malformed, chunk_size)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+"""Tests of the JSON Lines storage shared by several storages of one database file.
+Run from the repository root: python -m unittest discover tests"""
+import os
+import tempfile
+import unittest
+from benchmarks.generate_library import generate_movies
+from storage.storage_jsonl import StorageJsonl
+
+
+class StorageJsonlTest(unittest.TestCase):
+    """Offsets and the memory map follow changes made by another storage of the file"""
+
+    def setUp(self):
+        self._workdir = tempfile.TemporaryDirectory()
+        self.filepath = os.path.join(self._workdir.name, 'movies.jsonl')
+        self.movies = dict(generate_movies(300))
+        self.titles = list(self.movies)
+        self.reader = StorageJsonl(self.filepath)
+        self.reader.update_database(self.movies)
+        self.writer = StorageJsonl(self.filepath)
+
+    def tearDown(self):
+        self.reader.close()
+        self.writer.close()
+        self._workdir.cleanup()
+
+    def test_appended_records_are_read(self):
+        self.assertEqual(self.reader.get_movie(self.titles[0]), self.movies[self.titles[0]])
+        self.writer.update_movie(self.titles[0], 'seen twice')
+        self.writer.delete_movie(self.titles[1])
+        self.assertEqual(self.reader.get_movie(self.titles[0])['notes'], 'seen twice')
+        self.assertIsNone(self.reader.get_movie(self.titles[1]))
+        self.assertEqual(len(self.reader.list_movies()), len(self.movies) - 1)
+        with self.assertRaises(KeyError):
+            self.reader.delete_movie(self.titles[1])
+
+    def test_compacted_file_is_indexed_again(self):
+        self.reader.list_movies()
+        for title in self.titles[:200]:
+            self.writer.delete_movie(title)
+        self.writer.compact()
+        movies = self.reader.list_movies()
+        self.assertEqual(list(movies), self.titles[200:])
+        self.assertIsNone(self.reader.get_movie(self.titles[0]))
+        self.assertEqual(self.reader.get_movie(self.titles[-1]), self.movies[self.titles[-1]])
+
+    def test_iteration_reads_the_file_it_started_with(self):
+        movies = self.reader.iter_movies()
+        next(movies)
+        self.writer.update_database({title: self.movies[title] for title in self.titles[:10]})
+        self.assertEqual(len(list(movies)), len(self.movies) - 1)
+        self.assertEqual(len(self.reader.list_movies()), 10)
+
+    def test_unterminated_last_record_is_cut_off_by_the_next_write(self):
+        with open(self.filepath, 'ab') as handle:
+            handle.write(b'{"title": "Broken", "year": 19')
+        self.assertEqual(len(self.reader.list_movies()), len(self.movies))
+        self.writer.add_movie('Fixed', 2001, 7.5, '')
+        self.assertEqual(self.reader.get_movie('Fixed')['rating'], 7.5)
+        reopened = StorageJsonl(self.filepath)
+        self.assertIsNone(reopened.get_movie('Broken'))
+        reopened.close()
+        with open(self.filepath, 'rb') as handle:
+            self.assertTrue(handle.read().endswith(b'\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
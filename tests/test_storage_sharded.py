@@ -0,0 +1,80 @@
+"""Tests of sharded libraries with CSV and JSON shards.
+Run from the repository root: python -m unittest discover tests"""
+import json
+import os
+import tempfile
+import unittest
+from benchmarks.generate_library import generate_movies
+from storage.storage_sharded import StorageSharded
+
+# a movie OMDb knows no year and rating of, as the JSON database keeps it
+UNKNOWN = ("Unknown Pleasures", {"year": "N/A", "rating": "N/A", "poster": "", "notes": "",
+                                 "imdb_id": "", "flag": ""})
+
+
+class StorageShardedTest(unittest.TestCase):
+    """Streamed writes, movies without a year and year shards left without movies"""
+
+    def setUp(self):
+        self._workdir = tempfile.TemporaryDirectory()
+        self.movies = dict(generate_movies(300))
+
+    def tearDown(self):
+        self._workdir.cleanup()
+
+    def library(self, scheme, shard_format):
+        """Creates an empty library scanned in this process"""
+        return StorageSharded(os.path.join(self._workdir.name, f'{scheme}-{shard_format}.shards'),
+                              scheme, shard_count=4, shard_format=shard_format, workers=1)
+
+    def manifest_shards(self, storage):
+        """Returns shard keys listed in the manifest file"""
+        with open(storage.filepath, encoding='utf-8') as handle:
+            return json.load(handle)['shards']
+
+    def test_stream_is_written_in_chunks(self):
+        for scheme in StorageSharded.schemes:
+            for shard_format in StorageSharded.shard_formats:
+                storage = self.library(scheme, shard_format)
+                count = storage.write_movies(iter(self.movies.items()), chunk_size=7)
+                self.assertEqual(count, len(self.movies))
+                movies = storage.list_movies()
+                self.assertEqual(set(movies), set(self.movies))
+                for title, info in self.movies.items():
+                    self.assertEqual(movies[title]['rating'], info['rating'])
+                    self.assertEqual(movies[title]['year'], info['year'])
+                storage.write_movies(list(self.movies.items())[:10])
+                self.assertEqual(len(storage.list_movies()), 10)
+                if scheme == 'year':
+                    self.assertEqual(len(self.manifest_shards(storage)),
+                                     len({info['year'] for info in list(self.movies.values())[:10]}))
+                storage.close()
+
+    def test_movie_without_a_year_does_not_break_the_library(self):
+        for shard_format in StorageSharded.shard_formats:
+            storage = self.library('year', shard_format)
+            storage.update_database(dict([UNKNOWN], **self.movies))
+            title, info = UNKNOWN
+            self.assertIn(StorageSharded.unknown_year, self.manifest_shards(storage))
+            self.assertEqual(storage.get_movie(title)['year'], 'N/A')
+            self.assertEqual(len(storage.list_movies()), len(self.movies) + 1)
+            self.assertNotIn(title, dict(storage.filter_movies(0, 10, 1900, 2100)))
+            self.assertEqual([found for found, _ in storage.search_titles('pleasures')], [title])
+            storage.delete_movie(title)
+            self.assertNotIn(StorageSharded.unknown_year, self.manifest_shards(storage))
+            storage.close()
+
+    def test_moved_movie_drops_its_emptied_year_shard(self):
+        storage = self.library('year', 'csv')
+        storage.update_database({"Only Child": {"year": 1901, "rating": 5.0, "poster": "", "notes": "",
+                                                "imdb_id": "", "flag": ""}, **self.movies})
+        self.assertIn('1901', self.manifest_shards(storage))
+        storage.add_movie("Only Child", 1902, 5.0, "")
+        self.assertNotIn('1901', self.manifest_shards(storage))
+        self.assertFalse(os.path.exists(storage._shard_file('1901')))
+        self.assertEqual(storage.get_movie("Only Child")['year'], 1902)
+        storage.close()
+
+
+if __name__ == '__main__':
+    unittest.main()